@@ -0,0 +1,140 @@
+"""
+Tham số query chọn phần dữ liệu, phân trang, sắp xếp và lọc danh sách học sinh của kết quả phân tích
+"""
+
+import json
+import math
+from enum import Enum
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+
+from app.models.schemas import AnalysisResult, GradeLevel, StudentSummary
+
+# Các phần của AnalysisResult có thể chọn bằng tham số sections
+SECTIONS = ("class_statistics", "student_summaries", "recommendations")
+
+
+class SortField(str, Enum):
+    RANK = "rank"
+    NAME = "name"
+    AVERAGE_SCORE = "average_score"
+
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+class AnalysisView:
+    """
+    Dependency đọc tham số query của các endpoint phân tích
+
+    Mặc định (không truyền tham số) trả về toàn bộ kết quả như trước. Phần không được chọn
+    bị bỏ khỏi response và không được tính nếu có thể (VD: gợi ý); khi student_summaries được
+    chọn, response có thêm `pagination` với tổng số học sinh sau khi lọc.
+    """
+
+    def __init__(
+        self,
+        sections: Optional[str] = Query(
+            None, description="Các phần cần trả về, phân cách bằng dấu phẩy: " + ", ".join(SECTIONS)
+        ),
+        page: int = Query(1, ge=1, description="Trang của danh sách học sinh (bắt đầu từ 1)"),
+        page_size: Optional[int] = Query(None, ge=1, le=1000, description="Số học sinh mỗi trang (mặc định: tất cả)"),
+        sort_by: SortField = Query(SortField.RANK, description="Sắp xếp học sinh theo: rank, name, average_score"),
+        order: SortOrder = Query(SortOrder.ASC, description="Thứ tự sắp xếp: asc, desc"),
+        grade_level: Optional[GradeLevel] = Query(None, description="Chỉ lấy học sinh có xếp loại này"),
+        weak_subject: Optional[str] = Query(None, description="Chỉ lấy học sinh yếu môn này")
+    ):
+        if sections is None:
+            self.sections = frozenset(SECTIONS)
+        else:
+            self.sections = frozenset(section.strip() for section in sections.split(",") if section.strip())
+            invalid = self.sections - set(SECTIONS)
+            if invalid or not self.sections:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"sections không hợp lệ: {sections}. Chỉ chấp nhận: {', '.join(SECTIONS)}"
+                )
+
+        if page > 1 and page_size is None:
+            raise HTTPException(status_code=400, detail="page lớn hơn 1 cần có page_size")
+
+        self.page = page
+        self.page_size = page_size
+        self.sort_by = sort_by
+        self.order = order
+        self.grade_level = grade_level
+        self.weak_subject = weak_subject.strip().lower() if weak_subject and weak_subject.strip() else None
+
+    @property
+    def is_default(self) -> bool:
+        """Không có tham số nào: trả về nguyên kết quả"""
+        return (self.sections == frozenset(SECTIONS) and self.page == 1 and self.page_size is None
+                and self.sort_by == SortField.RANK and self.order == SortOrder.ASC
+                and self.grade_level is None and self.weak_subject is None)
+
+    @property
+    def analysis_sections(self) -> Optional[FrozenSet[str]]:
+        """
+        Các phần cần tính khi phân tích (None = tất cả)
+
+        Gợi ý cần danh sách học sinh nên chọn recommendations là phải tính đầy đủ.
+        """
+        if "recommendations" in self.sections:
+            return None
+        return self.sections & {"student_summaries"}
+
+    def select_summaries(self, summaries: List[StudentSummary]) -> List[StudentSummary]:
+        """Lọc rồi sắp xếp danh sách học sinh (chưa phân trang)"""
+        if self.grade_level is not None:
+            summaries = [summary for summary in summaries if summary.grade_level == self.grade_level]
+        if self.weak_subject is not None:
+            summaries = [summary for summary in summaries
+                         if any(subject.lower() == self.weak_subject for subject in summary.weak_subjects)]
+
+        reverse = self.order == SortOrder.DESC
+        if self.sort_by == SortField.NAME:
+            summaries = sorted(summaries, key=lambda summary: summary.student.name.casefold(), reverse=reverse)
+        elif self.sort_by == SortField.AVERAGE_SCORE:
+            summaries = sorted(summaries, key=lambda summary: summary.average_score, reverse=reverse)
+        elif reverse:
+            # Danh sách đã theo thứ hạng
+            summaries = summaries[::-1]
+        return summaries
+
+    def select_page(self, result: AnalysisResult) -> Tuple[AnalysisResult, Optional[Dict[str, int]]]:
+        """Kết quả chỉ còn trang học sinh được chọn và thông tin phân trang (None khi không chọn student_summaries)"""
+        if "student_summaries" not in self.sections:
+            return result, None
+
+        summaries = self.select_summaries(result.student_summaries)
+        total = len(summaries)
+        page_size = self.page_size or max(total, 1)
+        start = (self.page - 1) * page_size
+
+        page_result = result.model_copy(update={"student_summaries": summaries[start:start + page_size]})
+        pagination = {
+            "page": self.page,
+            "page_size": page_size,
+            "total_items": total,
+            "total_pages": math.ceil(total / page_size)
+        }
+        return page_result, pagination
+
+    def render(self, result: AnalysisResult) -> bytes:
+        """JSON bytes của một kết quả sau khi chọn phần, lọc, sắp xếp và phân trang"""
+        page_result, pagination = self.select_page(result)
+        body = page_result.model_dump_json(include={"file_id", *self.sections}).encode("utf-8")
+        if pagination is None:
+            return body
+        return body[:-1] + b',"pagination":' + json.dumps(pagination).encode("utf-8") + b"}"
+
+    def to_data(self, result: AnalysisResult) -> Dict[str, Any]:
+        """Như render nhưng trả về dict chỉ gồm kiểu JSON (dùng cho định dạng nhị phân, không qua JSON)"""
+        page_result, pagination = self.select_page(result)
+        data = page_result.model_dump(mode="json", include={"file_id", *self.sections})
+        if pagination is not None:
+            data["pagination"] = pagination
+        return data
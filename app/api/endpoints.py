@@ -1,13 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+import asyncio
+import math
 import os
 import logging
-from typing import Dict, Any
+import shutil
+import tempfile
+from typing import AsyncIterator, Dict, Any, FrozenSet, List, Optional
 import uuid
+import pydantic_core
 from datetime import datetime
 
-from app.models.schemas import AnalysisResult, DataResponseDTO, AnalysisResponseData, SupabaseLinkRequest
+from app.models.schemas import (
+    AnalysisResult, DataResponseDTO, AnalysisResponseData, SupabaseLinkRequest, SchoolAnalysisResult,
+    JobStatus, ScoreDelta, GradeLevel, StoredAnalysis
+)
+from app.api.analysis_view import AnalysisView, SortField, SortOrder
+from app.api.result_formats import ResultFormat
+from app.api.responses import analysis_json, build_analysis_model, envelope_bytes, envelope_response
+from app.core.config import settings
 from app.services.excel_processor import ExcelProcessor
 from app.services.grade_analyzer import GradeAnalyzer
+from app.services.workbook_analyzer import workbook_analyzer, ProgressCallback
+from app.services.analysis_cache import analysis_cache, with_file_id
+from app.services.spreadsheet_readers import FileSource
+from app.services.worker_pool import worker_pool, PoolSaturatedError
+from app.services.downloader import file_downloader
+from app.services.download_cache import download_cache
+from app.services.single_flight import single_flight
+from app.services.job_manager import job_manager
+from app.services.incremental_analysis import IncrementalAnalysis, incremental_analyses
+from app.services.analysis_store import StudentQuery, analysis_store
 from app.middleware.auth_middleware import verify_api_token
 
 router = APIRouter()
@@ -17,18 +42,129 @@ logger = logging.getLogger(__name__)
 excel_processor = ExcelProcessor()
 grade_analyzer = GradeAnalyzer()
 
+# Định dạng file được hỗ trợ
+ALLOWED_EXTENSIONS = ['.xlsx', '.xls', '.csv']
 
 
+async def _analyze_with_cache(file_content: FileSource, filename: str, file_id: str,
+                              cache_key: Optional[str] = None,
+                              on_progress: Optional[ProgressCallback] = None,
+                              sections: Optional[FrozenSet[str]] = None) -> SchoolAnalysisResult:
+    """
+    Phân tích file, dùng lại kết quả trong cache nếu cùng nội dung đã được phân tích trước đó
+    (hoặc bảng điểm đã parse nếu cùng nội dung đã được phân tích với sections khác)
+
+    cache_key: khóa nội dung đã tính sẵn (VD: hash trong lúc download), None thì hash file
+    on_progress: callback báo tiến độ của job (chỉ được gọi khi file thực sự được phân tích)
+    sections: chỉ tính các phần này (AnalysisView.analysis_sections), None = đầy đủ. Kết quả
+    thiếu phần được cache dưới khóa riêng, không bao giờ được dùng cho request cần đầy đủ.
+    """
+    # Hash và phân tích đều chạy ngoài event loop để không chặn các request khác
+    if cache_key is None:
+        cache_key = await asyncio.to_thread(analysis_cache.compute_key, file_content, filename)
+    content_key = cache_key
+
+    # Kết quả đầy đủ dùng được cho mọi request
+    analysis = analysis_cache.get(cache_key, file_id)
+    if analysis is not None:
+        logger.info(f"Analysis cache hit: {cache_key}")
+        return analysis
+
+    if sections is not None:
+        cache_key = f"{cache_key}:{'+'.join(sorted(sections)) or 'class_statistics'}"
+        analysis = analysis_cache.get(cache_key, file_id)
+        if analysis is not None:
+            logger.info(f"Analysis cache hit: {cache_key}")
+            return analysis
+
+    # Cùng nội dung đã được parse (VD: cho request với sections khác): chỉ cần phân tích lại
+    class_matrices = analysis_cache.get_parsed(content_key)
+
+    # Các request cùng nội dung đến khi file đang được phân tích chờ chung một lần phân tích.
+    # Lần phân tích chạy trong task riêng và có thể kéo dài hơn request đã bắt đầu nó (file upload
+    # bị đóng khi request kết thúc hoặc bị hủy), nên nội dung được chép ra file tạm mà lần phân tích
+    # sở hữu trước khi vào single-flight; request chỉ chờ lần đang chạy thì không cần chép
+    flight_key = f"content:{cache_key}"
+    staged = None
+    if class_matrices is None and not single_flight.is_running(flight_key):
+        staged = await workbook_analyzer.stage_async(file_content, filename)
+        if single_flight.is_running(flight_key):
+            # Request khác đã bắt đầu phân tích cùng nội dung trong lúc chép
+            staged.close()
+            staged = None
+
+    async def analyze() -> SchoolAnalysisResult:
+        try:
+            # Request bị từ chối ngay (PoolSaturatedError) nếu hàng đợi phân tích đã đầy
+            async with worker_pool.admit():
+                matrices = class_matrices
+                if matrices is None:
+                    matrices = await workbook_analyzer.parse_path_async(staged.name, filename)
+                    await asyncio.to_thread(analysis_cache.put_parsed, content_key, matrices)
+                analysis = await workbook_analyzer.analyze_matrices_async(matrices, file_id, on_progress, sections)
+        finally:
+            if staged is not None:
+                staged.close()
+
+        await asyncio.to_thread(analysis_cache.put, cache_key, analysis)
+        return analysis
+
+    analysis = await single_flight.run(flight_key, analyze)
+    return with_file_id(analysis, file_id)
+
+
+async def _analyze_link(link: str, file_id: str,
+                        on_progress: Optional[ProgressCallback] = None,
+                        sections: Optional[FrozenSet[str]] = None) -> SchoolAnalysisResult:
+    """Download file từ link và phân tích (gộp các request cùng link đang chạy đồng thời)"""
+    async def download_and_analyze() -> SchoolAnalysisResult:
+        # HTTP client dùng chung, body được spool, không chặn event loop.
+        # File đã download trước đó chỉ cần một conditional GET để revalidate
+        download = await file_downloader.download(link)
+
+        with download:
+            return await _analyze_with_cache(download.file, download.filename, file_id, download.content_key,
+                                             on_progress, sections)
+
+    flight_key = f"link:{link}" if sections is None else f"link:{link}:{'+'.join(sorted(sections))}"
+    analysis = await single_flight.run(flight_key, download_and_analyze)
+    return with_file_id(analysis, file_id)
+
+
+def _saturated_exception(error: PoolSaturatedError) -> HTTPException:
+    """503 kèm Retry-After khi hàng đợi phân tích đã đầy"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
 
 
 @router.post("/upload-and-analyze", response_model=Dict[str, Any])
 async def upload_and_analyze_immediately(
     file: UploadFile = File(...),
+    view: AnalysisView = Depends(),
+    output: ResultFormat = Depends(),
     client_id: str = Depends(verify_api_token)
 ):
     """
     Upload file Excel và phân tích ngay lập tức, không lưu file
 
+    Workbook nhiều sheet (mỗi sheet một lớp, tên lớp lấy từ tên sheet) hoặc sheet có cột Lớp với
+    nhiều lớp được tách theo lớp và phân tích song song; khi đó `data` chứa danh sách `classes` với
+    một kết quả phân tích cho mỗi lớp và `school_summary` tổng hợp toàn trường.
+
+    File lớn hơn MAX_UPLOAD_MB bị từ chối với mã 413. Khi hàng đợi phân tích đã đầy,
+    request bị từ chối với mã 503 kèm header Retry-After.
+
+    Tham số query (tùy chọn): `sections` chọn phần trả về (class_statistics, student_summaries,
+    recommendations), `page` / `page_size` / `sort_by` / `order` phân trang và sắp xếp danh sách
+    học sinh, `grade_level` / `weak_subject` lọc danh sách học sinh.
+
+    Header Accept: `application/json` (mặc định), `application/msgpack` (cùng envelope), hoặc
+    `application/vnd.apache.arrow.stream` / `application/vnd.apache.parquet` để nhận bảng dạng cột
+    được chọn bằng tham số `table` (students: mỗi học sinh một dòng, subjects: mỗi môn một dòng).
+
     **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
 
     Để sử dụng endpoint này:
@@ -38,13 +174,12 @@ async def upload_and_analyze_immediately(
     """
 
     # Kiểm tra định dạng file
-    allowed_extensions = ['.xlsx', '.xls', '.csv']
     file_extension = os.path.splitext(file.filename)[1].lower()
 
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(allowed_extensions)}"
+            detail=f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
     # Tạo tool_log_id để tracking
@@ -53,41 +188,32 @@ async def upload_and_analyze_immediately(
     try:
         logger.info(f"File upload and analysis request from client: {client_id}, filename: {file.filename}, tool_log_id: {tool_log_id}")
 
-        # Đọc nội dung file
-        file_content = await file.read()
-
-        # Xử lý file Excel trực tiếp trong memory (không lưu file)
-        students = excel_processor.process_excel_in_memory(file_content, file.filename)
-
-        # Phân tích ngay lập tức
-        analysis_result = grade_analyzer.analyze_complete(f"analysis_{client_id}", students)
+        # Phân tích trực tiếp trên file upload đã spool (RAM với file nhỏ, file tạm với file lớn)
+        # thay vì đọc toàn bộ nội dung ra một bản sao bytes
+        file_id = f"analysis_{client_id}"
+        analysis = await _analyze_with_cache(file.file, file.filename, file_id,
+                                             sections=output.analysis_sections(view))
 
         logger.info(f"Analysis completed successfully for client: {client_id}, tool_log_id: {tool_log_id}")
 
-        # Chuyển đổi analysis_result thành dict để phù hợp với format response
-        analysis_data = analysis_result.model_dump()
-
-        # Trả về theo format chuẩn mà Java code expect
-        return {
-            "success": True,
-            "data": analysis_data,
-            "message": "Phân tích file Excel thành công"
-        }
+        # Serialize kết quả một lần theo định dạng được chọn (JSON: format chuẩn mà Java code expect)
+        return output.response(analysis, view, "Phân tích file Excel thành công")
 
+    except PoolSaturatedError as e:
+        logger.warning(f"Analysis queue full, rejected client {client_id}, tool_log_id: {tool_log_id}")
+        raise _saturated_exception(e)
     except Exception as e:
         logger.error(f"Analysis failed for client {client_id}, tool_log_id: {tool_log_id}: {str(e)}")
 
         # Trả về error response theo format chuẩn mà Java code expect
-        return {
-            "success": False,
-            "data": None,
-            "message": f"Lỗi khi phân tích file: {str(e)}"
-        }
+        return output.error_response(f"Lỗi khi phân tích file: {str(e)}")
 
 
 @router.post("/analyze-from-link", response_model=Dict[str, Any])
 async def analyze_from_supabase_link(
     request: SupabaseLinkRequest,
+    view: AnalysisView = Depends(),
+    output: ResultFormat = Depends(),
     client_id: str = Depends(verify_api_token)
 ):
     """
@@ -117,45 +243,602 @@ async def analyze_from_supabase_link(
                 detail="Link không được để trống"
             )
 
-        # Download và xử lý file từ Supabase link
-        students = excel_processor.process_excel_from_url(request.link)
-
-        # Phân tích ngay lập tức
-        analysis_result = grade_analyzer.analyze_complete(f"analysis_{client_id}", students)
+        # Download file từ Supabase link, xử lý và phân tích ngay lập tức (mỗi sheet một lớp)
+        file_id = f"analysis_{client_id}"
+        analysis = await _analyze_link(request.link, file_id, sections=output.analysis_sections(view))
 
         logger.info(f"Supabase link analysis completed successfully for client: {client_id}, tool_log_id: {tool_log_id}")
 
-        # Chuyển đổi analysis_result thành dict để phù hợp với format response
-        analysis_data = analysis_result.model_dump()
-
-        # Trả về theo format chuẩn mà Java code expect
-        return {
-            "success": True,
-            "data": analysis_data,
-            "message": "Phân tích file Excel từ Supabase link thành công"
-        }
+        # Serialize kết quả một lần theo định dạng được chọn (JSON: format chuẩn mà Java code expect)
+        return output.response(analysis, view, "Phân tích file Excel từ Supabase link thành công")
 
     except HTTPException:
         # Re-raise HTTPException để FastAPI xử lý
         raise
+    except PoolSaturatedError as e:
+        logger.warning(f"Analysis queue full, rejected client {client_id}, tool_log_id: {tool_log_id}")
+        raise _saturated_exception(e)
     except Exception as e:
         logger.error(f"Supabase link analysis failed for client {client_id}, tool_log_id: {tool_log_id}: {str(e)}")
 
         # Trả về error response theo format chuẩn mà Java code expect
-        return {
-            "success": False,
-            "data": None,
-            "message": f"Lỗi khi phân tích file từ link: {str(e)}"
+        return output.error_response(f"Lỗi khi phân tích file từ link: {str(e)}")
+
+
+
+
+
+
+
+
+class BatchItem:
+    """Một file trong batch: file upload (đã spool lại) hoặc link"""
+
+    __slots__ = ("source", "file", "link")
+
+    def __init__(self, source: str, file=None, link: Optional[str] = None):
+        self.source = source
+        self.file = file
+        self.link = link
+
+
+def _spool_upload(upload: UploadFile):
+    """Chép file upload sang file tạm riêng để vẫn đọc được trong lúc stream response"""
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_THRESHOLD_BYTES)
+    upload.file.seek(0)
+    shutil.copyfileobj(upload.file, spooled_file)
+    spooled_file.seek(0)
+    return spooled_file
+
+
+def _batch_result_line(index: int, item: BatchItem, success: bool, data: Optional[bytes], message: str) -> bytes:
+    """Một dòng kết quả NDJSON của batch: {index, source, success, data, message}"""
+    return envelope_bytes(data, message, success, index=index, source=item.source) + b"\n"
+
+
+async def _analyze_batch_item(index: int, item: BatchItem, file_id: str, view: AnalysisView) -> bytes:
+    """Phân tích một file của batch; lỗi chỉ ảnh hưởng đến dòng kết quả của file đó"""
+    try:
+        if item.link is not None:
+            analysis = await _analyze_link(item.link, file_id, sections=view.analysis_sections)
+        else:
+            analysis = await _analyze_with_cache(item.file, item.source, file_id, sections=view.analysis_sections)
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        logger.error(f"Batch item {index} ({item.source}) failed: {str(e)}")
+        return _batch_result_line(index, item, False, None, f"Lỗi khi phân tích file: {str(e)}")
+
+    return _batch_result_line(index, item, True, analysis_json(analysis, view),
+                              "Phân tích file Excel thành công")
+
+
+async def _run_batch_item(semaphore: asyncio.Semaphore, index: int, item: BatchItem,
+                          file_id: str, view: AnalysisView) -> bytes:
+    """Chạy một file của batch trong giới hạn song song, chờ rồi thử lại khi hàng đợi phân tích đầy"""
+    # File sai định dạng trả lỗi ngay, không phải chờ lượt
+    if item.link is None and os.path.splitext(item.source)[1].lower() not in ALLOWED_EXTENSIONS:
+        return _batch_result_line(
+            index, item, False, None,
+            f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    async with semaphore:
+        for attempt in range(settings.BATCH_SATURATED_RETRIES + 1):
+            try:
+                return await _analyze_batch_item(index, item, file_id, view)
+            except PoolSaturatedError as e:
+                if attempt == settings.BATCH_SATURATED_RETRIES:
+                    return _batch_result_line(index, item, False, None, str(e))
+                await asyncio.sleep(e.retry_after)
+
+
+async def _stream_batch_results(items: List[BatchItem], file_id: str,
+                                view: AnalysisView) -> AsyncIterator[bytes]:
+    """Stream kết quả dạng NDJSON theo thứ tự hoàn thành (mỗi dòng một file)"""
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    tasks = [asyncio.create_task(_run_batch_item(semaphore, index, item, file_id, view))
+             for index, item in enumerate(items)]
+
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # Client ngắt kết nối giữa chừng: hủy các file chưa xong
+        for task in tasks:
+            task.cancel()
+        for item in items:
+            if item.file is not None:
+                item.file.close()
+
+
+@router.post("/batch-analyze")
+async def batch_analyze(
+    files: List[UploadFile] = File(None),
+    links: List[str] = Form(None),
+    view: AnalysisView = Depends(),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Phân tích nhiều file (upload và/hoặc link) trong một request
+
+    Các file được phân tích song song (tối đa BATCH_MAX_CONCURRENCY file cùng lúc). Response là
+    NDJSON (`application/x-ndjson`): mỗi file một dòng JSON ngay khi phân tích xong, theo thứ tự
+    hoàn thành, dạng `{"index", "source", "success", "data", "message"}` với `index` là vị trí của
+    file trong request (các file upload trước, sau đó đến các link). File lỗi chỉ làm dòng của file đó
+    có `success=false`.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+
+    **Form data**: `files` (nhiều file) và/hoặc `links` (nhiều Supabase link)
+    """
+    files = files or []
+    links = [link.strip() for link in links or [] if link.strip()]
+
+    if not files and not links:
+        raise HTTPException(status_code=400, detail="Cần ít nhất một file hoặc link")
+
+    if len(files) + len(links) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Mỗi batch tối đa {settings.BATCH_MAX_ITEMS} file"
+        )
+
+    logger.info(f"Batch analysis request from client: {client_id}, files: {len(files)}, links: {len(links)}")
+
+    # Spool các file upload trước khi bắt đầu stream response
+    items = [BatchItem(upload.filename, file=await asyncio.to_thread(_spool_upload, upload))
+             for upload in files]
+    items.extend(BatchItem(link, link=link) for link in links)
+
+    file_id = f"analysis_{client_id}"
+    return StreamingResponse(_stream_batch_results(items, file_id, view), media_type="application/x-ndjson")
+
+
+def _job_response(job, message: str) -> Dict[str, Any]:
+    """Trạng thái job theo format chuẩn, kèm đường dẫn poll trạng thái / lấy kết quả"""
+    return {
+        "success": True,
+        "data": {
+            **job.model_dump(),
+            "status_url": f"/api/v1/jobs/{job.job_id}",
+            "result_url": f"/api/v1/jobs/{job.job_id}/result"
+        },
+        "message": message
+    }
+
+
+@router.post("/jobs/upload-and-analyze", response_model=Dict[str, Any], status_code=202)
+async def submit_upload_job(
+    file: UploadFile = File(...),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Upload file Excel và tạo job phân tích ở nền, trả về job id ngay (202)
+
+    Dùng cho file lớn có thể phân tích lâu hơn timeout HTTP của client: poll trạng thái tại
+    `GET /api/v1/jobs/{job_id}` và lấy kết quả tại `GET /api/v1/jobs/{job_id}/result`.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    file_extension = os.path.splitext(file.filename)[1].lower()
+
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    # File upload bị đóng khi request kết thúc, job dùng bản spool riêng
+    spooled_file = await asyncio.to_thread(_spool_upload, file)
+    file_id = f"analysis_{client_id}"
+    filename = file.filename
+
+    async def analyze(on_progress: ProgressCallback) -> BaseModel:
+        analysis = await _analyze_with_cache(spooled_file, filename, file_id, on_progress=on_progress)
+        return build_analysis_model(analysis)
+
+    job = await job_manager.submit(client_id, filename, analyze, cleanup=spooled_file.close)
+    return _job_response(job, "Đã tạo job phân tích file Excel")
+
+
+@router.post("/jobs/analyze-from-link", response_model=Dict[str, Any], status_code=202)
+async def submit_link_job(
+    request: SupabaseLinkRequest,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Tạo job download file Excel từ Supabase link và phân tích ở nền, trả về job id ngay (202)
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    if not request.link or not request.link.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Link không được để trống"
+        )
+
+    file_id = f"analysis_{client_id}"
+    link = request.link
+
+    async def analyze(on_progress: ProgressCallback) -> BaseModel:
+        analysis = await _analyze_link(link, file_id, on_progress)
+        return build_analysis_model(analysis)
+
+    job = await job_manager.submit(client_id, link, analyze)
+    return _job_response(job, "Đã tạo job phân tích file Excel từ Supabase link")
+
+
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_job_status(
+    job_id: str,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Trạng thái (`queued`, `running`, `completed`, `failed`) và bước đã hoàn thành
+    (`parsed`, `analyzed`, `serialized`) của job
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    job = await job_manager.get(job_id, client_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job hoặc job đã hết hạn")
+
+    return _job_response(job, "Lấy trạng thái job thành công")
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Kết quả phân tích của job theo format giống `/upload-and-analyze`
+
+    Job chưa xong trả về 202 kèm trạng thái job; job thất bại trả về `success=false` kèm lỗi.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    job = await job_manager.get(job_id, client_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job hoặc job đã hết hạn")
+
+    if job.status == JobStatus.FAILED:
+        return {"success": False, "data": None, "message": job.message}
+
+    result = await job_manager.get_result(job_id) if job.status == JobStatus.COMPLETED else None
+    if result is None:
+        response = _job_response(job, "Job chưa hoàn thành")
+        response["success"] = False
+        return JSONResponse(status_code=202, content=jsonable_encoder(response))
+
+    # Kết quả đã được serialize sẵn khi job xong: ghép thẳng vào response, không encode lại
+    return envelope_response(result, "Phân tích file Excel thành công")
+
+
+def _incremental_response(analysis: IncrementalAnalysis, version: int, result: SchoolAnalysisResult,
+                          view: AnalysisView, message: str, status_code: int = 200) -> Response:
+    """Kết quả theo format giống `/upload-and-analyze`, kèm analysis_id và version ở envelope"""
+    content = envelope_bytes(analysis_json(result, view), message,
+                             analysis_id=analysis.analysis_id, version=version)
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
+
+def _get_incremental_analysis(analysis_id: str, client_id: str) -> IncrementalAnalysis:
+    analysis = incremental_analyses.get(analysis_id, client_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy kết quả phân tích hoặc kết quả đã hết hạn")
+    return analysis
+
+
+@router.post("/analyses", response_model=Dict[str, Any], status_code=201)
+async def create_incremental_analysis(
+    file: UploadFile = File(...),
+    view: AnalysisView = Depends(),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Upload file Excel, phân tích và giữ kết quả để cập nhật tăng dần khi điểm thay đổi
+
+    Response giống `/upload-and-analyze`, kèm `analysis_id` và `version` ở envelope. Sau đó gửi
+    thay đổi điểm tới `PATCH /api/v1/analyses/{analysis_id}` thay vì upload và phân tích lại cả file.
+    Kết quả được giữ trong bộ nhớ của server (tối đa INCREMENTAL_MAX_ANALYSES kết quả, hết hạn sau
+    INCREMENTAL_TTL_SECONDS không dùng).
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    file_extension = os.path.splitext(file.filename)[1].lower()
+
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    try:
+        logger.info(f"Incremental analysis request from client: {client_id}, filename: {file.filename}")
+
+        async with worker_pool.admit():
+            class_matrices = await workbook_analyzer.parse_async(file.file, file.filename)
+
+        analysis = await incremental_analyses.create(client_id, f"analysis_{client_id}", class_matrices)
+        version, result = await incremental_analyses.render(analysis, view.sections)
+        return _incremental_response(analysis, version, result, view, "Phân tích file Excel thành công",
+                                     status_code=201)
+
+    except PoolSaturatedError as e:
+        logger.warning(f"Analysis queue full, rejected client {client_id}")
+        raise _saturated_exception(e)
+    except Exception as e:
+        logger.error(f"Incremental analysis failed for client {client_id}: {str(e)}")
+        return envelope_response(None, f"Lỗi khi phân tích file: {str(e)}", success=False)
+
+
+@router.get("/analyses/{analysis_id}", response_model=Dict[str, Any])
+async def get_incremental_analysis(
+    analysis_id: str,
+    view: AnalysisView = Depends(),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Kết quả hiện tại (sau mọi thay đổi điểm đã áp dụng) của một kết quả phân tích tăng dần
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    analysis = _get_incremental_analysis(analysis_id, client_id)
+    version, result = await incremental_analyses.render(analysis, view.sections)
+    return _incremental_response(analysis, version, result, view, "Lấy kết quả phân tích thành công")
+
+
+@router.patch("/analyses/{analysis_id}", response_model=Dict[str, Any])
+async def update_incremental_analysis(
+    analysis_id: str,
+    delta: ScoreDelta,
+    view: AnalysisView = Depends(),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Áp dụng thay đổi điểm và trả về kết quả đã cập nhật (version tăng thêm 1)
+
+    Chỉ các học sinh / môn bị sửa được tính lại, thứ hạng cập nhật trên chỉ mục thứ hạng nên
+    chi phí tỉ lệ với số điểm thay đổi. Kết quả giống hệt phân tích lại bảng điểm đã sửa (học sinh
+    mới ở cuối lớp). Dùng `sections=class_statistics,recommendations` để không nhận lại cả danh sách học sinh.
+
+    **Request body**:
+    - `updates`: `[{"student_name", "class_name", "subject", "score"}]` sửa điểm (hoặc thêm môn /
+      học sinh chưa có)
+    - `removals`: `[{"student_name", "class_name", "subject"}]` xóa điểm một môn, bỏ `subject` để
+      xóa học sinh (áp dụng trước updates)
+
+    `class_name` có thể bỏ trống khi kết quả chỉ có một lớp. Thay đổi không hợp lệ (xóa học sinh /
+    môn không có) trả về 400 và kết quả không đổi.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    analysis = _get_incremental_analysis(analysis_id, client_id)
+    try:
+        version, result = await incremental_analyses.apply(analysis, delta, view.sections)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return _incremental_response(analysis, version, result, view, "Cập nhật điểm thành công")
+
+
+def _stored_analysis_response(info: StoredAnalysis, message: str) -> Dict[str, Any]:
+    """Thông tin kết quả đã lưu theo format chuẩn, kèm đường dẫn truy vấn học sinh / môn"""
+    base_url = f"/api/v1/stored-analyses/{info.analysis_id}"
+    return {
+        "success": True,
+        "data": {
+            **info.model_dump(),
+            "students_url": f"{base_url}/students",
+            "subjects_url": f"{base_url}/subjects"
+        },
+        "message": message
+    }
+
+
+async def _get_stored_analysis(analysis_id: str, client_id: str) -> StoredAnalysis:
+    info = await analysis_store.get(analysis_id)
+    if info is None or info.client_id != client_id:
+        raise HTTPException(status_code=404, detail="Không tìm thấy kết quả phân tích đã lưu hoặc kết quả đã hết hạn")
+    return info
+
+
+@router.post("/stored-analyses", response_model=Dict[str, Any], status_code=201)
+async def store_uploaded_analysis(
+    file: UploadFile = File(...),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Upload file Excel, phân tích và lưu kết quả để truy vấn lại nhiều lần (201)
+
+    Trả về `analysis_id`; sau đó hỏi danh sách học sinh (lọc theo lớp, xếp loại, môn yếu, điểm
+    trung bình) tại `GET /api/v1/stored-analyses/{analysis_id}/students` và thống kê môn tại
+    `GET /api/v1/stored-analyses/{analysis_id}/subjects` mà không phải upload và phân tích lại file.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    file_extension = os.path.splitext(file.filename)[1].lower()
+
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Định dạng file không được hỗ trợ. Chỉ chấp nhận: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    try:
+        logger.info(f"Stored analysis request from client: {client_id}, filename: {file.filename}")
+
+        analysis = await _analyze_with_cache(file.file, file.filename, f"analysis_{client_id}")
+        info = await analysis_store.save(client_id, file.filename, analysis)
+        return _stored_analysis_response(info, "Phân tích và lưu kết quả thành công")
+
+    except PoolSaturatedError as e:
+        logger.warning(f"Analysis queue full, rejected client {client_id}")
+        raise _saturated_exception(e)
+    except Exception as e:
+        logger.error(f"Stored analysis failed for client {client_id}: {str(e)}")
+        return envelope_response(None, f"Lỗi khi phân tích file: {str(e)}", success=False)
+
+
+@router.post("/stored-analyses/from-link", response_model=Dict[str, Any], status_code=201)
+async def store_link_analysis(
+    request: SupabaseLinkRequest,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Download file Excel từ Supabase link, phân tích và lưu kết quả để truy vấn lại nhiều lần (201)
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    if not request.link or not request.link.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Link không được để trống"
+        )
+
+    try:
+        logger.info(f"Stored link analysis request from client: {client_id}, link: {request.link}")
+
+        analysis = await _analyze_link(request.link, f"analysis_{client_id}")
+        info = await analysis_store.save(client_id, request.link, analysis)
+        return _stored_analysis_response(info, "Phân tích và lưu kết quả từ Supabase link thành công")
+
+    except PoolSaturatedError as e:
+        logger.warning(f"Analysis queue full, rejected client {client_id}")
+        raise _saturated_exception(e)
+    except Exception as e:
+        logger.error(f"Stored link analysis failed for client {client_id}: {str(e)}")
+        return envelope_response(None, f"Lỗi khi phân tích file từ link: {str(e)}", success=False)
+
+
+@router.get("/stored-analyses", response_model=Dict[str, Any])
+async def list_stored_analyses(
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Các kết quả phân tích đã lưu của client (mới nhất trước)
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    infos = await analysis_store.list(client_id)
+    return {
+        "success": True,
+        "data": [info.model_dump() for info in infos],
+        "message": "Lấy danh sách kết quả phân tích đã lưu thành công"
+    }
+
+
+@router.get("/stored-analyses/{analysis_id}")
+async def get_stored_analysis(
+    analysis_id: str,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Kết quả đã lưu không kèm danh sách học sinh: thống kê và gợi ý của từng lớp (`classes`) và
+    tổng hợp toàn trường (`school_summary`, khi có nhiều lớp)
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    await _get_stored_analysis(analysis_id, client_id)
+    overview = await analysis_store.get_overview(analysis_id)
+    if overview is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy kết quả phân tích đã lưu hoặc kết quả đã hết hạn")
+
+    return envelope_response(overview, "Lấy kết quả phân tích thành công")
+
+
+@router.get("/stored-analyses/{analysis_id}/students")
+async def query_stored_students(
+    analysis_id: str,
+    class_name: Optional[str] = Query(None, description="Chỉ lấy học sinh của lớp này"),
+    grade_level: Optional[GradeLevel] = Query(None, description="Chỉ lấy học sinh có xếp loại này"),
+    weak_subject: Optional[str] = Query(None, description="Chỉ lấy học sinh yếu môn này"),
+    min_average: Optional[float] = Query(None, ge=0, le=10, description="Điểm trung bình tối thiểu"),
+    max_average: Optional[float] = Query(None, ge=0, le=10, description="Điểm trung bình tối đa"),
+    sort_by: SortField = Query(SortField.RANK, description="Sắp xếp học sinh theo: rank, name, average_score"),
+    order: SortOrder = Query(SortOrder.ASC, description="Thứ tự sắp xếp: asc, desc"),
+    page: int = Query(1, ge=1, description="Trang (bắt đầu từ 1)"),
+    page_size: int = Query(50, ge=1, le=1000, description="Số học sinh mỗi trang"),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Truy vấn danh sách học sinh của kết quả đã lưu, trả lời từ chỉ mục (không phân tích lại)
+
+    VD: học sinh yếu môn Toán: `?weak_subject=Toán`; top 10 toàn trường:
+    `?sort_by=average_score&order=desc&page_size=10`; học sinh giỏi lớp 7A: `?class_name=7A&grade_level=Giỏi`.
+    `rank` là thứ hạng trong lớp; cùng giá trị sắp xếp thì giữ thứ tự theo lớp rồi theo thứ hạng.
+
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    await _get_stored_analysis(analysis_id, client_id)
+    query = StudentQuery(class_name=class_name, grade_level=grade_level, weak_subject=weak_subject,
+                         min_average=min_average, max_average=max_average, sort_by=sort_by.value,
+                         descending=order == SortOrder.DESC, skip=(page - 1) * page_size, limit=page_size)
+    total, summaries = await analysis_store.query_students(analysis_id, query)
+
+    data = pydantic_core.to_json({
+        "analysis_id": analysis_id,
+        "students": summaries,
+        "pagination": {
+            "page": page,
+            "page_size": page_size,
+            "total_items": total,
+            "total_pages": math.ceil(total / page_size)
         }
+    })
+    return envelope_response(data, "Truy vấn học sinh thành công")
 
 
+@router.get("/stored-analyses/{analysis_id}/subjects")
+async def query_stored_subjects(
+    analysis_id: str,
+    class_name: Optional[str] = Query(None, description="Chỉ lấy thống kê môn của lớp này"),
+    subject: Optional[str] = Query(None, description="Chỉ lấy thống kê của môn này"),
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Thống kê môn theo lớp của kết quả đã lưu (mỗi (lớp, môn) một dòng), lọc theo lớp / môn
 
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    await _get_stored_analysis(analysis_id, client_id)
+    subjects = await analysis_store.query_subjects(analysis_id, class_name, subject)
+    data = pydantic_core.to_json({"analysis_id": analysis_id, "subjects": subjects})
+    return envelope_response(data, "Truy vấn thống kê môn thành công")
 
 
+@router.delete("/stored-analyses/{analysis_id}", response_model=Dict[str, Any])
+async def delete_stored_analysis(
+    analysis_id: str,
+    client_id: str = Depends(verify_api_token)
+):
+    """
+    Xóa kết quả phân tích đã lưu cùng các document học sinh / môn của kết quả
 
+    **Yêu cầu xác thực**: Endpoint này yêu cầu Bearer token hợp lệ trong header Authorization.
+    """
+    await _get_stored_analysis(analysis_id, client_id)
+    await analysis_store.delete(analysis_id)
+    return {"success": True, "data": None, "message": "Đã xóa kết quả phân tích đã lưu"}
 
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Student Grade Analyzer API is running"}
+
+
+@router.get("/metrics")
+async def metrics(client_id: str = Depends(verify_api_token)):
+    """Thống kê vận hành (cache, hàng đợi process pool, số request được gộp), cần API token"""
+    return {
+        "analysis_cache": analysis_cache.stats(),
+        "download_cache": download_cache.stats(),
+        "worker_pool": worker_pool.stats(),
+        "single_flight": single_flight.stats(),
+        "jobs": job_manager.stats(),
+        "incremental_analyses": incremental_analyses.stats(),
+        "analysis_store": analysis_store.stats()
+    }
@@ -0,0 +1,81 @@
+"""
+Serialize kết quả phân tích thẳng ra JSON bytes và trả về theo format chuẩn {success, data, message}
+"""
+
+import json
+from typing import Any, Dict, Optional, Union
+
+import pydantic_core
+from fastapi.responses import Response
+
+from app.api.analysis_view import AnalysisView
+from app.models.schemas import AnalysisResult, SchoolAnalysisResult
+
+
+def build_analysis_model(analysis: SchoolAnalysisResult) -> Union[AnalysisResult, SchoolAnalysisResult]:
+    """Workbook một lớp trả về AnalysisResult như trước, nhiều lớp trả về SchoolAnalysisResult"""
+    if len(analysis.classes) == 1:
+        return analysis.classes[0]
+
+    return analysis
+
+
+def analysis_json(analysis: SchoolAnalysisResult, view: Optional[AnalysisView] = None) -> bytes:
+    """
+    JSON bytes của kết quả, serialize một lần bằng serializer (Rust) của Pydantic
+
+    Nhanh hơn nhiều so với model_dump() rồi để FastAPI chạy jsonable_encoder và json.dumps
+    lại trên dict lồng nhau. view: tham số query chọn phần / phân trang (áp dụng cho từng lớp,
+    tổng hợp toàn trường luôn được trả về nguyên vẹn).
+    """
+    if view is None or view.is_default:
+        return pydantic_core.to_json(build_analysis_model(analysis))
+
+    if len(analysis.classes) == 1:
+        return view.render(analysis.classes[0])
+
+    return b"".join((
+        b'{"file_id":', json.dumps(analysis.file_id, ensure_ascii=False).encode("utf-8"),
+        b',"classes":[', b",".join(view.render(result) for result in analysis.classes), b"]",
+        b',"school_summary":', pydantic_core.to_json(analysis.school_summary), b"}"
+    ))
+
+
+def analysis_data(analysis: SchoolAnalysisResult, view: Optional[AnalysisView] = None) -> Dict[str, Any]:
+    """Cùng nội dung với analysis_json nhưng là dict chỉ gồm kiểu JSON (không serialize ra JSON rồi parse lại)"""
+    if view is None or view.is_default:
+        return build_analysis_model(analysis).model_dump(mode="json")
+
+    if len(analysis.classes) == 1:
+        return view.to_data(analysis.classes[0])
+
+    return {
+        "file_id": analysis.file_id,
+        "classes": [view.to_data(result) for result in analysis.classes],
+        "school_summary": analysis.school_summary.model_dump(mode="json") if analysis.school_summary else None
+    }
+
+
+def envelope_bytes(data: Optional[bytes], message: str, success: bool = True, **fields) -> bytes:
+    """
+    Ghép {**fields, success, data, message} quanh data đã serialize sẵn (None → null)
+
+    Chỉ các trường nhỏ được encode bằng json, data được chèn nguyên vẹn.
+    """
+    head = json.dumps({**fields, "success": success}, ensure_ascii=False, separators=(",", ":"))
+    return b"".join((
+        head[:-1].encode("utf-8"),
+        b',"data":', data if data is not None else b"null",
+        b',"message":', json.dumps(message, ensure_ascii=False).encode("utf-8"),
+        b"}"
+    ))
+
+
+def envelope_response(data: Optional[bytes], message: str, success: bool = True,
+                      status_code: int = 200) -> Response:
+    """Response JSON theo format chuẩn mà Java code expect, không encode lại data"""
+    return Response(
+        content=envelope_bytes(data, message, success),
+        status_code=status_code,
+        media_type="application/json"
+    )
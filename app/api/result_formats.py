@@ -0,0 +1,189 @@
+"""
+Định dạng nhị phân cho kết quả phân tích (content negotiation theo header Accept)
+
+- Arrow IPC stream / Parquet: bảng dạng cột (mỗi học sinh hoặc mỗi môn một dòng) để nạp
+  thẳng vào pandas / Spark không phải parse JSON
+- MessagePack: cùng envelope {success, data, message} như JSON nhưng gọn hơn
+"""
+
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from fastapi import Header, HTTPException, Query
+from fastapi.responses import Response
+
+from app.api.analysis_view import AnalysisView
+from app.api.responses import analysis_data, analysis_json, envelope_response
+from app.models.schemas import AnalysisResult, SchoolAnalysisResult
+
+try:
+    # pyarrow là tùy chọn, cần cho Arrow IPC và Parquet
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+try:
+    # msgpack là tùy chọn, cần cho MessagePack
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+MSGPACK = "application/msgpack"
+
+# Các tên media type khác được chấp nhận
+MEDIA_TYPE_ALIASES = {
+    "application/x-parquet": PARQUET,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+TABLE_MEDIA_TYPES = (ARROW_STREAM, PARQUET)
+
+# Các bảng có thể chọn bằng tham số table
+TABLES = ("students", "subjects")
+
+# Tiền tố tên cột điểm từng môn trong bảng students, tránh trùng với các cột cố định
+SUBJECT_COLUMN_PREFIX = "score:"
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Chọn định dạng response theo header Accept (theo q, rồi theo thứ tự), mặc định JSON"""
+    candidates = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        media_type = MEDIA_TYPE_ALIASES.get(media_type.lower(), media_type.lower())
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in (JSON, MSGPACK, *TABLE_MEDIA_TYPES):
+            return media_type
+    return JSON
+
+
+def students_table(results: List[AnalysisResult], view: AnalysisView) -> "pa.Table":
+    """
+    Mỗi học sinh một dòng: id, name, class_name, average_score, rank, grade_level và một cột
+    điểm "score:<môn>" cho mỗi môn (null nếu học sinh không có điểm môn đó). Lọc / sắp xếp / phân trang theo view.
+    """
+    summaries = []
+    for result in results:
+        selected = view.select_summaries(result.student_summaries)
+        if view.page_size is not None:
+            start = (view.page - 1) * view.page_size
+            selected = selected[start:start + view.page_size]
+        summaries.extend(selected)
+
+    subjects: Dict[str, None] = {}
+    for result in results:
+        for subject_stats in result.class_statistics.subject_statistics:
+            subjects.setdefault(subject_stats.subject)
+
+    subject_scores = {subject: [None] * len(summaries) for subject in subjects}
+    for row, summary in enumerate(summaries):
+        for grade in summary.student.grades:
+            column = subject_scores.get(grade.subject)
+            # Môn trùng tên: giữ điểm đầu tiên
+            if column is not None and column[row] is None:
+                column[row] = grade.score
+
+    columns = {
+        "id": pa.array([summary.student.id for summary in summaries], pa.string()),
+        "name": pa.array([summary.student.name for summary in summaries], pa.string()),
+        "class_name": pa.array([summary.student.class_name for summary in summaries], pa.string()).dictionary_encode(),
+        "average_score": pa.array([summary.average_score for summary in summaries], pa.float64()),
+        "rank": pa.array([summary.rank for summary in summaries], pa.int32()),
+        "grade_level": pa.array([summary.grade_level.value for summary in summaries], pa.string()).dictionary_encode(),
+    }
+    for subject, scores in subject_scores.items():
+        columns[f"{SUBJECT_COLUMN_PREFIX}{subject}"] = pa.array(scores, pa.float64())
+
+    return pa.table(columns)
+
+
+def subjects_table(results: List[AnalysisResult]) -> "pa.Table":
+    """Mỗi (lớp, môn) một dòng với các trường của SubjectStatistics"""
+    rows = [{"class_name": result.class_statistics.class_name, **subject_stats.model_dump()}
+            for result in results for subject_stats in result.class_statistics.subject_statistics]
+    return pa.Table.from_pylist(rows) if rows else pa.table({"class_name": pa.array([], pa.string())})
+
+
+def table_response(results: List[AnalysisResult], media_type: str, table: str, view: AnalysisView) -> Response:
+    """Bảng students hoặc subjects dưới dạng Arrow IPC stream hoặc Parquet"""
+    arrow_table = students_table(results, view) if table == "students" else subjects_table(results)
+
+    sink = pa.BufferOutputStream()
+    if media_type == ARROW_STREAM:
+        with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+    else:
+        pa.parquet.write_table(arrow_table, sink)
+
+    return Response(content=sink.getvalue().to_pybytes(), media_type=media_type)
+
+
+class ResultFormat:
+    """
+    Dependency chọn định dạng response theo header Accept
+
+    JSON (mặc định) và MessagePack trả về envelope {success, data, message}; Arrow IPC stream
+    và Parquet trả về bảng được chọn bằng tham số table (students hoặc subjects).
+    """
+
+    def __init__(
+        self,
+        accept: Optional[str] = Header(None),
+        table: str = Query("students", description="Bảng trả về khi Accept là Arrow / Parquet: students, subjects")
+    ):
+        self.media_type = negotiate(accept)
+        self.table = table
+
+        if self.is_table:
+            if table not in TABLES:
+                raise HTTPException(status_code=400,
+                                    detail=f"table không hợp lệ: {table}. Chỉ chấp nhận: {', '.join(TABLES)}")
+            if pa is None:
+                raise HTTPException(status_code=406, detail=f"Định dạng {self.media_type} yêu cầu cài đặt pyarrow")
+        if self.media_type == MSGPACK and msgpack is None:
+            raise HTTPException(status_code=406, detail=f"Định dạng {self.media_type} yêu cầu cài đặt msgpack")
+
+    @property
+    def is_table(self) -> bool:
+        return self.media_type in TABLE_MEDIA_TYPES
+
+    def analysis_sections(self, view: AnalysisView) -> Optional[FrozenSet[str]]:
+        """Các phần kết quả cần tính (bảng dạng cột không cần gợi ý)"""
+        if self.is_table:
+            return frozenset({"student_summaries"}) if self.table == "students" else frozenset()
+        return view.analysis_sections
+
+    def response(self, analysis: SchoolAnalysisResult, view: AnalysisView, message: str) -> Response:
+        """Response thành công theo định dạng đã chọn (bảng dạng cột gồm học sinh / môn của mọi lớp)"""
+        if self.is_table:
+            return table_response(analysis.classes, self.media_type, self.table, view)
+
+        if self.media_type == MSGPACK:
+            # Pack thẳng từ dict (không serialize ra JSON rồi parse lại)
+            return self._msgpack_response(analysis_data(analysis, view), message, True)
+        return envelope_response(analysis_json(analysis, view), message)
+
+    def error_response(self, message: str) -> Response:
+        """Response lỗi {success: false, data: null, message} (JSON với định dạng bảng)"""
+        if self.media_type == MSGPACK:
+            return self._msgpack_response(None, message, False)
+        return envelope_response(None, message, success=False)
+
+    def _msgpack_response(self, data: Optional[Dict[str, Any]], message: str, success: bool) -> Response:
+        content = msgpack.packb({"success": success, "data": data, "message": message})
+        return Response(content=content, media_type=MSGPACK)
@@ -3,6 +3,7 @@ Cấu hình ứng dụng
 """
 
 import os
+import tempfile
 from typing import Optional
 
 
@@ -22,6 +23,78 @@ class Settings:
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Grade Analyzer API"
     
+    # Excel Processing
+    # File .xlsx lớn hơn ngưỡng này (MB) được đọc theo luồng thay vì dựng DataFrame
+    EXCEL_STREAMING_THRESHOLD_BYTES: int = int(float(os.getenv("EXCEL_STREAMING_THRESHOLD_MB", "10")) * 1024 * 1024)
+
+    # Backend đọc file Excel: "auto" (calamine nếu đã cài, ngược lại openpyxl), "openpyxl", "calamine"
+    EXCEL_READER_BACKEND: str = os.getenv("EXCEL_READER_BACKEND", "auto")
+
+    # CSV: encoding dự phòng khi file không phải UTF-8/UTF-16, ngưỡng (MB) để chia file thành
+    # nhiều phần làm sạch song song, và số luồng xử lý (mặc định: số CPU)
+    CSV_FALLBACK_ENCODING: str = os.getenv("CSV_FALLBACK_ENCODING", "cp1258")
+    CSV_CHUNK_THRESHOLD_BYTES: int = int(float(os.getenv("CSV_CHUNK_THRESHOLD_MB", "16")) * 1024 * 1024)
+    CSV_PARSE_WORKERS: int = int(os.getenv("CSV_PARSE_WORKERS", "0")) or (os.cpu_count() or 1)
+
+    # Tên lớp mặc định cho file định dạng ngang khi tên sheet không chứa tên lớp
+    DEFAULT_CLASS_NAME: str = os.getenv("DEFAULT_CLASS_NAME", "7A")
+
+    # Process pool cho parse + phân tích, cũng dùng để phân tích song song các sheet
+    # (mặc định: số CPU; EXCEL_SHEET_WORKERS là tên cũ của biến này)
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", os.getenv("EXCEL_SHEET_WORKERS", "0"))) or (os.cpu_count() or 1)
+
+    # Số request phân tích được chờ thêm khi mọi worker đều bận; vượt quá trả về 503 kèm Retry-After
+    ANALYSIS_QUEUE_SIZE: int = int(os.getenv("ANALYSIS_QUEUE_SIZE", "16"))
+
+    # Cache kết quả phân tích theo hash nội dung file (0 = tắt cache)
+    ANALYSIS_CACHE_MAX_BYTES: int = int(float(os.getenv("ANALYSIS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    ANALYSIS_CACHE_TTL_SECONDS: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+
+    # Batch: số file tối đa mỗi request, số file xử lý song song (download / chờ trong hàng đợi
+    # của pool, không ít hơn ANALYSIS_WORKERS), dung lượng body tối đa (MB) và số lần chờ thử lại
+    # khi hàng đợi phân tích đầy
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+    BATCH_MAX_CONCURRENCY: int = max(int(os.getenv("BATCH_MAX_CONCURRENCY", "4")), ANALYSIS_WORKERS)
+    BATCH_MAX_UPLOAD_BYTES: int = int(float(os.getenv("BATCH_MAX_UPLOAD_MB", "500")) * 1024 * 1024)
+    BATCH_SATURATED_RETRIES: int = int(os.getenv("BATCH_SATURATED_RETRIES", "10"))
+
+    # Job phân tích bất đồng bộ: nơi lưu (memory, mongodb), số job chạy đồng thời (0 = ANALYSIS_WORKERS)
+    # và thời gian giữ job / kết quả (giây) kể từ lần cập nhật cuối
+    JOB_STORE_BACKEND: str = os.getenv("JOB_STORE_BACKEND", "memory")
+    JOB_MAX_CONCURRENCY: int = int(os.getenv("JOB_MAX_CONCURRENCY", "0")) or ANALYSIS_WORKERS
+    JOB_TTL_SECONDS: int = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+    # Số lần job chờ rồi thử lại khi hàng đợi phân tích đầy trước khi job bị đánh dấu thất bại
+    JOB_SATURATED_RETRIES: int = int(os.getenv("JOB_SATURATED_RETRIES", "30"))
+
+    # Phân tích tăng dần (/analyses): số kết quả giữ trong bộ nhớ để áp dụng thay đổi điểm
+    # và thời gian giữ (giây) kể từ lần dùng cuối
+    INCREMENTAL_MAX_ANALYSES: int = int(os.getenv("INCREMENTAL_MAX_ANALYSES", "100"))
+    INCREMENTAL_TTL_SECONDS: int = int(os.getenv("INCREMENTAL_TTL_SECONDS", "3600"))
+
+    # Kết quả phân tích đã lưu (/stored-analyses): nơi lưu (memory, mongodb) và thời gian giữ
+    # (giây) kể từ lúc lưu (0 = giữ cho đến khi bị xóa)
+    ANALYSIS_STORE_BACKEND: str = os.getenv("ANALYSIS_STORE_BACKEND", "memory")
+    ANALYSIS_STORE_TTL_SECONDS: int = int(os.getenv("ANALYSIS_STORE_TTL_SECONDS", "0"))
+
+    # Upload: dung lượng tối đa (MB, vượt quá trả về 413) và ngưỡng (MB) để file upload
+    # được ghi ra file tạm trên đĩa thay vì giữ trong RAM
+    MAX_UPLOAD_BYTES: int = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+    UPLOAD_SPOOL_THRESHOLD_BYTES: int = int(float(os.getenv("UPLOAD_SPOOL_THRESHOLD_MB", "1")) * 1024 * 1024)
+
+    # Download file từ link: dung lượng tối đa (MB), timeout kết nối / đọc (giây),
+    # số lần thử lại khi lỗi tạm thời và số kết nối keep-alive tối đa
+    DOWNLOAD_MAX_BYTES: int = int(float(os.getenv("DOWNLOAD_MAX_MB", "50")) * 1024 * 1024)
+    DOWNLOAD_CONNECT_TIMEOUT: float = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+    DOWNLOAD_READ_TIMEOUT: float = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "30"))
+    DOWNLOAD_RETRIES: int = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+    DOWNLOAD_RETRY_BACKOFF_SECONDS: float = float(os.getenv("DOWNLOAD_RETRY_BACKOFF_SECONDS", "0.5"))
+    DOWNLOAD_MAX_CONNECTIONS: int = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "20"))
+
+    # Cache file download từ link trên đĩa, revalidate bằng ETag/Last-Modified (0 = tắt cache)
+    DOWNLOAD_CACHE_DIR: str = os.getenv("DOWNLOAD_CACHE_DIR",
+                                        os.path.join(tempfile.gettempdir(), "grade_analyzer_downloads"))
+    DOWNLOAD_CACHE_MAX_BYTES: int = int(float(os.getenv("DOWNLOAD_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
     # Security
     BCRYPT_ROUNDS: int = 12
     
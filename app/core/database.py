@@ -0,0 +1,41 @@
+"""
+Kết nối MongoDB dùng chung: một AsyncIOMotorClient (một connection pool) cho cả process
+"""
+
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+
+
+class MongoConnection:
+    """
+    Tạo AsyncIOMotorClient khi cần lần đầu và dùng lại cho AuthService, nơi lưu job và nơi lưu
+    kết quả phân tích. Tạo client là thao tác đồng bộ (chưa kết nối) nên không có hai client
+    được tạo song song.
+    """
+
+    def __init__(self, url: str = settings.MONGODB_URL, database: str = settings.MONGODB_DATABASE):
+        self.url = url
+        self.database = database
+        self._client: Optional[AsyncIOMotorClient] = None
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            self._client = AsyncIOMotorClient(self.url)
+        return self._client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.client[self.database]
+
+    def close(self):
+        """Đóng connection pool (khi tắt ứng dụng)"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+# Singleton instance
+mongo_connection = MongoConnection()
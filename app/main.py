@@ -1,11 +1,19 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
 import os
 import uvicorn
 
+from app.core.config import settings
 from app.api.endpoints import router
 from app.api.auth_endpoints import router as auth_router
+from app.services.worker_pool import worker_pool
+from app.services.job_manager import job_manager
+from app.services.analysis_store import analysis_store
+from app.core.database import mongo_connection
+from app.services.downloader import file_downloader
+from app.middleware.upload_limit_middleware import UploadSizeLimitMiddleware
 
 # Tạo thư mục uploads nếu chưa tồn tại
 os.makedirs("uploads", exist_ok=True)
@@ -28,11 +36,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Giới hạn dung lượng upload: body vượt quá bị từ chối (413) trước khi đọc hết
+# (endpoint batch nhận nhiều file nên có giới hạn riêng)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_BYTES,
+    path_limits={"/api/v1/batch-analyze": settings.BATCH_MAX_UPLOAD_BYTES}
+)
+
+# File upload lớn hơn ngưỡng được spool ra file tạm trên đĩa thay vì giữ trong RAM
+MultiPartParser.max_file_size = settings.UPLOAD_SPOOL_THRESHOLD_BYTES
+
 # Include router
 app.include_router(router, prefix="/api/v1", tags=["Grade Analysis"])
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Khởi động sẵn process pool phân tích"""
+    worker_pool.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Dừng các job đang chạy, đóng nơi lưu kết quả, kết nối MongoDB, process pool và các kết nối download khi tắt ứng dụng"""
+    await job_manager.shutdown()
+    await analysis_store.close()
+    mongo_connection.close()
+    worker_pool.shutdown()
+    await file_downloader.close()
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom exception handler"""
@@ -41,7 +76,8 @@ async def http_exception_handler(request, exc):
         content={
             "error": exc.detail,
             "details": f"Request: {request.method} {request.url}"
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
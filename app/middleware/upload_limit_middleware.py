@@ -0,0 +1,81 @@
+"""
+Middleware giới hạn kích thước body của request (upload file)
+"""
+
+import logging
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Từ chối sớm (413) request có body lớn hơn max_bytes
+
+    Kiểm tra Content-Length trước khi đọc body; với body không có Content-Length (chunked)
+    thì đếm số byte nhận được và dừng ngay khi vượt giới hạn thay vì đọc hết body.
+    path_limits cho phép đặt giới hạn riêng theo path (ví dụ endpoint batch nhận nhiều file).
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = settings.MAX_UPLOAD_BYTES,
+                 path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        max_bytes = self.path_limits.get(scope.get("path"), self.max_bytes) if scope["type"] == "http" else 0
+        if max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            await self._reject(scope, receive, send, max_bytes)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            message = await receive()
+
+            if message["type"] == "http.request" and not rejected:
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    rejected = True
+                    await self._reject(scope, receive, send, max_bytes)
+                    # Báo cho ứng dụng là client đã ngắt để dừng đọc body
+                    return {"type": "http.disconnect"}
+
+            return message
+
+        async def guarded_send(message: Message):
+            # Response 413 đã được gửi, bỏ qua response của ứng dụng
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, max_bytes: int):
+        """Trả về 413 theo format lỗi chung của API"""
+        logger.warning(f"Rejected request body larger than {max_bytes} bytes: {scope.get('path')}")
+        response = JSONResponse(
+            status_code=413,
+            content={
+                "error": f"File vượt quá dung lượng cho phép ({max_bytes / (1024 * 1024):g} MB)",
+                "details": f"Request: {scope.get('method')} {scope.get('path')}"
+            }
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,341 @@
+"""
+Object nội bộ (dùng __slots__) cho pipeline phân tích
+
+GradeAnalyzer làm việc trên các object này thay vì model Pydantic: dữ liệu đã được
+validate khi làm sạch nên không cần validate lại cho từng học sinh / môn. Tên thuộc tính
+giống hệt model trong schemas.py; chuyển sang model Pydantic một lần ở biên API bằng
+to_model() (dựng tin cậy, không validate lại).
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic.version import VERSION as PYDANTIC_VERSION
+
+from app.models.schemas import (
+    AnalysisResult, ClassStatistics, Grade, GradeLevel, Student, StudentSummary,
+    SubjectStatistics, TopStudent
+)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_object_new = object.__new__
+_object_setattr = object.__setattr__
+
+# Đường dựng nhanh ghi thẳng các thuộc tính nội bộ của model, đúng với Pydantic 2.5
+# (requirements.txt ghim pydantic==2.5.0); phiên bản khác dùng model_construct()
+_FAST_CONSTRUCT = PYDANTIC_VERSION.startswith("2.5.")
+
+# Tên các field của mỗi model (object luôn có đủ mọi field)
+_FIELD_NAMES: Dict[type, frozenset] = {}
+
+
+def construct_model(model_cls: Type[ModelT], values: Dict[str, Any]) -> ModelT:
+    """
+    Dựng model Pydantic từ giá trị đã hợp lệ, không validate
+
+    Giống model_construct() nhưng values phải có đủ mọi field và model không có extra /
+    private attribute, nhờ đó bỏ qua được bước điền giá trị mặc định và nhanh hơn khoảng 3 lần
+    (mỗi kết quả lớn dựng hàng trăm nghìn model). Mỗi object có fields_set riêng.
+    """
+    if not _FAST_CONSTRUCT:
+        return model_cls.model_construct(**values)
+
+    field_names = _FIELD_NAMES.get(model_cls)
+    if field_names is None:
+        field_names = _FIELD_NAMES[model_cls] = frozenset(model_cls.model_fields)
+
+    model = _object_new(model_cls)
+    _object_setattr(model, "__dict__", values)
+    _object_setattr(model, "__pydantic_fields_set__", set(field_names))
+    _object_setattr(model, "__pydantic_extra__", None)
+    _object_setattr(model, "__pydantic_private__", None)
+    return model
+
+
+class GradeRecord:
+    """Điểm một môn (tương ứng Grade)"""
+
+    __slots__ = ("subject", "score")
+
+    def __init__(self, subject: str, score: float):
+        self.subject = subject
+        self.score = score
+
+    def to_model(self) -> Grade:
+        return construct_model(Grade, {"subject": self.subject, "score": self.score})
+
+
+class StudentRecord:
+    """Học sinh và danh sách điểm theo thứ tự gốc (tương ứng Student)"""
+
+    __slots__ = ("id", "name", "class_name", "grades")
+
+    def __init__(self, id: str, name: str, class_name: str, grades: List[GradeRecord]):
+        self.id = id
+        self.name = name
+        self.class_name = class_name
+        self.grades = grades
+
+    def to_model(self) -> Student:
+        return construct_model(Student, {
+            "id": self.id,
+            "name": self.name,
+            "class_name": self.class_name,
+            "grades": [grade.to_model() for grade in self.grades]
+        })
+
+
+class StudentSummaryRecord:
+    """Kết quả phân tích một học sinh (tương ứng StudentSummary)"""
+
+    __slots__ = ("student", "average_score", "rank", "grade_level", "weak_subjects", "strong_subjects")
+
+    def __init__(self, student: StudentRecord, average_score: float, rank: int, grade_level: GradeLevel,
+                 weak_subjects: List[str], strong_subjects: List[str]):
+        self.student = student
+        self.average_score = average_score
+        self.rank = rank
+        self.grade_level = grade_level
+        self.weak_subjects = weak_subjects
+        self.strong_subjects = strong_subjects
+
+    def to_model(self) -> StudentSummary:
+        return construct_model(StudentSummary, {
+            "student": self.student.to_model(),
+            "average_score": self.average_score,
+            "rank": self.rank,
+            "grade_level": self.grade_level,
+            "weak_subjects": self.weak_subjects,
+            "strong_subjects": self.strong_subjects
+        })
+
+
+class StudentProfile:
+    """
+    Các chỉ số của một học sinh dùng cho xếp loại, thống kê và gợi ý (chỉ dùng nội bộ)
+
+    Được tính một lần cho mỗi học sinh trong một lần phân tích; các bước sau chỉ đọc lại.
+    min_score là None và mọi điều kiện học sinh giỏi là False khi học sinh không có điểm.
+    """
+
+    __slots__ = ("student", "average_score", "min_score", "math_score", "literature_score",
+                 "grade_level", "average_condition", "min_score_condition", "math_literature_condition")
+
+    def __init__(self, student: StudentRecord, average_score: float, min_score: Optional[float],
+                 math_score: float, literature_score: float, grade_level: GradeLevel,
+                 average_condition: bool, min_score_condition: bool, math_literature_condition: bool):
+        self.student = student
+        self.average_score = average_score
+        self.min_score = min_score
+        self.math_score = math_score
+        self.literature_score = literature_score
+        self.grade_level = grade_level
+        self.average_condition = average_condition
+        self.min_score_condition = min_score_condition
+        self.math_literature_condition = math_literature_condition
+
+    @property
+    def is_excellent(self) -> bool:
+        return self.average_condition and self.min_score_condition and self.math_literature_condition
+
+
+class GradeClassification:
+    """
+    Xếp loại và điều kiện học sinh giỏi của cả lớp / khối dạng mảng (mỗi phần tử một học sinh)
+
+    - average_scores / min_scores / math_scores / literature_scores: float64 (min_scores là
+      NaN khi học sinh không có điểm, điểm Toán / Văn là 0.0 khi không có môn đó)
+    - level_codes: chỉ số trong GRADE_LEVELS (0 = Giỏi ... 3 = Yếu)
+    - average_condition / min_score_condition / math_literature_condition: mảng bool
+    """
+
+    GRADE_LEVELS = (GradeLevel.EXCELLENT, GradeLevel.GOOD, GradeLevel.AVERAGE, GradeLevel.WEAK)
+
+    __slots__ = ("average_scores", "min_scores", "math_scores", "literature_scores", "level_codes",
+                 "average_condition", "min_score_condition", "math_literature_condition")
+
+    def __init__(self, average_scores: np.ndarray, min_scores: np.ndarray, math_scores: np.ndarray,
+                 literature_scores: np.ndarray, level_codes: np.ndarray, average_condition: np.ndarray,
+                 min_score_condition: np.ndarray, math_literature_condition: np.ndarray):
+        self.average_scores = average_scores
+        self.min_scores = min_scores
+        self.math_scores = math_scores
+        self.literature_scores = literature_scores
+        self.level_codes = level_codes
+        self.average_condition = average_condition
+        self.min_score_condition = min_score_condition
+        self.math_literature_condition = math_literature_condition
+
+    def __len__(self) -> int:
+        return len(self.level_codes)
+
+    @property
+    def is_excellent(self) -> np.ndarray:
+        return self.average_condition & self.min_score_condition & self.math_literature_condition
+
+    @property
+    def grade_levels(self) -> List[GradeLevel]:
+        return [self.GRADE_LEVELS[code] for code in self.level_codes.tolist()]
+
+    def to_profiles(self, students: List[StudentRecord]) -> List[StudentProfile]:
+        """StudentProfile của từng học sinh (students theo cùng thứ tự)"""
+        min_scores = [None if score != score else score for score in self.min_scores.tolist()]  # NaN → None
+        return [
+            StudentProfile(*values)
+            for values in zip(students, self.average_scores.tolist(), min_scores, self.math_scores.tolist(),
+                              self.literature_scores.tolist(), self.grade_levels, self.average_condition.tolist(),
+                              self.min_score_condition.tolist(), self.math_literature_condition.tolist())
+        ]
+
+
+class RecommendationFacts:
+    """
+    Các số liệu về học sinh mà gợi ý cần (chỉ dùng nội bộ): số học sinh theo từng nhóm và vài học
+    sinh đầu tiên của nhóm theo thứ hạng. Được tính từ danh sách học sinh khi phân tích đầy đủ, hoặc
+    đọc thẳng từ chỉ mục thứ hạng khi cập nhật tăng dần.
+
+    - excellent_students / weak_students: StudentSummaryRecord của học sinh giỏi (tối đa 2) / yếu
+      (tối đa 3) đầu tiên theo thứ hạng
+    - near_excellent_students: StudentProfile của tối đa 3 học sinh đầu tiên chưa giỏi có TB >= 7.5
+    """
+
+    __slots__ = ("total_students", "excellent_count", "weak_count", "critical_count",
+                 "excellent_students", "weak_students", "near_excellent_students",
+                 "students_with_good_average", "students_no_low_scores", "students_math_lit_good")
+
+    def __init__(self, total_students: int, excellent_count: int, weak_count: int, critical_count: int,
+                 excellent_students: List[StudentSummaryRecord], weak_students: List[StudentSummaryRecord],
+                 near_excellent_students: List[StudentProfile], students_with_good_average: int,
+                 students_no_low_scores: int, students_math_lit_good: int):
+        self.total_students = total_students
+        self.excellent_count = excellent_count
+        self.weak_count = weak_count
+        self.critical_count = critical_count
+        self.excellent_students = excellent_students
+        self.weak_students = weak_students
+        self.near_excellent_students = near_excellent_students
+        self.students_with_good_average = students_with_good_average
+        self.students_no_low_scores = students_no_low_scores
+        self.students_math_lit_good = students_math_lit_good
+
+
+class TopStudentRecord:
+    """Tên và điểm của học sinh trong top / danh sách cần hỗ trợ (tương ứng TopStudent)"""
+
+    __slots__ = ("name", "score")
+
+    def __init__(self, name: str, score: float):
+        self.name = name
+        self.score = score
+
+    def to_model(self) -> TopStudent:
+        return construct_model(TopStudent, {"name": self.name, "score": self.score})
+
+
+class SubjectStatisticsRecord:
+    """Thống kê một môn (tương ứng SubjectStatistics)"""
+
+    __slots__ = ("subject", "average_score", "highest_score", "lowest_score", "highest_score_student",
+                 "lowest_score_student", "total_students", "pass_rate", "excellent_count", "good_count",
+                 "average_count", "weak_count")
+
+    def __init__(self, subject: str, average_score: float, highest_score: float, lowest_score: float,
+                 highest_score_student: str, lowest_score_student: str, total_students: int,
+                 pass_rate: float, excellent_count: int = 0, good_count: int = 0,
+                 average_count: int = 0, weak_count: int = 0):
+        self.subject = subject
+        self.average_score = average_score
+        self.highest_score = highest_score
+        self.lowest_score = lowest_score
+        self.highest_score_student = highest_score_student
+        self.lowest_score_student = lowest_score_student
+        self.total_students = total_students
+        self.pass_rate = pass_rate
+        self.excellent_count = excellent_count
+        self.good_count = good_count
+        self.average_count = average_count
+        self.weak_count = weak_count
+
+    def to_model(self) -> SubjectStatistics:
+        return construct_model(SubjectStatistics, {slot: getattr(self, slot) for slot in self.__slots__})
+
+
+class ClassStatisticsRecord:
+    """Thống kê lớp (tương ứng ClassStatistics)"""
+
+    __slots__ = ("class_name", "total_students", "overall_average", "highest_score", "lowest_score",
+                 "grade_distribution", "top_students", "weak_students", "subject_statistics")
+
+    def __init__(self, class_name: str, total_students: int, overall_average: float, highest_score: float,
+                 lowest_score: float, grade_distribution: Dict[str, int], top_students: List[TopStudentRecord],
+                 weak_students: List[TopStudentRecord], subject_statistics: List[SubjectStatisticsRecord]):
+        self.class_name = class_name
+        self.total_students = total_students
+        self.overall_average = overall_average
+        self.highest_score = highest_score
+        self.lowest_score = lowest_score
+        self.grade_distribution = grade_distribution
+        self.top_students = top_students
+        self.weak_students = weak_students
+        self.subject_statistics = subject_statistics
+
+    def to_model(self) -> ClassStatistics:
+        return construct_model(ClassStatistics, {
+            "class_name": self.class_name,
+            "total_students": self.total_students,
+            "overall_average": self.overall_average,
+            "highest_score": self.highest_score,
+            "lowest_score": self.lowest_score,
+            "grade_distribution": self.grade_distribution,
+            "top_students": [student.to_model() for student in self.top_students],
+            "weak_students": [student.to_model() for student in self.weak_students],
+            "subject_statistics": [subject_stats.to_model() for subject_stats in self.subject_statistics]
+        })
+
+
+class ClassDigest:
+    """
+    Phần kết quả phân tích một lớp mà tổng hợp toàn trường cần (chỉ dùng nội bộ), lấy từ các mảng
+    đã tính khi phân tích lớp đó để không phải tính lại
+
+    - names / class_names / average_scores / level_codes: mỗi phần tử một học sinh, theo thứ tự
+      trong lớp (level_codes: chỉ số trong GradeClassification.GRADE_LEVELS)
+    - subject_index: môn → (điểm, chỉ số học sinh trong lớp), như ScoreMatrix.subject_index
+    """
+
+    __slots__ = ("names", "class_names", "average_scores", "level_codes", "subject_index")
+
+    def __init__(self, names: np.ndarray, class_names: np.ndarray, average_scores: np.ndarray,
+                 level_codes: np.ndarray, subject_index: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.names = names
+        self.class_names = class_names
+        self.average_scores = average_scores
+        self.level_codes = level_codes
+        self.subject_index = subject_index
+
+    def __len__(self) -> int:
+        return len(self.average_scores)
+
+    @property
+    def class_name(self) -> str:
+        return self.class_names[0] if len(self.class_names) else ""
+
+    @property
+    def overall_average(self) -> float:
+        """Điểm TB chung của lớp, giống hệt overall_average trong ClassStatistics của lớp"""
+        values = self.average_scores.tolist()
+        return round(sum(values) / len(values), 2) if values else 0.0
+
+
+def build_analysis_result(file_id: str, class_statistics: ClassStatisticsRecord,
+                          student_summaries: List[StudentSummaryRecord],
+                          recommendations: List[str]) -> AnalysisResult:
+    """Chuyển kết quả nội bộ sang AnalysisResult (model trả về API)"""
+    return construct_model(AnalysisResult, {
+        "file_id": file_id,
+        "class_statistics": class_statistics.to_model(),
+        "student_summaries": [summary.to_model() for summary in student_summaries],
+        "recommendations": recommendations
+    })
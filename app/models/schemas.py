@@ -72,6 +72,100 @@ class AnalysisResult(BaseModel):
     recommendations: List[str] = Field(default_factory=list, description="Gợi ý cải thiện")
 
 
+class SchoolTopStudent(BaseModel):
+    name: str = Field(..., description="Tên học sinh")
+    class_name: str = Field(..., description="Lớp")
+    score: float = Field(..., description="Điểm trung bình")
+    rank: int = Field(..., description="Thứ hạng toàn trường")
+
+
+class ClassRanking(BaseModel):
+    class_name: str = Field(..., description="Tên lớp")
+    total_students: int = Field(..., description="Tổng số học sinh")
+    average_score: float = Field(..., description="Điểm trung bình chung của lớp")
+    rank: int = Field(..., description="Thứ hạng của lớp trong trường")
+
+
+class SchoolSummary(BaseModel):
+    """Tổng hợp toàn trường: xếp hạng, phân bố xếp loại và thống kê môn trên mọi học sinh"""
+    total_classes: int = Field(..., description="Số lớp")
+    total_students: int = Field(..., description="Tổng số học sinh")
+    overall_average: float = Field(..., description="Điểm trung bình chung toàn trường")
+    highest_score: float = Field(..., description="Điểm cao nhất toàn trường")
+    lowest_score: float = Field(..., description="Điểm thấp nhất toàn trường")
+    grade_distribution: Dict[str, int] = Field(..., description="Phân bố xếp loại toàn trường")
+    top_students: List[SchoolTopStudent] = Field(..., description="Top học sinh toàn trường")
+    class_ranking: List[ClassRanking] = Field(..., description="Xếp hạng lớp theo điểm trung bình chung")
+    subject_statistics: List[SubjectStatistics] = Field(..., description="Thống kê theo môn toàn trường")
+
+
+class SchoolAnalysisResult(BaseModel):
+    """Kết quả phân tích workbook nhiều lớp (mỗi sheet hoặc mỗi lớp trong cột Lớp là một lớp)"""
+    file_id: str = Field(..., description="ID file đã xử lý")
+    classes: List[AnalysisResult] = Field(..., description="Kết quả phân tích theo từng lớp")
+    school_summary: Optional[SchoolSummary] = Field(None, description="Tổng hợp toàn trường (khi có nhiều lớp)")
+
+
+class ScoreUpdate(BaseModel):
+    """Sửa (hoặc thêm) điểm một môn của học sinh; học sinh chưa có được thêm vào lớp"""
+    student_name: str = Field(..., min_length=1, description="Tên học sinh")
+    class_name: Optional[str] = Field(None, description="Lớp (bỏ trống khi kết quả chỉ có một lớp)")
+    subject: str = Field(..., min_length=1, description="Tên môn học")
+    score: float = Field(..., ge=0, le=10, description="Điểm số mới (0-10)")
+
+
+class ScoreRemoval(BaseModel):
+    """Xóa điểm một môn của học sinh, hoặc xóa học sinh khi không có subject"""
+    student_name: str = Field(..., min_length=1, description="Tên học sinh")
+    class_name: Optional[str] = Field(None, description="Lớp (bỏ trống khi kết quả chỉ có một lớp)")
+    subject: Optional[str] = Field(None, description="Môn cần xóa điểm (bỏ trống để xóa học sinh)")
+
+
+class ScoreDelta(BaseModel):
+    """Thay đổi điểm áp dụng lên kết quả phân tích đã lưu (removals được áp dụng trước updates)"""
+    updates: List[ScoreUpdate] = Field(default_factory=list, description="Điểm được sửa / thêm")
+    removals: List[ScoreRemoval] = Field(default_factory=list, description="Điểm / học sinh bị xóa")
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobStage(str, Enum):
+    """Các bước đã hoàn thành của job phân tích"""
+    PARSED = "parsed"
+    ANALYZED = "analyzed"
+    SERIALIZED = "serialized"
+
+
+class AnalysisJob(BaseModel):
+    """Trạng thái job phân tích bất đồng bộ (kết quả được lưu riêng)"""
+    job_id: str = Field(..., description="ID job")
+    client_id: str = Field(..., description="ID client đã tạo job")
+    source: str = Field(..., description="Tên file upload hoặc link")
+    status: JobStatus = Field(JobStatus.QUEUED, description="Trạng thái job")
+    stage: Optional[JobStage] = Field(None, description="Bước gần nhất đã hoàn thành")
+    message: Optional[str] = Field(None, description="Thông báo lỗi khi job thất bại")
+    created_at: datetime = Field(..., description="Thời điểm tạo job")
+    updated_at: datetime = Field(..., description="Thời điểm cập nhật gần nhất")
+    expires_at: datetime = Field(..., description="Thời điểm job và kết quả bị xóa")
+
+
+class StoredAnalysis(BaseModel):
+    """Thông tin một kết quả phân tích đã lưu (học sinh / môn được lưu riêng để truy vấn)"""
+    analysis_id: str = Field(..., description="ID kết quả phân tích đã lưu")
+    client_id: str = Field(..., description="ID client đã lưu kết quả")
+    source: str = Field(..., description="Tên file upload hoặc link")
+    file_id: str = Field(..., description="ID file đã xử lý")
+    class_names: List[str] = Field(..., description="Các lớp trong kết quả")
+    total_students: int = Field(..., description="Tổng số học sinh")
+    created_at: datetime = Field(..., description="Thời điểm lưu")
+    expires_at: Optional[datetime] = Field(None, description="Thời điểm kết quả bị xóa (None: giữ mãi)")
+
+
 class DataResponseDTO(BaseModel, Generic[T]):
     """
     Standard response format cho tất cả API endpoints
@@ -0,0 +1,264 @@
+"""
+Ma trận điểm dạng cột (học sinh × môn) dùng giữa ExcelProcessor và GradeAnalyzer
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.models.domain import GradeRecord, StudentRecord
+from app.models.schemas import Student
+
+
+class ScoreMatrix:
+    """
+    Bảng điểm dạng mảng: mỗi hàng một học sinh, mỗi cột một môn, ô trống là NaN
+
+    - ids / names / class_names: mảng object theo thứ tự học sinh (string dùng chung, không nhân bản)
+    - subjects: tên môn của từng cột. Một môn bị nhập trùng cho cùng học sinh được đặt
+      thêm cột (cùng tên môn) để không mất điểm nào
+    - scores: float64 (n_students × n_columns)
+    - grade_indptr / grade_columns: thứ tự điểm gốc của từng học sinh dạng CSR, điểm thứ j
+      của học sinh i nằm ở cột grade_columns[grade_indptr[i] + j]
+    """
+
+    __slots__ = ("ids", "names", "class_names", "subjects", "scores",
+                 "grade_indptr", "grade_columns")
+
+    def __init__(self, ids: np.ndarray, names: np.ndarray, class_names: np.ndarray,
+                 subjects: List[str], scores: np.ndarray,
+                 grade_indptr: np.ndarray, grade_columns: np.ndarray):
+        self.ids = ids
+        self.names = names
+        self.class_names = class_names
+        self.subjects = subjects
+        self.scores = scores
+        self.grade_indptr = grade_indptr
+        self.grade_columns = grade_columns
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls) -> "ScoreMatrix":
+        """Ma trận không có học sinh nào"""
+        no_objects = np.empty(0, dtype=object)
+        return cls(no_objects, no_objects, no_objects, [], np.empty((0, 0)),
+                   np.zeros(1, dtype=np.intp), np.empty(0, dtype=np.intp))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ScoreMatrix":
+        """Dựng từ DataFrame đã làm sạch (student_name, class_name, subject, score)"""
+        if df.empty:
+            return cls.empty()
+
+        # Mã học sinh cho từng cặp (tên, lớp) theo thứ tự xuất hiện đầu tiên
+        student_codes, keys = pd.MultiIndex.from_frame(df[['student_name', 'class_name']]).factorize()
+        names = keys.get_level_values(0).to_numpy(dtype=object)
+        class_names = keys.get_level_values(1).to_numpy(dtype=object)
+
+        return cls._build(student_codes, names, class_names,
+                          df['subject'], df['score'].to_numpy(dtype=float))
+
+    @classmethod
+    def from_records(cls, names: Sequence[str], class_names: Sequence[str],
+                     subjects: Sequence[str], scores: Sequence[float]) -> "ScoreMatrix":
+        """Dựng từ các cột (tên, lớp, môn, điểm) của bản ghi đã làm sạch"""
+        if len(names) == 0:
+            return cls.empty()
+
+        return cls.from_frame(pd.DataFrame({
+            'student_name': names,
+            'class_name': class_names,
+            'subject': subjects,
+            'score': scores
+        }))
+
+    @classmethod
+    def from_students(cls, students: Iterable[Student]) -> "ScoreMatrix":
+        """Dựng từ danh sách Student (giữ nguyên id và thứ tự, không gộp học sinh trùng tên)"""
+        students = list(students)
+        if not students:
+            return cls.empty()
+
+        counts = np.fromiter((len(student.grades) for student in students), dtype=np.intp,
+                             count=len(students))
+        student_codes = np.repeat(np.arange(len(students)), counts)
+        subjects = [grade.subject for student in students for grade in student.grades]
+        scores = np.fromiter((grade.score for student in students for grade in student.grades),
+                             dtype=float, count=len(subjects))
+
+        matrix = cls._build(student_codes,
+                            np.array([student.name for student in students], dtype=object),
+                            np.array([student.class_name for student in students], dtype=object),
+                            pd.Series(subjects, dtype=object), scores, n_students=len(students))
+        matrix.ids = np.array([student.id for student in students], dtype=object)
+        return matrix
+
+    @classmethod
+    def _build(cls, student_codes: np.ndarray, names: np.ndarray, class_names: np.ndarray,
+               subjects, scores: np.ndarray, n_students: Optional[int] = None) -> "ScoreMatrix":
+        """Đặt từng điểm vào ô (học sinh, cột môn) và ghi lại thứ tự điểm gốc"""
+        n_students = len(names) if n_students is None else n_students
+
+        # Mỗi tên môn chỉ giữ một string object dùng chung
+        subject_codes, subject_names = pd.factorize(subjects)
+        n_subjects = max(len(subject_names), 1)
+
+        # Lần xuất hiện thứ mấy của môn với học sinh đó (thường là 0; > 0 khi nhập trùng môn)
+        occurrence = pd.Series(subject_codes).groupby(
+            [student_codes, subject_codes], sort=False).cumcount().to_numpy()
+
+        # Cột = (lần xuất hiện, môn): các môn chính trước theo thứ tự xuất hiện, cột trùng ở sau
+        column_keys = occurrence * n_subjects + subject_codes
+        unique_keys, columns = np.unique(column_keys, return_inverse=True)
+        column_subjects = [subject_names[key] for key in (unique_keys % n_subjects).tolist()]
+
+        matrix = np.full((n_students, len(unique_keys)), np.nan)
+        matrix[student_codes, columns] = scores
+
+        # Thứ tự điểm của từng học sinh: sắp xếp ổn định theo mã học sinh
+        order = np.argsort(student_codes, kind='stable')
+        grade_indptr = np.zeros(n_students + 1, dtype=np.intp)
+        np.cumsum(np.bincount(student_codes, minlength=n_students), out=grade_indptr[1:])
+
+        # ID tự động: HS001, HS002, ...
+        ids = np.array([f"HS{index:03d}" for index in range(1, n_students + 1)], dtype=object)
+
+        return cls(ids, names, class_names, column_subjects, matrix,
+                   grade_indptr, columns[order].astype(np.intp))
+
+    @property
+    def grade_counts(self) -> np.ndarray:
+        """Số điểm của từng học sinh"""
+        return np.diff(self.grade_indptr)
+
+    @property
+    def grade_rows(self) -> np.ndarray:
+        """Hàng (học sinh) của từng điểm theo thứ tự CSR"""
+        return np.repeat(np.arange(len(self)), self.grade_counts)
+
+    def grade_scores(self) -> np.ndarray:
+        """Điểm theo thứ tự gốc của từng học sinh (nối liền theo CSR)"""
+        return self.scores[self.grade_rows, self.grade_columns]
+
+    def average_scores(self) -> List[float]:
+        """
+        Điểm trung bình (làm tròn 2 chữ số) của mọi học sinh, 0.0 nếu không có điểm
+
+        Cộng dồn theo thứ tự điểm gốc từng vị trí một để tổng giống hệt sum() trên
+        danh sách Grade, nhờ đó kết quả làm tròn không đổi so với cách tính theo object.
+        """
+        counts = self.grade_counts
+        if len(self) == 0:
+            return []
+
+        # Ma trận theo thứ tự điểm gốc, đệm 0.0 (cộng 0.0 không làm đổi tổng)
+        rows = self.grade_rows
+        positions = self.grade_positions()
+        ordered = np.zeros((len(self), int(counts.max(initial=0))))
+        ordered[rows, positions] = self.scores[rows, self.grade_columns]
+
+        totals = np.zeros(len(self))
+        for position in range(ordered.shape[1]):
+            totals += ordered[:, position]
+
+        averages = np.divide(totals, counts, out=np.zeros(len(self)), where=counts > 0)
+        return [round(average, 2) for average in averages.tolist()]
+
+    def take(self, rows: np.ndarray) -> "ScoreMatrix":
+        """Ma trận con gồm các học sinh ở rows (giữ thứ tự), chỉ giữ các cột có điểm"""
+        rows = np.asarray(rows, dtype=np.intp)
+        counts = self.grade_counts[rows]
+        grade_indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+        np.cumsum(counts, out=grade_indptr[1:])
+
+        # Vị trí trong CSR gốc của từng điểm của các học sinh được chọn
+        positions = (np.arange(grade_indptr[-1]) - np.repeat(grade_indptr[:-1], counts)
+                     + np.repeat(self.grade_indptr[rows], counts))
+        used_columns, grade_columns = np.unique(self.grade_columns[positions], return_inverse=True)
+
+        return ScoreMatrix(self.ids[rows], self.names[rows], self.class_names[rows],
+                           [self.subjects[column] for column in used_columns.tolist()],
+                           self.scores[np.ix_(rows, used_columns)], grade_indptr,
+                           grade_columns.astype(np.intp))
+
+    def split_by_class(self) -> List["ScoreMatrix"]:
+        """Tách thành một ma trận cho mỗi lớp (theo thứ tự lớp xuất hiện đầu tiên)"""
+        class_codes, class_names = pd.factorize(pd.Series(self.class_names, dtype=object))
+        if len(class_names) <= 1:
+            return [self]
+
+        # Một lần sắp xếp ổn định theo lớp cho mọi lớp, thứ tự học sinh trong lớp giữ nguyên
+        order = np.argsort(class_codes, kind='stable')
+        bounds = np.cumsum(np.bincount(class_codes, minlength=len(class_names)))[:-1]
+        return [self.take(rows) for rows in np.split(order, bounds)]
+
+    def subject_index(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Môn → (điểm, chỉ số học sinh), điểm của mỗi môn theo thứ tự học sinh rồi thứ tự điểm gốc
+
+        Giống GradeAnalyzer.build_subject_index nhưng tính trên mảng (môn nhập trùng nằm ở nhiều cột).
+        """
+        rows = self.grade_rows
+        scores = self.grade_scores()
+        return {
+            subject: (scores[indices], rows[indices])
+            for subject, indices in self.subject_grade_indices().items()
+        }
+
+    def subject_grade_indices(self) -> Dict[str, np.ndarray]:
+        """Môn → vị trí (trong thứ tự điểm gốc nối liền) các điểm của môn đó, theo thứ tự học sinh"""
+        subject_codes, subject_names = pd.factorize(pd.Series(self.subjects, dtype=object))
+        grade_codes = subject_codes[self.grade_columns]
+
+        order = np.argsort(grade_codes, kind='stable')
+        bounds = np.cumsum(np.bincount(grade_codes, minlength=len(subject_names)))[:-1]
+        return dict(zip(subject_names, np.split(order, bounds)))
+
+    def grade_positions(self) -> np.ndarray:
+        """Vị trí của từng điểm (thứ tự điểm gốc nối liền) trong danh sách điểm của học sinh đó"""
+        return np.arange(len(self.grade_columns)) - self.grade_indptr[self.grade_rows]
+
+    def last_grade_scores(self, columns: Sequence[int]) -> np.ndarray:
+        """
+        Điểm cuối cùng (theo thứ tự điểm gốc) của từng học sinh trong các cột đã cho, NaN nếu không có
+
+        Giống dict {môn: điểm} dựng lần lượt theo thứ tự điểm: điểm nhập sau ghi đè điểm trước.
+        """
+        if len(columns) == 1:
+            return self.scores[:, columns[0]].copy()
+
+        mask = np.isin(self.grade_columns, columns)
+        rows = self.grade_rows[mask]
+        values = self.grade_scores()[mask]
+
+        # Điểm được sắp theo học sinh rồi thứ tự gốc: lấy điểm cuối của mỗi học sinh
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+
+        result = np.full(len(self), np.nan)
+        result[rows[last]] = values[last]
+        return result
+
+    def to_records(self) -> List[StudentRecord]:
+        """Dựng StudentRecord (object nội bộ, không phải model Pydantic) cho GradeAnalyzer"""
+        grade_subjects = [self.subjects[column] for column in self.grade_columns.tolist()]
+        grade_scores = self.grade_scores().tolist()
+        indptr = self.grade_indptr.tolist()
+
+        students = []
+        for index, (student_id, name, class_name) in enumerate(
+                zip(self.ids.tolist(), self.names.tolist(), self.class_names.tolist())):
+            start, end = indptr[index], indptr[index + 1]
+            grades = [GradeRecord(subject, score)
+                      for subject, score in zip(grade_subjects[start:end], grade_scores[start:end])]
+            students.append(StudentRecord(student_id, name, class_name, grades))
+
+        return students
+
+    def to_students(self) -> List[Student]:
+        """Dựng Pydantic Student objects (chỉ dùng khi cần trả về response)"""
+        # Dữ liệu đã được validate khi làm sạch nên dựng model không validate lại
+        return [student.to_model() for student in self.to_records()]
@@ -0,0 +1,216 @@
+"""
+Cache bảng điểm đã parse và kết quả phân tích theo hash nội dung file (content-addressed)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.schemas import SchoolAnalysisResult
+from app.models.score_matrix import ScoreMatrix
+from app.services.spreadsheet_readers import FileSource, iter_source_blocks
+
+logger = logging.getLogger(__name__)
+
+# Số byte JSON xấp xỉ của từng phần kết quả (đo trên dữ liệu mẫu), dùng để ước lượng kích thước
+# bản ghi cache mà không phải serialize cả kết quả
+RESULT_BYTES = 200
+STUDENT_SUMMARY_BYTES = 170
+GRADE_BYTES = 40
+SUBJECT_STATISTICS_BYTES = 270
+LISTED_STUDENT_BYTES = 45
+CLASS_RANKING_BYTES = 90
+# Bảng điểm đã parse: mã / tên / lớp (mảng object) của mỗi học sinh
+PARSED_STUDENT_BYTES = 150
+
+# Hậu tố khóa của bảng điểm đã parse (cùng khóa nội dung với kết quả phân tích)
+PARSED_KEY_SUFFIX = "#parsed"
+
+
+def estimate_size(analysis: SchoolAnalysisResult) -> int:
+    """Kích thước ước lượng (byte) của kết quả theo số học sinh, số điểm, số môn và độ dài gợi ý"""
+    size = RESULT_BYTES
+    for result in analysis.classes:
+        class_stats = result.class_statistics
+        size += (RESULT_BYTES
+                 + STUDENT_SUMMARY_BYTES * len(result.student_summaries)
+                 + GRADE_BYTES * sum(len(summary.student.grades) for summary in result.student_summaries)
+                 + SUBJECT_STATISTICS_BYTES * len(class_stats.subject_statistics)
+                 + LISTED_STUDENT_BYTES * (len(class_stats.top_students) + len(class_stats.weak_students))
+                 + sum(len(recommendation) for recommendation in result.recommendations))
+
+    summary = analysis.school_summary
+    if summary is not None:
+        size += (RESULT_BYTES
+                 + LISTED_STUDENT_BYTES * len(summary.top_students)
+                 + CLASS_RANKING_BYTES * len(summary.class_ranking)
+                 + SUBJECT_STATISTICS_BYTES * len(summary.subject_statistics))
+    return size
+
+
+def estimate_parsed_size(class_matrices: List[ScoreMatrix]) -> int:
+    """Kích thước ước lượng (byte) của bảng điểm đã parse: các mảng điểm và chuỗi của từng học sinh"""
+    return sum(
+        matrix.scores.nbytes + matrix.grade_indptr.nbytes + matrix.grade_columns.nbytes
+        + PARSED_STUDENT_BYTES * len(matrix)
+        for matrix in class_matrices
+    )
+
+
+def with_file_id(analysis: SchoolAnalysisResult, file_id: str) -> SchoolAnalysisResult:
+    """Bản sao kết quả (dùng chung giữa các request) mang file_id của request hiện tại"""
+    if analysis.file_id == file_id and all(result.file_id == file_id for result in analysis.classes):
+        return analysis
+
+    return analysis.model_copy(update={
+        "file_id": file_id,
+        "classes": [result.model_copy(update={"file_id": file_id}) for result in analysis.classes]
+    })
+
+
+class CacheEntry:
+    """
+    Một bản ghi trong cache: kết quả phân tích (SchoolAnalysisResult) hoặc bảng điểm đã parse
+    của từng lớp (List[ScoreMatrix])
+    """
+
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class AnalysisCache:
+    """Cache LRU giới hạn theo dung lượng (byte) và thời gian sống (TTL)"""
+
+    def __init__(self, max_bytes: int = settings.ANALYSIS_CACHE_MAX_BYTES,
+                 ttl_seconds: int = settings.ANALYSIS_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def compute_key(file_content: FileSource, filename: str) -> str:
+        """Khóa cache: SHA-256 nội dung file kèm phần mở rộng (cùng bytes nhưng .csv/.xlsx parse khác nhau)"""
+        # Hash theo từng khối để không phải nạp cả file upload đã spool ra đĩa vào RAM
+        digest = hashlib.sha256()
+        for block in iter_source_blocks(file_content):
+            digest.update(block)
+        return AnalysisCache.key_from_digest(digest.hexdigest(), filename)
+
+    @staticmethod
+    def key_from_digest(hexdigest: str, filename: str) -> str:
+        """Khóa cache từ SHA-256 đã tính sẵn (VD: tính trong lúc download)"""
+        extension = os.path.splitext(filename)[1].lower()
+        return f"{hexdigest}{extension}"
+
+    def get(self, key: str, file_id: Optional[str] = None) -> Optional[SchoolAnalysisResult]:
+        """Lấy kết quả từ cache (đổi file_id theo request hiện tại), None nếu không có hoặc đã hết hạn"""
+        analysis = self._get(key)
+        if analysis is None or file_id is None:
+            return analysis
+
+        return with_file_id(analysis, file_id)
+
+    def get_parsed(self, key: str) -> Optional[List[ScoreMatrix]]:
+        """
+        Bảng điểm đã parse của từng lớp theo khóa nội dung, None nếu không có hoặc đã hết hạn
+
+        Dùng khi cùng nội dung được yêu cầu với các phần kết quả khác (sections) mà chưa có kết quả
+        phù hợp trong cache: chỉ cần phân tích lại, không phải parse lại file.
+        """
+        return self._get(key + PARSED_KEY_SUFFIX)
+
+    def put(self, key: str, analysis: SchoolAnalysisResult):
+        """Lưu kết quả vào cache, loại bỏ các bản ghi ít dùng nhất khi vượt dung lượng"""
+        self._put(key, analysis, estimate_size(analysis))
+
+    def put_parsed(self, key: str, class_matrices: List[ScoreMatrix]):
+        """Lưu bảng điểm đã parse của từng lớp theo khóa nội dung"""
+        self._put(key + PARSED_KEY_SUFFIX, class_matrices, estimate_parsed_size(class_matrices))
+
+    def _get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def _put(self, key: str, value: Any, size: int):
+        if not self.enabled:
+            return
+
+        if size > self.max_bytes:
+            logger.info(f"Cache entry {key} ({size} bytes) exceeds cache budget, not cached")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = CacheEntry(value, size, time.monotonic() + self.ttl_seconds)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        """Xóa một bản ghi (caller phải giữ lock)"""
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Thống kê hit/miss/eviction của cache"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Singleton instance
+analysis_cache = AnalysisCache()
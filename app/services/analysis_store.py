@@ -0,0 +1,519 @@
+"""
+Lưu kết quả phân tích để truy vấn lại (bộ nhớ hoặc MongoDB) mà không phải phân tích lại file
+
+Mỗi kết quả được lưu thành: một bản tổng quan (thống kê lớp, gợi ý, tổng hợp toàn trường),
+mỗi học sinh một document và mỗi (lớp, môn) một document. Danh sách học sinh được đánh chỉ mục
+theo lớp, xếp loại, điểm trung bình và môn yếu để trả lời các câu hỏi như "học sinh yếu môn Toán"
+hay "top 10" mà không phải đọc cả kết quả.
+"""
+
+import asyncio
+import logging
+import uuid
+import zlib
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.config import settings
+from app.core.database import MongoConnection, mongo_connection
+from app.models.domain import construct_model
+from app.models.schemas import (
+    Grade, GradeLevel, SchoolAnalysisResult, StoredAnalysis, Student, StudentSummary
+)
+
+logger = logging.getLogger(__name__)
+
+# Các trường có thể dùng để sắp xếp danh sách học sinh
+SORT_FIELDS = ("rank", "name", "average_score")
+
+# Số document mỗi lần ghi vào MongoDB
+INSERT_BATCH_SIZE = 1000
+
+
+def _class_key(class_name: Optional[str]) -> Optional[str]:
+    """Tên lớp như khi làm sạch dữ liệu (chữ hoa), None nếu trống"""
+    return class_name.strip().upper() if class_name and class_name.strip() else None
+
+
+def _subject_key(subject: Optional[str]) -> Optional[str]:
+    """Khóa so khớp tên môn không phân biệt hoa thường, None nếu trống"""
+    return subject.strip().lower() if subject and subject.strip() else None
+
+
+class StudentQuery:
+    """
+    Điều kiện lọc, sắp xếp và phân trang danh sách học sinh đã lưu
+
+    Cùng giá trị sắp xếp thì học sinh giữ thứ tự trong kết quả (theo lớp, rồi theo thứ hạng),
+    kể cả khi sắp xếp giảm dần. limit là None thì lấy hết.
+    """
+
+    __slots__ = ("class_name", "grade_level", "weak_subject", "min_average", "max_average",
+                 "sort_by", "descending", "skip", "limit")
+
+    def __init__(self, class_name: Optional[str] = None, grade_level: Optional[GradeLevel] = None,
+                 weak_subject: Optional[str] = None, min_average: Optional[float] = None,
+                 max_average: Optional[float] = None, sort_by: str = "rank", descending: bool = False,
+                 skip: int = 0, limit: Optional[int] = None):
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"sort_by không hợp lệ: {sort_by}. Chỉ chấp nhận: {', '.join(SORT_FIELDS)}")
+
+        self.class_name = _class_key(class_name)
+        self.grade_level = grade_level
+        self.weak_subject = _subject_key(weak_subject)
+        self.min_average = min_average
+        self.max_average = max_average
+        self.sort_by = sort_by
+        self.descending = descending
+        self.skip = skip
+        self.limit = limit
+
+    @property
+    def has_filters(self) -> bool:
+        return (self.class_name is not None or self.grade_level is not None or self.weak_subject is not None
+                or self.min_average is not None or self.max_average is not None)
+
+    def matches(self, summary: StudentSummary) -> bool:
+        """Học sinh thỏa mọi điều kiện lọc"""
+        if self.class_name is not None and summary.student.class_name != self.class_name:
+            return False
+        if self.grade_level is not None and summary.grade_level != self.grade_level:
+            return False
+        if self.weak_subject is not None and not any(subject.lower() == self.weak_subject
+                                                     for subject in summary.weak_subjects):
+            return False
+        if self.min_average is not None and summary.average_score < self.min_average:
+            return False
+        if self.max_average is not None and summary.average_score > self.max_average:
+            return False
+        return True
+
+
+def overview_json(analysis: SchoolAnalysisResult) -> bytes:
+    """Kết quả không kèm danh sách học sinh (thống kê lớp, gợi ý, tổng hợp toàn trường)"""
+    return analysis.model_dump_json(exclude={"classes": {"__all__": {"student_summaries"}}}).encode("utf-8")
+
+
+def subject_rows(analysis: SchoolAnalysisResult) -> List[Dict[str, Any]]:
+    """Mỗi (lớp, môn) một dòng: class_name và các trường của SubjectStatistics"""
+    return [{"class_name": result.class_statistics.class_name, **subject_stats.model_dump()}
+            for result in analysis.classes for subject_stats in result.class_statistics.subject_statistics]
+
+
+class AnalysisStore:
+    """
+    Interface chung cho nơi lưu kết quả phân tích
+
+    Kết quả được lưu một lần sau khi phân tích và chỉ được đọc lại qua các truy vấn;
+    kết quả hết hạn sau ttl_seconds kể từ lúc lưu (0 = giữ cho đến khi bị xóa).
+    """
+
+    def __init__(self, ttl_seconds: int = settings.ANALYSIS_STORE_TTL_SECONDS):
+        self.ttl = timedelta(seconds=ttl_seconds) if ttl_seconds > 0 else None
+        self.saved = 0
+        self.queries = 0
+
+    async def save(self, client_id: str, source: str, analysis: SchoolAnalysisResult) -> StoredAnalysis:
+        """Lưu kết quả phân tích, trả về thông tin kết quả đã lưu (kèm analysis_id)"""
+        now = datetime.utcnow()
+        info = StoredAnalysis(
+            analysis_id=uuid.uuid4().hex,
+            client_id=client_id,
+            source=source,
+            file_id=analysis.file_id,
+            class_names=[result.class_statistics.class_name for result in analysis.classes],
+            total_students=sum(result.class_statistics.total_students for result in analysis.classes),
+            created_at=now,
+            expires_at=now + self.ttl if self.ttl is not None else None
+        )
+        await self._insert(info, analysis)
+
+        self.saved += 1
+        logger.info(f"Stored analysis {info.analysis_id} for client {client_id}: {source}")
+        return info
+
+    async def get(self, analysis_id: str) -> Optional[StoredAnalysis]:
+        raise NotImplementedError
+
+    async def list(self, client_id: str) -> List[StoredAnalysis]:
+        """Các kết quả đã lưu của client, mới nhất trước"""
+        raise NotImplementedError
+
+    async def get_overview(self, analysis_id: str) -> Optional[bytes]:
+        """JSON bytes của kết quả không kèm danh sách học sinh"""
+        raise NotImplementedError
+
+    async def query_students(self, analysis_id: str, query: StudentQuery) -> Tuple[int, List[StudentSummary]]:
+        """Tổng số học sinh thỏa điều kiện lọc và các học sinh của trang được chọn"""
+        raise NotImplementedError
+
+    async def query_subjects(self, analysis_id: str, class_name: Optional[str] = None,
+                             subject: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Thống kê môn theo lớp (mỗi (lớp, môn) một dòng), lọc theo lớp / môn nếu có"""
+        raise NotImplementedError
+
+    async def delete(self, analysis_id: str) -> bool:
+        raise NotImplementedError
+
+    async def _insert(self, info: StoredAnalysis, analysis: SchoolAnalysisResult):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        """Số kết quả đã lưu và số truy vấn học sinh / môn trong process này"""
+        return {"saved": self.saved, "queries": self.queries}
+
+
+class IndexedAnalysis:
+    """
+    Kết quả phân tích đã lưu trong bộ nhớ cùng các chỉ mục của danh sách học sinh
+
+    Học sinh được đánh số theo thứ tự trong kết quả; mỗi chỉ mục lớp / xếp loại / môn yếu là
+    danh sách số thứ tự tăng dần, chỉ mục điểm trung bình là số thứ tự xếp theo điểm tăng dần.
+    Truy vấn chỉ duyệt chỉ mục nhỏ nhất trong các điều kiện lọc.
+    """
+
+    __slots__ = ("info", "overview", "summaries", "subjects", "by_class", "by_level", "by_weak_subject",
+                 "by_average", "sorted_averages", "_sort_values", "_orders")
+
+    def __init__(self, info: StoredAnalysis, analysis: SchoolAnalysisResult):
+        self.info = info
+        self.overview = zlib.compress(overview_json(analysis), 1)
+        self.summaries: List[StudentSummary] = [summary for result in analysis.classes
+                                                for summary in result.student_summaries]
+        self.subjects = subject_rows(analysis)
+
+        self.by_class: Dict[str, List[int]] = {}
+        self.by_level: Dict[GradeLevel, List[int]] = {}
+        self.by_weak_subject: Dict[str, List[int]] = {}
+        for position, summary in enumerate(self.summaries):
+            self.by_class.setdefault(summary.student.class_name, []).append(position)
+            self.by_level.setdefault(summary.grade_level, []).append(position)
+            for subject in {subject.lower() for subject in summary.weak_subjects}:
+                self.by_weak_subject.setdefault(subject, []).append(position)
+
+        averages = [summary.average_score for summary in self.summaries]
+        self.by_average = sorted(range(len(averages)), key=averages.__getitem__)
+        self.sorted_averages = [averages[position] for position in self.by_average]
+        # Giá trị sắp xếp theo số thứ tự học sinh
+        self._sort_values: Dict[str, List[Any]] = {
+            "rank": [summary.rank for summary in self.summaries],
+            "name": [summary.student.name.casefold() for summary in self.summaries],
+            "average_score": averages,
+        }
+        # Thứ tự sắp xếp của cả danh sách, tính khi được truy vấn lần đầu
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+
+    def order(self, sort_by: str, descending: bool) -> List[int]:
+        """Số thứ tự mọi học sinh theo cách sắp xếp (sort ổn định: cùng giá trị giữ thứ tự gốc)"""
+        order = self._orders.get((sort_by, descending))
+        if order is None:
+            order = self._orders[(sort_by, descending)] = sorted(
+                range(len(self.summaries)), key=self._sort_values[sort_by].__getitem__, reverse=descending
+            )
+        return order
+
+    def select(self, query: StudentQuery) -> Tuple[int, List[StudentSummary]]:
+        end = query.skip + query.limit if query.limit is not None else None
+        if not query.has_filters:
+            order = self.order(query.sort_by, query.descending)
+            return len(order), [self.summaries[position] for position in order[query.skip:end]]
+
+        candidates = []
+        if query.class_name is not None:
+            candidates.append(self.by_class.get(query.class_name, []))
+        if query.grade_level is not None:
+            candidates.append(self.by_level.get(query.grade_level, []))
+        if query.weak_subject is not None:
+            candidates.append(self.by_weak_subject.get(query.weak_subject, []))
+        if query.min_average is not None or query.max_average is not None:
+            low = bisect_left(self.sorted_averages, query.min_average) if query.min_average is not None else 0
+            high = (bisect_right(self.sorted_averages, query.max_average) if query.max_average is not None
+                    else len(self.sorted_averages))
+            candidates.append(sorted(self.by_average[low:high]) if low < high else [])
+
+        # Duyệt chỉ mục nhỏ nhất, kiểm tra các điều kiện còn lại trên từng học sinh
+        positions = min(candidates, key=len)
+        if len(candidates) > 1:
+            positions = [position for position in positions if query.matches(self.summaries[position])]
+        positions = sorted(positions, key=self._sort_values[query.sort_by].__getitem__, reverse=query.descending)
+        return len(positions), [self.summaries[position] for position in positions[query.skip:end]]
+
+    def select_subjects(self, class_name: Optional[str], subject: Optional[str]) -> List[Dict[str, Any]]:
+        return [row for row in self.subjects
+                if (class_name is None or row["class_name"] == class_name)
+                and (subject is None or row["subject"].lower() == subject)]
+
+
+class InMemoryAnalysisStore(AnalysisStore):
+    """Lưu trong bộ nhớ của process (dùng cho test / chạy một instance, mất khi khởi động lại)"""
+
+    def __init__(self, ttl_seconds: int = settings.ANALYSIS_STORE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self._analyses: Dict[str, IndexedAnalysis] = {}
+
+    def _purge_expired(self):
+        now = datetime.utcnow()
+        for analysis_id in [analysis_id for analysis_id, analysis in self._analyses.items()
+                            if analysis.info.expires_at is not None and analysis.info.expires_at <= now]:
+            del self._analyses[analysis_id]
+
+    def _get(self, analysis_id: str) -> Optional[IndexedAnalysis]:
+        analysis = self._analyses.get(analysis_id)
+        if analysis is None or (analysis.info.expires_at is not None
+                                and analysis.info.expires_at <= datetime.utcnow()):
+            return None
+        return analysis
+
+    async def _insert(self, info: StoredAnalysis, analysis: SchoolAnalysisResult):
+        self._purge_expired()
+        # Dựng chỉ mục ngoài event loop (lớp lớn có hàng chục nghìn học sinh)
+        self._analyses[info.analysis_id] = await asyncio.to_thread(IndexedAnalysis, info, analysis)
+
+    async def get(self, analysis_id: str) -> Optional[StoredAnalysis]:
+        analysis = self._get(analysis_id)
+        return analysis.info if analysis is not None else None
+
+    async def list(self, client_id: str) -> List[StoredAnalysis]:
+        self._purge_expired()
+        infos = [analysis.info for analysis in self._analyses.values() if analysis.info.client_id == client_id]
+        return sorted(infos, key=lambda info: info.created_at, reverse=True)
+
+    async def get_overview(self, analysis_id: str) -> Optional[bytes]:
+        analysis = self._get(analysis_id)
+        return zlib.decompress(analysis.overview) if analysis is not None else None
+
+    async def query_students(self, analysis_id: str, query: StudentQuery) -> Tuple[int, List[StudentSummary]]:
+        analysis = self._get(analysis_id)
+        if analysis is None:
+            return 0, []
+        self.queries += 1
+        return analysis.select(query)
+
+    async def query_subjects(self, analysis_id: str, class_name: Optional[str] = None,
+                             subject: Optional[str] = None) -> List[Dict[str, Any]]:
+        analysis = self._get(analysis_id)
+        if analysis is None:
+            return []
+        self.queries += 1
+        return analysis.select_subjects(_class_key(class_name), _subject_key(subject))
+
+    async def delete(self, analysis_id: str) -> bool:
+        return self._analyses.pop(analysis_id, None) is not None
+
+
+class MongoAnalysisStore(AnalysisStore):
+    """
+    Lưu trong MongoDB (Motor) để kết quả còn sau khi khởi động lại và dùng chung giữa nhiều instance
+
+    - analyses: thông tin kết quả và bản tổng quan (nén zlib)
+    - analysis_students: mỗi học sinh một document, index theo lớp, xếp loại, môn yếu (multikey)
+      cùng điểm trung bình, nên lọc và "top N" đều đọc thẳng từ index
+    - analysis_subjects: mỗi (lớp, môn) một document
+
+    Document học sinh / môn được ghi trước, thông tin kết quả ghi sau cùng nên kết quả đang lưu dở
+    không được thấy. Dùng chung connection pool với AuthService (mongo_connection). Kết quả hết hạn được MongoDB tự xóa bằng TTL index trên expires_at.
+    """
+
+    def __init__(self, connection: MongoConnection = mongo_connection,
+                 ttl_seconds: int = settings.ANALYSIS_STORE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.connection = connection
+        self.analyses_collection = None
+        self.students_collection = None
+        self.subjects_collection = None
+        self._initialized = False
+        self._initialize_lock = asyncio.Lock()
+
+    async def initialize(self):
+        """Khởi tạo collection và index (một lần, các request đến cùng lúc chờ lần khởi tạo đang chạy)"""
+        if self._initialized:
+            return
+
+        async with self._initialize_lock:
+            if not self._initialized:
+                await self._create_indexes()
+
+    async def _create_indexes(self):
+        try:
+            db = self.connection.db
+            self.analyses_collection = db["analyses"]
+            self.students_collection = db["analysis_students"]
+            self.subjects_collection = db["analysis_subjects"]
+
+            # Index cho các truy vấn (đều bắt đầu bằng analysis_id) và TTL index để MongoDB tự xóa kết quả hết hạn
+            await self.analyses_collection.create_index("analysis_id", unique=True)
+            await self.analyses_collection.create_index([("client_id", ASCENDING), ("created_at", DESCENDING)])
+            await self.students_collection.create_index([("analysis_id", ASCENDING), ("position", ASCENDING)],
+                                                        unique=True)
+            for field in ("class_name", "grade_level", "weak_subject_keys"):
+                await self.students_collection.create_index(
+                    [("analysis_id", ASCENDING), (field, ASCENDING), ("average_score", ASCENDING)]
+                )
+            await self.students_collection.create_index([("analysis_id", ASCENDING), ("average_score", ASCENDING)])
+            await self.subjects_collection.create_index([("analysis_id", ASCENDING), ("subject_key", ASCENDING)])
+            await self.subjects_collection.create_index([("analysis_id", ASCENDING), ("class_name", ASCENDING)])
+            for collection in (self.analyses_collection, self.students_collection, self.subjects_collection):
+                await collection.create_index("expires_at", expireAfterSeconds=0)
+
+            self._initialized = True
+            logger.info("MongoAnalysisStore initialized successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to initialize MongoAnalysisStore: {e}")
+            raise
+
+    def _active(self, analysis_id: str) -> Dict[str, Any]:
+        """Điều kiện kết quả còn hạn (TTL monitor của MongoDB chạy định kỳ nên vẫn lọc theo expires_at)"""
+        return {"analysis_id": analysis_id,
+                "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]}
+
+    @staticmethod
+    def _documents(info: StoredAnalysis, analysis: SchoolAnalysisResult) -> Tuple[List[Dict[str, Any]],
+                                                                                  List[Dict[str, Any]]]:
+        """Document học sinh và môn của kết quả"""
+        students = []
+        for result in analysis.classes:
+            for summary in result.student_summaries:
+                student = summary.student
+                students.append({
+                    "analysis_id": info.analysis_id,
+                    "position": len(students),
+                    "student_id": student.id,
+                    "name": student.name,
+                    "name_key": student.name.casefold(),
+                    "class_name": student.class_name,
+                    "grades": [{"subject": grade.subject, "score": grade.score} for grade in student.grades],
+                    "average_score": summary.average_score,
+                    "rank": summary.rank,
+                    "grade_level": summary.grade_level.value,
+                    "weak_subjects": summary.weak_subjects,
+                    "weak_subject_keys": sorted({subject.lower() for subject in summary.weak_subjects}),
+                    "strong_subjects": summary.strong_subjects,
+                    "expires_at": info.expires_at
+                })
+
+        subjects = [{"analysis_id": info.analysis_id, "position": position, "subject_key": row["subject"].lower(),
+                     **row, "expires_at": info.expires_at}
+                    for position, row in enumerate(subject_rows(analysis))]
+        return students, subjects
+
+    @staticmethod
+    def _summary(document: Dict[str, Any]) -> StudentSummary:
+        """StudentSummary từ document học sinh (dữ liệu đã hợp lệ khi lưu nên không validate lại)"""
+        student = construct_model(Student, {
+            "id": document["student_id"],
+            "name": document["name"],
+            "class_name": document["class_name"],
+            "grades": [construct_model(Grade, grade) for grade in document["grades"]]
+        })
+        return construct_model(StudentSummary, {
+            "student": student,
+            "average_score": document["average_score"],
+            "rank": document["rank"],
+            "grade_level": GradeLevel(document["grade_level"]),
+            "weak_subjects": document["weak_subjects"],
+            "strong_subjects": document["strong_subjects"]
+        })
+
+    async def _insert(self, info: StoredAnalysis, analysis: SchoolAnalysisResult):
+        await self.initialize()
+        students, subjects = await asyncio.to_thread(self._documents, info, analysis)
+        overview = await asyncio.to_thread(lambda: zlib.compress(overview_json(analysis), 1))
+
+        for start in range(0, len(students), INSERT_BATCH_SIZE):
+            await self.students_collection.insert_many(students[start:start + INSERT_BATCH_SIZE], ordered=False)
+        if subjects:
+            await self.subjects_collection.insert_many(subjects, ordered=False)
+        await self.analyses_collection.insert_one({**info.model_dump(), "overview": overview})
+
+    async def get(self, analysis_id: str) -> Optional[StoredAnalysis]:
+        await self.initialize()
+        document = await self.analyses_collection.find_one(self._active(analysis_id), {"_id": 0, "overview": 0})
+        return StoredAnalysis(**document) if document is not None else None
+
+    async def list(self, client_id: str) -> List[StoredAnalysis]:
+        await self.initialize()
+        cursor = self.analyses_collection.find(
+            {"client_id": client_id, "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]},
+            {"_id": 0, "overview": 0}
+        ).sort("created_at", DESCENDING)
+        return [StoredAnalysis(**document) async for document in cursor]
+
+    async def get_overview(self, analysis_id: str) -> Optional[bytes]:
+        await self.initialize()
+        document = await self.analyses_collection.find_one(self._active(analysis_id), {"_id": 0, "overview": 1})
+        if document is None:
+            return None
+        return await asyncio.to_thread(zlib.decompress, document["overview"])
+
+    async def query_students(self, analysis_id: str, query: StudentQuery) -> Tuple[int, List[StudentSummary]]:
+        await self.initialize()
+        self.queries += 1
+
+        conditions: Dict[str, Any] = {"analysis_id": analysis_id}
+        if query.class_name is not None:
+            conditions["class_name"] = query.class_name
+        if query.grade_level is not None:
+            conditions["grade_level"] = query.grade_level.value
+        if query.weak_subject is not None:
+            conditions["weak_subject_keys"] = query.weak_subject
+        if query.min_average is not None or query.max_average is not None:
+            conditions["average_score"] = {}
+            if query.min_average is not None:
+                conditions["average_score"]["$gte"] = query.min_average
+            if query.max_average is not None:
+                conditions["average_score"]["$lte"] = query.max_average
+
+        # Cùng giá trị thì giữ thứ tự trong kết quả, như sort ổn định của bản lưu trong bộ nhớ
+        field = {"name": "name_key", "average_score": "average_score", "rank": "rank"}[query.sort_by]
+        sort = [(field, DESCENDING if query.descending else ASCENDING), ("position", ASCENDING)]
+
+        total = await self.students_collection.count_documents(conditions)
+        cursor = self.students_collection.find(conditions, {"_id": 0}).sort(sort).skip(query.skip)
+        if query.limit is not None:
+            cursor = cursor.limit(query.limit)
+        return total, [self._summary(document) async for document in cursor]
+
+    async def query_subjects(self, analysis_id: str, class_name: Optional[str] = None,
+                             subject: Optional[str] = None) -> List[Dict[str, Any]]:
+        await self.initialize()
+        self.queries += 1
+
+        conditions: Dict[str, Any] = {"analysis_id": analysis_id}
+        class_name, subject = _class_key(class_name), _subject_key(subject)
+        if class_name is not None:
+            conditions["class_name"] = class_name
+        if subject is not None:
+            conditions["subject_key"] = subject
+
+        cursor = self.subjects_collection.find(
+            conditions, {"_id": 0, "analysis_id": 0, "position": 0, "subject_key": 0, "expires_at": 0}
+        ).sort("position", ASCENDING)
+        return [document async for document in cursor]
+
+    async def delete(self, analysis_id: str) -> bool:
+        await self.initialize()
+        # Xóa thông tin kết quả trước để kết quả không còn được thấy trong lúc xóa học sinh / môn
+        deleted = await self.analyses_collection.delete_one({"analysis_id": analysis_id})
+        await self.students_collection.delete_many({"analysis_id": analysis_id})
+        await self.subjects_collection.delete_many({"analysis_id": analysis_id})
+        return deleted.deleted_count > 0
+
+
+def get_analysis_store(backend: str = settings.ANALYSIS_STORE_BACKEND) -> AnalysisStore:
+    """Chọn nơi lưu kết quả phân tích: memory hoặc mongodb"""
+    backend = backend.lower()
+    if backend == "memory":
+        return InMemoryAnalysisStore()
+    if backend == "mongodb":
+        return MongoAnalysisStore()
+    raise ValueError(f"ANALYSIS_STORE_BACKEND không hợp lệ: {backend} (chỉ chấp nhận: memory, mongodb)")
+
+
+# Singleton instance
+analysis_store = get_analysis_store()
@@ -7,10 +7,10 @@ import hashlib
 import jwt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from motor.motor_asyncio import AsyncIOMotorClient
 import logging
 
 from app.core.config import settings
+from app.core.database import mongo_connection
 from app.models.auth_models import (
     ClientCredentials,
     TokenResponse,
@@ -39,8 +39,9 @@ class AuthService:
             return
             
         try:
-            self.client = AsyncIOMotorClient(settings.MONGODB_URL)
-            self.db = self.client[settings.MONGODB_DATABASE]
+            # Connection pool dùng chung với nơi lưu job / kết quả phân tích
+            self.client = mongo_connection.client
+            self.db = mongo_connection.db
             self.clients_collection = self.db["api_clients"]
             self.tokens_collection = self.db["api_tokens"]
             
@@ -0,0 +1,254 @@
+"""
+Cache file download từ link trên đĩa, revalidate bằng ETag / Last-Modified (conditional GET)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCacheEntry:
+    """Một file đã download: đường dẫn trên đĩa kèm validator của server"""
+
+    __slots__ = ("path", "size", "etag", "last_modified", "filename", "content_key")
+
+    def __init__(self, path: str, size: int, etag: Optional[str], last_modified: Optional[str],
+                 filename: str, content_key: str):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.filename = filename
+        self.content_key = content_key
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != "path"}
+
+
+class DownloadCache:
+    """
+    Cache LRU trên đĩa giới hạn theo tổng dung lượng
+
+    Mỗi bản ghi gồm file body (<hash>.body) và metadata (<hash>.json) để cache
+    vẫn dùng được sau khi khởi động lại ứng dụng.
+    """
+
+    # Tham số chữ ký của signed URL (Supabase token, S3/GCS presigned): đổi mỗi lần ký
+    # nhưng vẫn là cùng một object
+    SIGNATURE_PARAMS = {"token", "expires", "signature", "sig"}
+    SIGNATURE_PARAM_PREFIXES = ("x-amz-", "x-goog-")
+
+    # Cùng object Supabase Storage có thể được truy cập qua link public, signed hoặc authenticated
+    SUPABASE_OBJECT_PATHS = ("/object/sign/", "/object/public/", "/object/authenticated/")
+
+    # File tạm cũ hơn ngưỡng này là file ghi dở bị bỏ lại
+    STALE_TEMP_SECONDS = 3600
+
+    def __init__(self, directory: str = settings.DOWNLOAD_CACHE_DIR,
+                 max_bytes: int = settings.DOWNLOAD_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, DownloadCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @classmethod
+    def normalize_url(cls, url: str) -> str:
+        """Khóa cache: URL bỏ tham số chữ ký và fragment, các tham số còn lại được sắp xếp"""
+        parts = urlsplit(url)
+        query = sorted(
+            (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if name.lower() not in cls.SIGNATURE_PARAMS
+            and not name.lower().startswith(cls.SIGNATURE_PARAM_PREFIXES)
+        )
+
+        path = parts.path
+        for object_path in cls.SUPABASE_OBJECT_PATHS:
+            path = path.replace(object_path, "/object/")
+
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+    def _entry_base(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _ensure_loaded(self):
+        """Đọc metadata các file đã cache từ lần chạy trước (caller phải giữ lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+
+        records = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                # File ghi dở bị bỏ lại (process bị dừng giữa chừng)
+                temp_path = os.path.join(self.directory, name)
+                if os.path.getmtime(temp_path) < time.time() - self.STALE_TEMP_SECONDS:
+                    os.remove(temp_path)
+                continue
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            body_path = meta_path[:-len(".json")] + ".body"
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                records.append((os.path.getmtime(body_path), meta.pop("key"),
+                                DownloadCacheEntry(path=body_path, **meta)))
+            except (OSError, ValueError, KeyError, TypeError):
+                self._delete_files(meta_path[:-len(".json")])
+
+        # Thứ tự LRU theo thời điểm dùng gần nhất (mtime của file body)
+        for _, key, entry in sorted(records, key=lambda record: record[0]):
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+
+        self._evict()
+
+    def get(self, url: str) -> Optional[DownloadCacheEntry]:
+        """Bản ghi của URL (nếu có), dùng để gửi conditional GET"""
+        if not self.enabled:
+            return None
+
+        key = self.normalize_url(url)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.exists(entry.path):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def conditional_headers(self, entry: DownloadCacheEntry) -> Dict[str, str]:
+        """Header If-None-Match / If-Modified-Since cho bản ghi"""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def open(self, url: str, entry: DownloadCacheEntry) -> Optional[BinaryIO]:
+        """
+        Mở file body của bản ghi (server trả về 304 Not Modified), None nếu file đã bị xóa (bản
+        ghi bị loại bỏ sau khi get) — khi đó bản ghi bị bỏ khỏi cache, caller download lại
+        """
+        try:
+            # File đã mở vẫn đọc được kể cả khi bị loại bỏ ngay sau đó
+            f = open(entry.path, "rb")
+        except FileNotFoundError:
+            key = self.normalize_url(url)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+        try:
+            # Đánh dấu vừa được dùng để thứ tự LRU đúng cả sau khi khởi động lại
+            os.utime(entry.path)
+        except OSError:
+            pass
+        return f
+
+    def put(self, url: str, source: BinaryIO, size: int, etag: Optional[str],
+            last_modified: Optional[str], filename: str, content_key: str):
+        """Lưu body vừa download (chỉ khi server có trả về validator để revalidate sau này)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.misses += 1
+            self._ensure_loaded()
+        if not (etag or last_modified) or size > self.max_bytes:
+            return
+
+        key = self.normalize_url(url)
+        base = self._entry_base(key)
+        entry = DownloadCacheEntry(base + ".body", size, etag, last_modified, filename, content_key)
+
+        # Ghi ra file tạm rồi đổi tên để không bao giờ đọc phải file ghi dở
+        temp_paths = []
+        try:
+            source.seek(0)
+            body_fd, body_temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            temp_paths.append(body_temp)
+            with os.fdopen(body_fd, "wb") as f:
+                shutil.copyfileobj(source, f)
+            meta_fd, meta_temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            temp_paths.append(meta_temp)
+            with os.fdopen(meta_fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, **entry.to_dict()}, f)
+
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key, delete_files=False)
+                os.replace(body_temp, entry.path)
+                os.replace(meta_temp, base + ".json")
+                self._entries[key] = entry
+                self.current_bytes += size
+                self._evict()
+        except OSError as e:
+            # Lỗi ghi cache (đầy đĩa...) không làm hỏng request download
+            logger.warning(f"Could not store download cache entry for {key}: {e}")
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _evict(self):
+        """Loại bỏ các bản ghi ít dùng nhất khi vượt dung lượng (caller phải giữ lock)"""
+        while self.current_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str, delete_files: bool = True):
+        """Xóa một bản ghi (caller phải giữ lock)"""
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        if delete_files:
+            self._delete_files(entry.path[:-len(".body")])
+
+    def _delete_files(self, base: str):
+        for suffix in (".body", ".json"):
+            try:
+                os.remove(base + suffix)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Thống kê revalidate (hit = 304 Not Modified) / download mới / eviction"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Singleton instance
+download_cache = DownloadCache()
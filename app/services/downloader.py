@@ -0,0 +1,196 @@
+"""
+Download file từ link (Supabase) bằng HTTP client bất đồng bộ dùng chung
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import tempfile
+from typing import BinaryIO, Mapping, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.analysis_cache import AnalysisCache
+from app.services.download_cache import DownloadCache, download_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    # HTTP/2 cần package h2 (httpx[http2]), không có thì dùng HTTP/1.1 keep-alive
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def filename_from_response(url: str, headers: Mapping[str, str]) -> str:
+    """Trích xuất filename từ Content-Disposition hoặc từ URL"""
+    # Thử lấy từ Content-Disposition header trước
+    content_disposition = headers.get('Content-Disposition', '')
+    if 'filename=' in content_disposition:
+        filename = content_disposition.split('filename=')[1].strip('"')
+        return filename
+
+    # Nếu không có, lấy từ URL (bỏ query string của signed URL)
+    url_parts = url.split('?')[0].split('/')
+    for part in reversed(url_parts):
+        if '.' in part and any(ext in part.lower() for ext in ['.xlsx', '.xls', '.csv']):
+            return part
+
+    # Default filename nếu không tìm được
+    return "downloaded_file.xlsx"
+
+
+class DownloadedFile:
+    """File đã download: nội dung (file đọc được), filename và khóa nội dung cho analysis cache"""
+
+    __slots__ = ("file", "filename", "content_key", "from_cache")
+
+    def __init__(self, file: BinaryIO, filename: str, content_key: str, from_cache: bool = False):
+        self.file = file
+        self.filename = filename
+        self.content_key = content_key
+        self.from_cache = from_cache
+
+    def __enter__(self) -> "DownloadedFile":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+class _RetryableStatus(Exception):
+    """Server trả về mã lỗi tạm thời (429, 5xx)"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float]):
+        super().__init__(f"HTTP {status_code}")
+        self.retry_after = retry_after
+
+
+class FileDownloader:
+    """
+    Download file qua một httpx.AsyncClient dùng chung (keep-alive, HTTP/2 nếu có h2)
+
+    Body được ghi dần vào SpooledTemporaryFile (ra đĩa khi lớn) và dừng ngay khi vượt
+    max_bytes. Lỗi kết nối / timeout / mã 429, 5xx được thử lại với backoff tăng dần.
+    File đã có trong download cache được revalidate bằng conditional GET: nếu server trả
+    về 304 thì dùng lại file trên đĩa (và kết quả phân tích theo khóa nội dung).
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_bytes: int = settings.DOWNLOAD_MAX_BYTES,
+                 retries: int = settings.DOWNLOAD_RETRIES,
+                 backoff_seconds: float = settings.DOWNLOAD_RETRY_BACKOFF_SECONDS,
+                 cache: DownloadCache = download_cache):
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Khởi tạo client khi cần lần đầu (phải gọi bên trong event loop)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                timeout=httpx.Timeout(
+                    connect=settings.DOWNLOAD_CONNECT_TIMEOUT,
+                    read=settings.DOWNLOAD_READ_TIMEOUT,
+                    write=settings.DOWNLOAD_READ_TIMEOUT,
+                    pool=settings.DOWNLOAD_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.DOWNLOAD_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def download(self, url: str) -> DownloadedFile:
+        """Download file (dùng với `with` để đóng file sau khi xử lý xong)"""
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._download_once(url)
+
+            except (httpx.TransportError, _RetryableStatus) as e:
+                if attempt == self.retries:
+                    raise ValueError(f"Không thể download file từ URL: {str(e) or type(e).__name__}")
+
+                # Backoff tăng gấp đôi mỗi lần, có jitter; tôn trọng Retry-After của server nếu có
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() / 2)
+                if isinstance(e, _RetryableStatus) and e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                logger.warning(f"Download attempt {attempt + 1} failed for {url}: {e!r}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+            except httpx.HTTPError as e:
+                raise ValueError(f"Không thể download file từ URL: {str(e)}")
+
+    async def _download_once(self, url: str) -> DownloadedFile:
+        """Một lần download: revalidate bản trong cache hoặc stream body vào file spool"""
+        cached = await asyncio.to_thread(self.cache.get, url)
+        headers = self.cache.conditional_headers(cached) if cached is not None else {}
+
+        async with self._get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached is not None:
+                cached_file = await asyncio.to_thread(self.cache.open, url, cached)
+                if cached_file is None:
+                    # Body vừa bị loại khỏi cache trong lúc revalidate: download lại không kèm validator
+                    await response.aclose()
+                    return await self._download_once(url)
+                logger.info(f"Download cache revalidated (304): {url.split('?')[0]}")
+                return DownloadedFile(cached_file, cached.filename, cached.content_key, from_cache=True)
+
+            if response.status_code in self.RETRY_STATUS_CODES:
+                retry_after = response.headers.get("Retry-After", "")
+                raise _RetryableStatus(response.status_code,
+                                       min(float(retry_after), 30.0) if retry_after.isdigit() else None)
+            response.raise_for_status()  # Raise exception nếu có lỗi HTTP
+
+            content_length = response.headers.get("Content-Length", "")
+            if content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise ValueError(self._too_large_message())
+
+            spooled_file = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_THRESHOLD_BYTES)
+            try:
+                # Hash nội dung trong lúc nhận để không phải đọc lại file khi tra analysis cache
+                digest = hashlib.sha256()
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(self._too_large_message())
+                    digest.update(chunk)
+                    spooled_file.write(chunk)
+
+                filename = filename_from_response(url, response.headers)
+                content_key = AnalysisCache.key_from_digest(digest.hexdigest(), filename)
+
+                await asyncio.to_thread(
+                    self.cache.put, url, spooled_file, size,
+                    response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                    filename, content_key
+                )
+            except BaseException:
+                spooled_file.close()
+                raise
+
+            spooled_file.seek(0)
+            return DownloadedFile(spooled_file, filename, content_key)
+
+    def _too_large_message(self) -> str:
+        return f"File vượt quá dung lượng cho phép ({self.max_bytes / (1024 * 1024):g} MB)"
+
+    async def close(self):
+        """Đóng các kết nối của client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Singleton instance
+file_downloader = FileDownloader()
@@ -1,47 +1,60 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from typing import List
-import requests
-import io
-from app.models.schemas import Student, Grade
+from typing import Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import Student
+from app.models.score_matrix import ScoreMatrix
+from app.services.spreadsheet_readers import CsvReader, FileSource, get_reader, read_source, source_size
 
 
 class ExcelProcessor:
-    
-    
-    def detect_format_and_convert(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Phát hiện định dạng Excel (ngang/dọc) và chuyển đổi về định dạng chuẩn"""
 
-        # Kiểm tra định dạng dọc trước (có 4 cột: Tên, Lớp, Môn học, Điểm)
-        if len(df.columns) == 4 and any('môn học' in str(col).lower() for col in df.columns):
-            return df
+    # Mapping các tên cột có thể có
+    COLUMN_MAPPING = {
+        'tên học sinh': 'student_name',
+        'ten hoc sinh': 'student_name',
+        'họ tên': 'student_name',
+        'ho ten': 'student_name',
+        'lớp': 'class_name',
+        'lop': 'class_name',
+        'môn học': 'subject',
+        'mon hoc': 'subject',
+        'điểm': 'score',
+        'diem': 'score'
+    }
 
-        # Nếu có nhiều cột (>5) thì là định dạng ngang
-        if len(df.columns) > 5:
-            return self.convert_horizontal_to_vertical(df)
+    REQUIRED_COLUMNS = ['student_name', 'class_name', 'subject', 'score']
 
-        return df
+    # Tên lớp trong tên sheet: "6A", "10A1", "Lớp 7B"...
+    CLASS_NAME_PATTERN = re.compile(r'\b(\d{1,2}[A-Za-z]\w*)')
 
-    def convert_horizontal_to_vertical(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Chuyển đổi từ định dạng ngang sang dọc"""
+    def _detect_format(self, columns: list) -> str:
+        """Phát hiện định dạng từ danh sách cột: 'vertical', 'horizontal' hoặc 'unknown'"""
 
-        # Xóa các hàng và cột trống
-        df = df.dropna(how='all').dropna(axis=1, how='all')
+        # Kiểm tra định dạng dọc trước (có 4 cột: Tên, Lớp, Môn học, Điểm)
+        if len(columns) == 4 and any('môn học' in str(col).lower() for col in columns):
+            return 'vertical'
 
-        # Tìm cột tên học sinh (thường là cột đầu tiên có chữ "Tên")
-        name_column = None
-        for col in df.columns:
-            if 'tên' in str(col).lower() or col == df.columns[0]:
-                name_column = col
-                break
+        # Nếu có nhiều cột (>5) thì là định dạng ngang
+        if len(columns) > 5:
+            return 'horizontal'
 
-        if name_column is None:
-            name_column = df.columns[0]
+        return 'unknown'
 
+    def _find_name_column(self, columns: list):
+        """Tìm cột tên học sinh (thường là cột đầu tiên có chữ "Tên")"""
+        for col in columns:
+            if 'tên' in str(col).lower() or col == columns[0]:
+                return col
 
+        return columns[0]
 
-        # Tìm các cột môn học (bỏ qua cột tên và điểm TB)
+    def _find_subject_columns(self, columns: list, name_column) -> list:
+        """Tìm các cột môn học (bỏ qua cột tên và điểm TB)"""
         subject_columns = []
-        for col in df.columns:
+        for col in columns:
             col_str = str(col).strip()
             if (col != name_column and
                 'tb' not in col_str.lower() and
@@ -49,63 +62,78 @@ class ExcelProcessor:
                 col_str != ''):
                 subject_columns.append(col)
 
-        # Chuyển đổi sang định dạng dọc
-        vertical_data = []
+        return subject_columns
 
-        for _, row in df.iterrows():
-            student_name = row[name_column]
+    def class_name_from_sheet(self, sheet_name: Optional[str]) -> str:
+        """Lấy tên lớp từ tên sheet (VD: "6A", "Lớp 10A1"), mặc định DEFAULT_CLASS_NAME"""
+        match = self.CLASS_NAME_PATTERN.search(str(sheet_name or ''))
+        if match:
+            return match.group(1).upper()
 
-            # Bỏ qua hàng không có tên học sinh hợp lệ
-            if (pd.isna(student_name) or
-                str(student_name).strip() == '' or
-                str(student_name).isdigit()):
-                continue
+        return settings.DEFAULT_CLASS_NAME
+
+    def detect_format_and_convert(self, df: pd.DataFrame, class_name: Optional[str] = None) -> pd.DataFrame:
+        """Phát hiện định dạng Excel (ngang/dọc) và chuyển đổi về định dạng chuẩn"""
+        if self._detect_format(list(df.columns)) == 'horizontal':
+            return self.convert_horizontal_to_vertical(df, class_name)
+
+        return df
+
+    def convert_horizontal_to_vertical(self, df: pd.DataFrame, class_name: Optional[str] = None) -> pd.DataFrame:
+        """Chuyển đổi từ định dạng ngang sang dọc (định dạng ngang không có cột Lớp nên dùng class_name)"""
+
+        # Xóa các hàng và cột trống
+        df = df.dropna(how='all').dropna(axis=1, how='all')
+
+        columns = list(df.columns)
+        name_column = self._find_name_column(columns)
+        subject_columns = self._find_subject_columns(columns, name_column)
+
+        # Lọc các hàng có tên học sinh hợp lệ bằng mask (thay cho iterrows)
+        names = df[name_column]
+        name_strings = names.astype(str)
+        valid_rows = (names.notna() &
+                      (name_strings.str.strip() != '') &
+                      ~name_strings.str.isdigit())
+
+        rows = df.loc[valid_rows, subject_columns]
+        if rows.empty or not subject_columns:
+            return pd.DataFrame()
 
-            for subject_col in subject_columns:
-                score = row[subject_col]
-                if pd.notna(score):
-                    try:
-                        score_float = float(score)
-                        if 0 <= score_float <= 10:  # Điểm hợp lệ
-                            vertical_data.append({
-                                'Tên học sinh': str(student_name).strip(),
-                                'Lớp': '7A',
-                                'Môn học': str(subject_col).strip(),
-                                'Điểm': score_float
-                            })
-                    except (ValueError, TypeError):
-                        continue
-
-        return pd.DataFrame(vertical_data)
-
-    def validate_and_clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Ép kiểu điểm hàng loạt theo từng cột, giá trị không hợp lệ thành NaN
+        scores = rows.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+        # Trải phẳng theo thứ tự hàng → môn (giống thứ tự của vòng lặp cũ)
+        scores = scores.ravel()
+        valid_scores = (scores >= 0) & (scores <= 10)  # Điểm hợp lệ, NaN tự động bị loại
+
+        if not valid_scores.any():
+            return pd.DataFrame()
+
+        student_names = name_strings[valid_rows].str.strip().to_numpy(dtype=object)
+        subject_names = np.array([str(col).strip() for col in subject_columns], dtype=object)
+
+        return pd.DataFrame({
+            'Tên học sinh': np.repeat(student_names, len(subject_columns))[valid_scores],
+            'Lớp': class_name or settings.DEFAULT_CLASS_NAME,
+            'Môn học': np.tile(subject_names, len(student_names))[valid_scores],
+            'Điểm': scores[valid_scores]
+        })
+
+    def validate_and_clean_data(self, df: pd.DataFrame, class_name: Optional[str] = None) -> pd.DataFrame:
         """Validate và làm sạch dữ liệu"""
 
         # Phát hiện và chuyển đổi định dạng nếu cần
-        df = self.detect_format_and_convert(df)
+        df = self.detect_format_and_convert(df, class_name)
 
         # Chuẩn hóa tên cột
         df.columns = df.columns.str.strip().str.lower()
 
-        # Mapping các tên cột có thể có
-        column_mapping = {
-            'tên học sinh': 'student_name',
-            'ten hoc sinh': 'student_name',
-            'họ tên': 'student_name',
-            'ho ten': 'student_name',
-            'lớp': 'class_name',
-            'lop': 'class_name',
-            'môn học': 'subject',
-            'mon hoc': 'subject',
-            'điểm': 'score',
-            'diem': 'score'
-        }
-
         # Đổi tên cột
-        df = df.rename(columns=column_mapping)
+        df = df.rename(columns=self.COLUMN_MAPPING)
 
         # Kiểm tra các cột bắt buộc
-        required_columns = ['student_name', 'class_name', 'subject', 'score']
+        required_columns = self.REQUIRED_COLUMNS
         missing_columns = [col for col in required_columns if col not in df.columns]
 
         if missing_columns:
@@ -126,90 +154,191 @@ class ExcelProcessor:
 
         return df
     
+    def convert_to_score_matrix(self, df: pd.DataFrame) -> ScoreMatrix:
+        """Chuyển đổi DataFrame đã làm sạch thành ma trận điểm (học sinh × môn)"""
+        return ScoreMatrix.from_frame(df)
+
     def convert_to_students(self, df: pd.DataFrame) -> List[Student]:
         """Chuyển đổi DataFrame thành danh sách Student objects"""
-        students_dict = {}
-        student_counter = 1
-
-        for _, row in df.iterrows():
-            student_key = (row['student_name'], row['class_name'])
-
-            if student_key not in students_dict:
-                # Tạo ID tự động: HS001, HS002, ...
-                student_id = f"HS{student_counter:03d}"
-                students_dict[student_key] = Student(
-                    id=student_id,
-                    name=row['student_name'],
-                    class_name=row['class_name'],
-                    grades=[]
-                )
-                student_counter += 1
-
-            grade = Grade(
-                subject=row['subject'],
-                score=row['score']
-            )
-
-            students_dict[student_key].grades.append(grade)
-
-        return list(students_dict.values())
-    
-
+        return self.convert_to_score_matrix(df).to_students()
+
+    def list_sheet_names(self, file_content: FileSource, filename: str) -> List[Optional[str]]:
+        """Liệt kê các sheet của workbook ([None] với file .csv)"""
+        return get_reader(filename).sheet_names(file_content)
+
+    def iter_clean_records(self, rows: Iterable[tuple],
+                           class_name: Optional[str] = None) -> Iterator[Tuple[str, str, str, float]]:
+        """Nhận diện hàng tiêu đề rồi làm sạch từng hàng thành (tên, lớp, môn, điểm)"""
+        rows = iter(rows)
+
+        # Hàng tiêu đề là hàng đầu tiên có dữ liệu
+        header = next((row for row in rows if any(not self._is_empty(value) for value in row)), None)
+        if header is None:
+            raise ValueError(f"Thiếu các cột bắt buộc: {self.REQUIRED_COLUMNS}")
+
+        # Bảng có thể không bắt đầu từ cột A: bỏ các cột trống trước tiêu đề
+        filled = [i for i, value in enumerate(header) if not self._is_empty(value)]
+        start, width = filled[0], filled[-1] + 1
+        if start:
+            rows = (row[start:] for row in rows)
+
+        columns = [
+            f"Unnamed: {i}" if self._is_empty(value) else (value.strip() if isinstance(value, str) else value)
+            for i, value in enumerate(header[start:width])
+        ]
+
+        if self._detect_format(columns) == 'horizontal':
+            yield from self._iter_horizontal_records(rows, columns, class_name or settings.DEFAULT_CLASS_NAME)
+        else:
+            yield from self._iter_vertical_records(rows, columns)
+
+    def _iter_horizontal_records(self, rows: Iterator[tuple], columns: list,
+                                 class_name: str) -> Iterator[Tuple[str, str, str, float]]:
+        """Làm sạch từng hàng định dạng ngang (mỗi hàng một học sinh, mỗi cột một môn)"""
+        name_column = self._find_name_column(columns)
+        name_index = columns.index(name_column)
+        class_name = class_name.strip().upper()
+        subjects = [
+            (columns.index(col), str(col).strip().title())
+            for col in self._find_subject_columns(columns, name_column)
+        ]
+
+        for row in rows:
+            student_name = row[name_index] if name_index < len(row) else None
 
-    def process_excel_in_memory(self, file_content: bytes, filename: str) -> List[Student]:
-        """Xử lý file Excel trong memory mà không lưu file"""
-        try:
-            # Tạo BytesIO object từ file content
-            file_buffer = io.BytesIO(file_content)
+            # Bỏ qua hàng không có tên học sinh hợp lệ
+            if (self._is_empty(student_name) or
+                str(student_name).strip() == '' or
+                str(student_name).isdigit()):
+                continue
 
-            # Đọc file từ memory
-            if filename.endswith('.csv'):
-                df = pd.read_csv(file_buffer, encoding='utf-8')
-            else:
-                df = pd.read_excel(file_buffer)
+            student_name = str(student_name).strip().title()
+            for index, subject in subjects:
+                score = self._to_score(row[index]) if index < len(row) else None
+                if score is not None:
+                    yield student_name, class_name, subject, score
 
-            # Validate và làm sạch dữ liệu
-            df_clean = self.validate_and_clean_data(df)
+    def _iter_vertical_records(self, rows: Iterator[tuple], columns: list) -> Iterator[Tuple[str, str, str, float]]:
+        """Làm sạch từng hàng định dạng dọc (Tên, Lớp, Môn học, Điểm)"""
+        mapped = [self.COLUMN_MAPPING.get(str(col).strip().lower()) for col in columns]
 
-            # Chuyển đổi thành Student objects
-            students = self.convert_to_students(df_clean)
+        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in mapped]
+        if missing_columns:
+            raise ValueError(f"Thiếu các cột bắt buộc: {missing_columns}")
 
-            return students
+        name_index, class_index, subject_index, score_index = (
+            mapped.index(col) for col in self.REQUIRED_COLUMNS
+        )
 
-        except Exception as e:
-            raise ValueError(f"Không thể xử lý file: {str(e)}")
+        for row in rows:
+            values = [row[i] if i < len(row) else None
+                      for i in (name_index, class_index, subject_index, score_index)]
+            if any(self._is_empty(value) for value in values):
+                continue
 
-    def process_excel_from_url(self, url: str) -> List[Student]:
-        """Download và xử lý file Excel từ URL (Supabase link)"""
+            score = self._to_score(values[3])
+            if score is not None:
+                yield (str(values[0]).strip().title(),
+                       str(values[1]).strip().upper(),
+                       str(values[2]).strip().title(),
+                       score)
+
+    def _is_empty(self, value) -> bool:
+        """Ô trống: None, NaN hoặc chuỗi rỗng"""
+        if value is None:
+            return True
+        if isinstance(value, str):
+            return value.strip() == ''
+        return isinstance(value, float) and value != value
+
+    def _to_score(self, value) -> Optional[float]:
+        """Ép kiểu điểm số, trả về None nếu không hợp lệ hoặc ngoài khoảng 0-10"""
+        if self._is_empty(value):
+            return None
         try:
-            # Download file từ URL
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()  # Raise exception nếu có lỗi HTTP
+            score = float(value)
+        except (ValueError, TypeError):
+            return None
+        return score if 0 <= score <= 10 else None
+
+    def build_score_matrix(self, records: Iterable[Tuple[str, str, str, float]]) -> ScoreMatrix:
+        """Dựng ma trận điểm trực tiếp từ luồng (tên, lớp, môn, điểm) đã được làm sạch"""
+        names, class_names, subjects, scores = [], [], [], []
+        subject_names = {}
+
+        for name, class_name, subject, score in records:
+            names.append(name)
+            class_names.append(class_name)
+            # Dùng chung một string object cho mỗi tên môn
+            subjects.append(subject_names.setdefault(subject, subject))
+            scores.append(score)
+
+        return ScoreMatrix.from_records(names, class_names, subjects, scores)
+
+    def build_students(self, records: Iterable[Tuple[str, str, str, float]]) -> List[Student]:
+        """Dựng Student objects trực tiếp từ luồng (tên, lớp, môn, điểm) đã được làm sạch"""
+        return self.build_score_matrix(records).to_students()
+
+    def process_excel_streaming(self, file_content: FileSource, filename: str,
+                                sheet_name: Optional[str] = None) -> ScoreMatrix:
+        """Xử lý file Excel theo luồng: đọc hàng → làm sạch → dựng ma trận điểm mà không dựng DataFrame"""
+        rows = get_reader(filename, streaming=True).iter_rows(file_content, sheet_name)
+        return self.build_score_matrix(self.iter_clean_records(rows, self.class_name_from_sheet(sheet_name)))
+
+    def process_csv_chunked(self, file_content: FileSource, reader: CsvReader) -> ScoreMatrix:
+        """CSV lớn: chia theo ranh giới dòng, parse và làm sạch các phần song song rồi ghép lại"""
+        content = reader.to_utf8(read_source(file_content))
+        delimiter = reader.detect_delimiter(content)
+        chunks = reader.split_chunks(content, settings.CSV_PARSE_WORKERS)
+
+        def clean_chunk(chunk: bytes):
+            try:
+                return self.validate_and_clean_data(reader.parse(chunk, delimiter))
+            except ValueError as e:
+                return e
+
+        # pyarrow parse ngoài GIL nên thread pool đủ để tận dụng nhiều core
+        with ThreadPoolExecutor(max_workers=settings.CSV_PARSE_WORKERS) as executor:
+            outcomes = list(executor.map(clean_chunk, chunks))
+
+        # Phần không có hàng hợp lệ nào bị bỏ qua; nếu mọi phần đều lỗi thì đó là lỗi của cả file
+        frames = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+        if not frames:
+            raise outcomes[0]
+
+        # Các phần giữ nguyên thứ tự nên mã học sinh vẫn theo thứ tự xuất hiện trong file
+        return self.convert_to_score_matrix(pd.concat(frames, ignore_index=True))
+
+    def process_excel_to_matrix(self, file_content: FileSource, filename: str,
+                                sheet_name: Optional[str] = None) -> ScoreMatrix:
+        """Xử lý file Excel trong memory thành ma trận điểm (sheet_name=None: sheet đầu tiên)"""
+        try:
+            reader = get_reader(filename)
+            file_size = source_size(file_content)
+
+            # File lớn được xử lý theo luồng để giới hạn bộ nhớ (backend "auto" chọn openpyxl
+            # read-only thay vì calamine, vốn nạp cả workbook)
+            if (file_size > settings.EXCEL_STREAMING_THRESHOLD_BYTES
+                    and get_reader(filename, streaming=True).supports_streaming):
+                return self.process_excel_streaming(file_content, filename, sheet_name)
+
+            # CSV lớn được chia theo dòng để parse và làm sạch song song
+            if isinstance(reader, CsvReader) and file_size > settings.CSV_CHUNK_THRESHOLD_BYTES:
+                return self.process_csv_chunked(file_content, reader)
 
-            # Lấy filename từ URL hoặc Content-Disposition header
-            filename = self._extract_filename_from_url(url, response)
+            # Đọc file từ memory bằng backend phù hợp (openpyxl, calamine, csv)
+            df = reader.read_sheet(file_content, sheet_name)
 
-            # Xử lý file content
-            return self.process_excel_in_memory(response.content, filename)
+            # Validate và làm sạch dữ liệu (định dạng ngang lấy tên lớp từ tên sheet)
+            df_clean = self.validate_and_clean_data(df, self.class_name_from_sheet(sheet_name))
+
+            # Chuyển đổi thành ma trận điểm
+            return self.convert_to_score_matrix(df_clean)
 
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Không thể download file từ URL: {str(e)}")
         except Exception as e:
-            raise ValueError(f"Lỗi khi xử lý file từ URL: {str(e)}")
-
-    def _extract_filename_from_url(self, url: str, response: requests.Response) -> str:
-        """Trích xuất filename từ URL hoặc response headers"""
-        # Thử lấy từ Content-Disposition header trước
-        content_disposition = response.headers.get('Content-Disposition', '')
-        if 'filename=' in content_disposition:
-            filename = content_disposition.split('filename=')[1].strip('"')
-            return filename
-
-        # Nếu không có, lấy từ URL
-        url_parts = url.split('/')
-        for part in reversed(url_parts):
-            if '.' in part and any(ext in part.lower() for ext in ['.xlsx', '.xls', '.csv']):
-                return part
-
-        # Default filename nếu không tìm được
-        return "downloaded_file.xlsx"
+            raise ValueError(f"Không thể xử lý file: {str(e)}")
+
+    def process_excel_in_memory(self, file_content: FileSource, filename: str,
+                                sheet_name: Optional[str] = None) -> List[Student]:
+        """Xử lý file Excel trong memory mà không lưu file (sheet_name=None: sheet đầu tiên)"""
+        return self.process_excel_to_matrix(file_content, filename, sheet_name).to_students()
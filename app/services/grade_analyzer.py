@@ -1,11 +1,49 @@
-from typing import List, Dict
+from typing import AbstractSet, List, Dict, Optional, Sequence, Tuple, Union
+import numpy as np
+from app.models.domain import (
+    ClassDigest, GradeClassification, RecommendationFacts, StudentProfile, StudentRecord, StudentSummaryRecord,
+    ClassStatisticsRecord, SubjectStatisticsRecord, TopStudentRecord, build_analysis_result
+)
 from app.models.schemas import (
-    Student, StudentSummary, ClassStatistics, SubjectStatistics,
-    GradeLevel, AnalysisResult, TopStudent
+    Student, GradeLevel, AnalysisResult, ClassRanking, SchoolSummary, SchoolTopStudent
 )
+from app.models.score_matrix import ScoreMatrix
+
+# Các tên có thể có của môn Toán / Ngữ văn (viết thường, theo thứ tự ưu tiên)
+MATH_SUBJECT_NAMES = ('toán', 'toan', 'math', 'mathematics', 'toán học', 'toan hoc')
+LITERATURE_SUBJECT_NAMES = ('ngữ văn', 'ngu van', 'văn', 'van', 'literature', 'vietnamese', 'tiếng việt', 'tieng viet')
+
+# Số học sinh trong top của lớp / toàn trường
+CLASS_TOP_STUDENTS = 5
+SCHOOL_TOP_STUDENTS = 10
+
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Chỉ số k phần tử lớn nhất theo thứ tự giảm dần (bằng nhau: chỉ số nhỏ trước), giống k phần tử
+    đầu của sắp xếp ổn định nhưng chỉ chọn từng phần (argpartition) thay vì sắp xếp cả mảng
+    """
+    if k <= 0 or len(values) == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(values):
+        # Ngưỡng = giá trị lớn thứ k; trong các phần tử bằng ngưỡng chỉ lấy các chỉ số nhỏ nhất
+        threshold = values[np.argpartition(values, len(values) - k)[len(values) - k]]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
 
 
 class GradeAnalyzer:
+    """
+    Phân tích điểm của một lớp
+
+    Các bước bên trong làm việc trên object nội bộ (app.models.domain) và chỉ chuyển sang
+    model Pydantic một lần khi trả về AnalysisResult.
+    """
+
     def __init__(self):
         self.grade_thresholds = {
             GradeLevel.EXCELLENT: 8.0,
@@ -14,7 +52,7 @@ class GradeAnalyzer:
             GradeLevel.WEAK: 0.0
         }
     
-    def calculate_student_average(self, student: Student) -> float:
+    def calculate_student_average(self, student: StudentRecord) -> float:
         """Tính điểm trung bình của học sinh"""
         if not student.grades:
             return 0.0
@@ -22,32 +60,93 @@ class GradeAnalyzer:
         total_score = sum(grade.score for grade in student.grades)
         return round(total_score / len(student.grades), 2)
 
-    def _get_student_grade_data(self, student: Student) -> Dict:
-        """Helper method để lấy dữ liệu điểm của học sinh (tránh tính toán lặp lại)"""
+    def build_profile(self, student: StudentRecord, average_score: Optional[float] = None) -> StudentProfile:
+        """
+        Tính một lần mọi chỉ số của học sinh dùng cho xếp loại, thống kê và gợi ý
+        (average_score: điểm TB đã tính sẵn nếu có)
+        """
         if not student.grades:
-            return {
-                'average_score': 0.0,
-                'subject_scores': {},
-                'all_scores': [],
-                'math_score': 0.0,
-                'literature_score': 0.0
-            }
+            return StudentProfile(student, 0.0, None, 0.0, 0.0, GradeLevel.WEAK, False, False, False)
 
-        average_score = self.calculate_student_average(student)
+        if average_score is None:
+            average_score = self.calculate_student_average(student)
         subject_scores = {grade.subject.lower(): grade.score for grade in student.grades}
-        all_scores = [grade.score for grade in student.grades]
+        min_score = min(grade.score for grade in student.grades)
         math_score = self._get_math_score(subject_scores)
         literature_score = self._get_literature_score(subject_scores)
 
-        return {
-            'average_score': average_score,
-            'subject_scores': subject_scores,
-            'all_scores': all_scores,
-            'math_score': math_score,
-            'literature_score': literature_score
-        }
-    
-    def determine_grade_level(self, student: Student) -> GradeLevel:
+        # Điều kiện học sinh giỏi
+        average_condition = average_score >= 8.0
+        min_score_condition = min_score >= 6.5
+        math_literature_condition = math_score >= 8.0 or literature_score >= 8.0
+
+        if average_condition and min_score_condition and math_literature_condition:
+            grade_level = GradeLevel.EXCELLENT
+        elif average_score >= 6.5 and min_score >= 5.0:
+            grade_level = GradeLevel.GOOD
+        elif average_score >= 5.0 and min_score >= 3.5:
+            grade_level = GradeLevel.AVERAGE
+        else:
+            grade_level = GradeLevel.WEAK
+
+        return StudentProfile(student, average_score, min_score, math_score, literature_score,
+                              grade_level, average_condition, min_score_condition, math_literature_condition)
+
+    def build_profiles(self, students: List[StudentRecord],
+                       averages: Optional[Sequence[float]] = None) -> List[StudentProfile]:
+        """Profile của từng học sinh (averages: điểm TB đã tính sẵn nếu có)"""
+        if averages is None:
+            return [self.build_profile(student) for student in students]
+        return [self.build_profile(student, average) for student, average in zip(students, averages)]
+
+    def classify_matrix(self, matrix: ScoreMatrix,
+                        averages: Optional[Sequence[float]] = None) -> GradeClassification:
+        """
+        Xếp loại mọi học sinh của ma trận điểm cùng lúc bằng NumPy (cùng quy tắc và kết quả với
+        build_profile / determine_grade_level). averages: điểm TB đã tính sẵn nếu có.
+        """
+        averages = np.asarray(matrix.average_scores() if averages is None else averages, dtype=float)
+        has_grades = matrix.grade_counts > 0
+
+        # Ô trống (NaN) không tính vào điểm thấp nhất; học sinh không có điểm: NaN
+        min_scores = np.min(np.where(np.isnan(matrix.scores), np.inf, matrix.scores), axis=1, initial=np.inf)
+        min_scores[~has_grades] = np.nan
+
+        math_scores = self._subject_alias_scores(matrix, MATH_SUBJECT_NAMES)
+        literature_scores = self._subject_alias_scores(matrix, LITERATURE_SUBJECT_NAMES)
+
+        # So sánh với NaN luôn False nên học sinh không có điểm không đạt điều kiện nào
+        average_condition = has_grades & (averages >= 8.0)
+        min_score_condition = min_scores >= 6.5
+        math_literature_condition = has_grades & ((math_scores >= 8.0) | (literature_scores >= 8.0))
+
+        level_codes = np.select(
+            [
+                average_condition & min_score_condition & math_literature_condition,
+                (averages >= 6.5) & (min_scores >= 5.0),
+                (averages >= 5.0) & (min_scores >= 3.5),
+            ],
+            [0, 1, 2],
+            default=3
+        )
+
+        return GradeClassification(averages, min_scores, math_scores, literature_scores, level_codes,
+                                   average_condition, min_score_condition, math_literature_condition)
+
+    def _subject_alias_scores(self, matrix: ScoreMatrix, names: Sequence[str]) -> np.ndarray:
+        """Điểm môn theo tên đầu tiên trong names mà học sinh có (như _get_math_score), 0.0 nếu không có"""
+        lowered = [subject.lower() for subject in matrix.subjects]
+        result = np.full(len(matrix), np.nan)
+        for name in names:
+            columns = [column for column, subject in enumerate(lowered) if subject == name]
+            if not columns:
+                continue
+            scores = matrix.last_grade_scores(columns)
+            missing = np.isnan(result)
+            result[missing] = scores[missing]
+        return np.nan_to_num(result, nan=0.0)
+
+    def determine_grade_level(self, student: StudentRecord) -> GradeLevel:
         """
         Xác định xếp loại học lực theo tiêu chuẩn mới:
 
@@ -66,48 +165,18 @@ class GradeAnalyzer:
 
         Học sinh yếu: Các trường hợp còn lại
         """
-        if not student.grades:
-            return GradeLevel.WEAK
-
-        # Sử dụng helper method để tránh tính toán lặp lại
-        grade_data = self._get_student_grade_data(student)
-        average_score = grade_data['average_score']
-        all_scores = grade_data['all_scores']
-        math_score = grade_data['math_score']
-        literature_score = grade_data['literature_score']
-
-        # Kiểm tra điều kiện học sinh giỏi
-        if (average_score >= 8.0 and
-            all(score >= 6.5 for score in all_scores) and
-            (math_score >= 8.0 or literature_score >= 8.0)):
-            return GradeLevel.EXCELLENT
-
-        # Kiểm tra điều kiện học sinh khá
-        elif (average_score >= 6.5 and
-              all(score >= 5.0 for score in all_scores)):
-            return GradeLevel.GOOD
-
-        # Kiểm tra điều kiện học sinh trung bình
-        elif (average_score >= 5.0 and
-              all(score >= 3.5 for score in all_scores)):
-            return GradeLevel.AVERAGE
-
-        # Các trường hợp còn lại
-        else:
-            return GradeLevel.WEAK
+        return self.build_profile(student).grade_level
 
     def _get_math_score(self, subject_scores: dict) -> float:
         """Lấy điểm môn Toán (có thể có nhiều tên khác nhau)"""
-        math_names = ['toán', 'toan', 'math', 'mathematics', 'toán học', 'toan hoc']
-        for name in math_names:
+        for name in MATH_SUBJECT_NAMES:
             if name in subject_scores:
                 return subject_scores[name]
         return 0.0
 
     def _get_literature_score(self, subject_scores: dict) -> float:
         """Lấy điểm môn Ngữ văn (có thể có nhiều tên khác nhau)"""
-        literature_names = ['ngữ văn', 'ngu van', 'văn', 'van', 'literature', 'vietnamese', 'tiếng việt', 'tieng viet']
-        for name in literature_names:
+        for name in LITERATURE_SUBJECT_NAMES:
             if name in subject_scores:
                 return subject_scores[name]
         return 0.0
@@ -123,12 +192,16 @@ class GradeAnalyzer:
         else:
             return GradeLevel.WEAK
 
-    def check_excellent_student_conditions(self, student: Student) -> dict:
+    def check_excellent_student_conditions(self, student: StudentRecord) -> dict:
         """
         Kiểm tra chi tiết các điều kiện để được xếp loại học sinh giỏi
         Trả về dict với thông tin chi tiết về từng điều kiện
         """
-        if not student.grades:
+        return self._excellent_conditions(self.build_profile(student))
+
+    def _excellent_conditions(self, profile: StudentProfile) -> dict:
+        """Chi tiết điều kiện học sinh giỏi đọc từ profile"""
+        if not profile.student.grades:
             return {
                 'is_excellent': False,
                 'average_score': 0.0,
@@ -138,57 +211,51 @@ class GradeAnalyzer:
                 'details': 'Không có điểm số'
             }
 
-        # Sử dụng helper method để tránh tính toán lặp lại
-        grade_data = self._get_student_grade_data(student)
-        average_score = grade_data['average_score']
-        all_scores = grade_data['all_scores']
-        math_score = grade_data['math_score']
-        literature_score = grade_data['literature_score']
-
-        # Kiểm tra từng điều kiện
-        average_condition = average_score >= 8.0
-        min_score_condition = all(score >= 6.5 for score in all_scores)
-        math_literature_condition = math_score >= 8.0 or literature_score >= 8.0
-
-        is_excellent = average_condition and min_score_condition and math_literature_condition
+        return {
+            'is_excellent': profile.is_excellent,
+            'average_score': profile.average_score,
+            'average_condition': profile.average_condition,
+            'min_score_condition': profile.min_score_condition,
+            'math_literature_condition': profile.math_literature_condition,
+            'math_score': profile.math_score,
+            'literature_score': profile.literature_score,
+            'details': self._excellent_details(profile)
+        }
 
-        # Tạo thông tin chi tiết
+    def _excellent_details(self, profile: StudentProfile) -> str:
+        """Mô tả các điều kiện học sinh giỏi chưa đạt"""
         details = []
-        if not average_condition:
-            details.append(f"Điểm TB chung {average_score:.2f} < 8.0")
-        if not min_score_condition:
-            low_scores = [f"{grade.subject}: {grade.score}" for grade in student.grades if grade.score < 6.5]
+        if not profile.average_condition:
+            details.append(f"Điểm TB chung {profile.average_score:.2f} < 8.0")
+        if not profile.min_score_condition:
+            low_scores = [f"{grade.subject}: {grade.score}" for grade in profile.student.grades if grade.score < 6.5]
             details.append(f"Có môn dưới 6.5: {', '.join(low_scores)}")
-        if not math_literature_condition:
-            details.append(f"Toán: {math_score:.1f}, Văn: {literature_score:.1f} (cần ít nhất 1 môn ≥ 8.0)")
+        if not profile.math_literature_condition:
+            details.append(f"Toán: {profile.math_score:.1f}, Văn: {profile.literature_score:.1f} "
+                           f"(cần ít nhất 1 môn ≥ 8.0)")
 
-        return {
-            'is_excellent': is_excellent,
-            'average_score': average_score,
-            'average_condition': average_condition,
-            'min_score_condition': min_score_condition,
-            'math_literature_condition': math_literature_condition,
-            'math_score': math_score,
-            'literature_score': literature_score,
-            'details': '; '.join(details) if details else 'Đạt tất cả điều kiện học sinh giỏi'
-        }
-    
-    def identify_weak_subjects(self, student: Student, threshold: float = 5.0) -> List[str]:
+        return '; '.join(details) if details else 'Đạt tất cả điều kiện học sinh giỏi'
+
+    def identify_weak_subjects(self, student: StudentRecord, threshold: float = 5.0) -> List[str]:
         """Xác định các môn học yếu"""
         return [grade.subject for grade in student.grades if grade.score < threshold]
     
-    def identify_strong_subjects(self, student: Student, threshold: float = 8.0) -> List[str]:
+    def identify_strong_subjects(self, student: StudentRecord, threshold: float = 8.0) -> List[str]:
         """Xác định các môn học mạnh"""
         return [grade.subject for grade in student.grades if grade.score >= threshold]
     
-    def analyze_student(self, student: Student, rank: int = 0) -> StudentSummary:
-        """Phân tích chi tiết một học sinh"""
-        average_score = self.calculate_student_average(student)
-        grade_level = self.determine_grade_level(student)  # Truyền student thay vì average_score
+    def analyze_student(self, student: StudentRecord, rank: int = 0,
+                        average_score: Optional[float] = None,
+                        profile: Optional[StudentProfile] = None) -> StudentSummaryRecord:
+        """Phân tích chi tiết một học sinh (average_score / profile: đã tính sẵn nếu có)"""
+        if profile is None:
+            profile = self.build_profile(student, average_score)
+        average_score = profile.average_score
+        grade_level = profile.grade_level
         weak_subjects = self.identify_weak_subjects(student)
         strong_subjects = self.identify_strong_subjects(student)
 
-        return StudentSummary(
+        return StudentSummaryRecord(
             student=student,
             average_score=average_score,
             rank=rank,
@@ -197,20 +264,39 @@ class GradeAnalyzer:
             strong_subjects=strong_subjects
         )
     
-    def analyze_subject_statistics(self, students: List[Student], subject: str) -> SubjectStatistics:
-        """Phân tích thống kê theo môn học"""
-        subject_data = []
-        grade_counts = {level: 0 for level in GradeLevel}
+    def build_subject_index(self, students: List[StudentRecord]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Chỉ mục môn → (điểm, chỉ số học sinh) dựng trong một lần duyệt toàn bộ điểm
 
-        for student in students:
+        Điểm của mỗi môn theo thứ tự học sinh rồi thứ tự điểm gốc của học sinh đó.
+        """
+        index: Dict[str, Tuple[List[float], List[int]]] = {}
+        for student_index, student in enumerate(students):
             for grade in student.grades:
-                if grade.subject == subject:
-                    subject_data.append((student.name, grade.score))
-                    grade_level = self._determine_grade_level_by_score(grade.score)
-                    grade_counts[grade_level] += 1
+                entry = index.get(grade.subject)
+                if entry is None:
+                    entry = index[grade.subject] = ([], [])
+                entry[0].append(grade.score)
+                entry[1].append(student_index)
+
+        return {
+            subject: (np.array(scores, dtype=float), np.array(owners, dtype=np.intp))
+            for subject, (scores, owners) in index.items()
+        }
 
-        if not subject_data:
-            return SubjectStatistics(
+    def analyze_subject_statistics(self, students: List[StudentRecord], subject: str) -> SubjectStatisticsRecord:
+        """Phân tích thống kê theo môn học"""
+        scores, owners = self.build_subject_index(students).get(
+            subject, (np.empty(0), np.empty(0, dtype=np.intp))
+        )
+        return self._subject_statistics([student.name for student in students], subject, scores, owners)
+
+    def _subject_statistics(self, names: Sequence[str], subject: str,
+                            scores: np.ndarray, owners: np.ndarray) -> SubjectStatisticsRecord:
+        """Thống kê một môn từ điểm và chỉ số học sinh (trong names) của môn đó, lấy từ chỉ mục môn"""
+        total = len(scores)
+        if total == 0:
+            return SubjectStatisticsRecord(
                 subject=subject,
                 average_score=0.0,
                 highest_score=0.0,
@@ -225,38 +311,47 @@ class GradeAnalyzer:
                 weak_count=0
             )
 
-        scores = [score for _, score in subject_data]
-        average_score = round(sum(scores) / len(scores), 2)
-        highest_score = max(scores)
-        lowest_score = min(scores)
+        # cumsum cộng lần lượt từng điểm nên tổng (và kết quả làm tròn) giống hệt sum()
+        average_score = round(float(np.cumsum(scores)[-1]) / total, 2)
+
+        # argmax / argmin lấy lần xuất hiện đầu tiên: học sinh đầu tiên đạt điểm cao / thấp nhất
+        highest_index = int(np.argmax(scores))
+        lowest_index = int(np.argmin(scores))
 
         # Tính tỉ lệ đạt (>=5.0)
-        pass_count = sum(1 for score in scores if score >= 5.0)
-        pass_rate = round((pass_count / len(scores)) * 100, 1)
+        pass_rate = round((int(np.count_nonzero(scores >= 5.0)) / total) * 100, 1)
 
-        # Tìm học sinh đạt điểm cao nhất và thấp nhất
-        highest_student = next(name for name, score in subject_data if score == highest_score)
-        lowest_student = next(name for name, score in subject_data if score == lowest_score)
+        # Số điểm đạt từ mỗi ngưỡng xếp loại trở lên
+        at_least_excellent = int(np.count_nonzero(scores >= self.grade_thresholds[GradeLevel.EXCELLENT]))
+        at_least_good = int(np.count_nonzero(scores >= self.grade_thresholds[GradeLevel.GOOD]))
+        at_least_average = int(np.count_nonzero(scores >= self.grade_thresholds[GradeLevel.AVERAGE]))
 
-        return SubjectStatistics(
+        return SubjectStatisticsRecord(
             subject=subject,
             average_score=average_score,
-            highest_score=highest_score,
-            lowest_score=lowest_score,
-            highest_score_student=highest_student,
-            lowest_score_student=lowest_student,
-            total_students=len(subject_data),
+            highest_score=float(scores[highest_index]),
+            lowest_score=float(scores[lowest_index]),
+            highest_score_student=names[owners[highest_index]],
+            lowest_score_student=names[owners[lowest_index]],
+            total_students=total,
             pass_rate=pass_rate,
-            excellent_count=grade_counts[GradeLevel.EXCELLENT],
-            good_count=grade_counts[GradeLevel.GOOD],
-            average_count=grade_counts[GradeLevel.AVERAGE],
-            weak_count=grade_counts[GradeLevel.WEAK]
+            excellent_count=at_least_excellent,
+            good_count=at_least_good - at_least_excellent,
+            average_count=at_least_average - at_least_good,
+            weak_count=total - at_least_average
         )
-    
-    def analyze_class_statistics(self, students: List[Student]) -> ClassStatistics:
-        """Phân tích thống kê lớp học"""
+
+    def analyze_class_statistics(self, students: List[StudentRecord],
+                                 averages: Optional[Sequence[float]] = None,
+                                 profiles: Optional[List[StudentProfile]] = None,
+                                 subject_index: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+                                 ) -> ClassStatisticsRecord:
+        """
+        Phân tích thống kê lớp học (averages / profiles / subject_index: điểm TB, profile của từng
+        học sinh theo thứ tự students và chỉ mục môn, đã tính sẵn nếu có)
+        """
         if not students:
-            return ClassStatistics(
+            return ClassStatisticsRecord(
                 class_name="",
                 total_students=0,
                 overall_average=0.0,
@@ -272,8 +367,9 @@ class GradeAnalyzer:
         class_name = students[0].class_name
 
         # Tính điểm trung bình một lần cho tất cả học sinh
-        student_scores = [(student.name, self.calculate_student_average(student)) for student in students]
-        student_averages = [score for _, score in student_scores]
+        if averages is None:
+            averages = [self.calculate_student_average(student) for student in students]
+        student_averages = list(averages)
 
         overall_average = round(sum(student_averages) / len(student_averages), 2)
         highest_score = max(student_averages)
@@ -281,32 +377,31 @@ class GradeAnalyzer:
 
         # Phân bố xếp loại
         grade_distribution = {level.value: 0 for level in GradeLevel}
-        for student in students:
-            grade_level = self.determine_grade_level(student)
-            grade_distribution[grade_level.value] += 1
-
-        # Sắp xếp học sinh theo điểm
-        student_scores.sort(key=lambda x: x[1], reverse=True)
-
-        # Top 5 học sinh giỏi nhất
-        top_students = [TopStudent(name=name, score=score) for name, score in student_scores[:5]]
-
-        # Học sinh yếu (điểm < 5.0)
-        weak_students = [TopStudent(name=name, score=score) for name, score in student_scores if score < 5.0]
-
-        # Lấy danh sách môn học
-        all_subjects = set()
-        for student in students:
-            for grade in student.grades:
-                all_subjects.add(grade.subject)
-
-        # Thống kê theo môn
-        subject_statistics = []
-        for subject in sorted(all_subjects):
-            subject_stats = self.analyze_subject_statistics(students, subject)
-            subject_statistics.append(subject_stats)
-
-        return ClassStatistics(
+        if profiles is None:
+            profiles = self.build_profiles(students, student_averages)
+        for profile in profiles:
+            grade_distribution[profile.grade_level.value] += 1
+
+        # Top 5 học sinh giỏi nhất (chọn từng phần, không sắp xếp cả lớp)
+        scores = np.asarray(student_averages, dtype=float)
+        top_students = [TopStudentRecord(students[index].name, student_averages[index])
+                        for index in top_k_indices(scores, CLASS_TOP_STUDENTS).tolist()]
+
+        # Học sinh yếu (điểm < 5.0) theo thứ tự điểm giảm dần, chỉ sắp xếp nhóm này
+        weak = np.flatnonzero(scores < 5.0)
+        weak_students = [TopStudentRecord(students[index].name, student_averages[index])
+                         for index in weak[np.argsort(-scores[weak], kind='stable')].tolist()]
+
+        # Chỉ mục điểm theo môn dựng một lần, thống kê từng môn tính trên chỉ mục
+        if subject_index is None:
+            subject_index = self.build_subject_index(students)
+        names = [student.name for student in students]
+        subject_statistics = [
+            self._subject_statistics(names, subject, *subject_index[subject])
+            for subject in sorted(subject_index)
+        ]
+
+        return ClassStatisticsRecord(
             class_name=class_name,
             total_students=len(students),
             overall_average=overall_average,
@@ -318,24 +413,53 @@ class GradeAnalyzer:
             subject_statistics=subject_statistics
         )
     
-    def generate_recommendations(self, class_stats: ClassStatistics, student_summaries: List[StudentSummary]) -> List[str]:
-        """Tạo gợi ý cải thiện chi tiết"""
+    def generate_recommendations(self, class_stats: ClassStatisticsRecord, student_summaries: List[StudentSummaryRecord],
+                                 profiles: Optional[List[StudentProfile]] = None) -> List[str]:
+        """Tạo gợi ý cải thiện chi tiết (profiles: profile theo cùng thứ tự student_summaries nếu có)"""
+        if profiles is None:
+            profiles = [self.build_profile(summary.student, summary.average_score) for summary in student_summaries]
+
+        return self.recommendations_from_facts(class_stats, self.recommendation_facts(student_summaries, profiles))
+
+    def recommendation_facts(self, student_summaries: List[StudentSummaryRecord],
+                             profiles: List[StudentProfile]) -> RecommendationFacts:
+        """Số liệu cho gợi ý từ danh sách học sinh theo thứ hạng (profiles cùng thứ tự)"""
+        excellent_students = [s for s in student_summaries if s.grade_level == GradeLevel.EXCELLENT]
+        weak_students = [s for s in student_summaries if s.grade_level == GradeLevel.WEAK]
+        near_excellent_students = [profile for profile in profiles
+                                   if not profile.is_excellent and profile.average_score >= 7.5]
+        excellent_analysis = self._analyze_excellent_conditions(profiles)
+
+        return RecommendationFacts(
+            total_students=excellent_analysis['total_students'],
+            excellent_count=len(excellent_students),
+            weak_count=len(weak_students),
+            critical_count=sum(1 for s in student_summaries if s.average_score < 4.0),
+            excellent_students=excellent_students[:2],
+            weak_students=weak_students[:3],
+            near_excellent_students=near_excellent_students[:3],
+            students_with_good_average=excellent_analysis['students_with_good_average'],
+            students_no_low_scores=excellent_analysis['students_no_low_scores'],
+            students_math_lit_good=excellent_analysis['students_math_lit_good']
+        )
+
+    def recommendations_from_facts(self, class_stats: ClassStatisticsRecord, facts: RecommendationFacts) -> List[str]:
+        """Gợi ý từ thống kê lớp và số liệu học sinh (dùng chung cho phân tích đầy đủ và cập nhật tăng dần)"""
         recommendations = []
-        students = [summary.student for summary in student_summaries]
 
         # Gọi các phương thức con để tạo gợi ý
         recommendations.extend(self._get_weak_subject_recommendations(class_stats))
-        recommendations.extend(self._get_weak_student_recommendations(student_summaries))
-        recommendations.extend(self._get_study_group_recommendations(student_summaries))
+        recommendations.extend(self._get_weak_student_recommendations(facts))
+        recommendations.extend(self._get_study_group_recommendations(facts))
         recommendations.extend(self._get_strong_subject_recommendations(class_stats))
-        recommendations.extend(self._get_critical_student_warnings(student_summaries))
+        recommendations.extend(self._get_critical_student_warnings(facts))
         recommendations.extend(self._get_class_quality_assessment(class_stats))
-        recommendations.extend(self._get_excellent_potential_analysis(students))
-        recommendations.extend(self._get_excellent_conditions_statistics(students))
+        recommendations.extend(self._get_excellent_potential_analysis(facts))
+        recommendations.extend(self._get_excellent_conditions_statistics(facts))
 
         return recommendations
 
-    def _get_weak_subject_recommendations(self, class_stats: ClassStatistics) -> List[str]:
+    def _get_weak_subject_recommendations(self, class_stats: ClassStatisticsRecord) -> List[str]:
         """Gợi ý về môn học cần phụ đạo"""
         recommendations = []
         for subject_stat in class_stats.subject_statistics:
@@ -348,35 +472,33 @@ class GradeAnalyzer:
                 )
         return recommendations
 
-    def _get_weak_student_recommendations(self, student_summaries: List[StudentSummary]) -> List[str]:
+    def _get_weak_student_recommendations(self, facts: RecommendationFacts) -> List[str]:
         """Gợi ý cá nhân hóa cho học sinh yếu"""
         recommendations = []
-        weak_students = [s for s in student_summaries if s.grade_level == GradeLevel.WEAK]
-        if weak_students:
-            recommendations.append(f"👥 Học sinh cần hỗ trợ cá nhân ({len(weak_students)} em):")
-            for student in weak_students[:3]:  # Chỉ hiển thị 3 em đầu
+        if facts.weak_count:
+            recommendations.append(f"👥 Học sinh cần hỗ trợ cá nhân ({facts.weak_count} em):")
+            for student in facts.weak_students[:3]:  # Chỉ hiển thị 3 em đầu
                 weak_subjects_str = ", ".join(student.weak_subjects[:3])
                 recommendations.append(
                     f"   • {student.student.name} (TB: {student.average_score}) - "
                     f"Yếu: {weak_subjects_str}"
                 )
-            if len(weak_students) > 3:
-                recommendations.append(f"   • ... và {len(weak_students) - 3} học sinh khác")
+            if facts.weak_count > 3:
+                recommendations.append(f"   • ... và {facts.weak_count - 3} học sinh khác")
         return recommendations
 
-    def _get_study_group_recommendations(self, student_summaries: List[StudentSummary]) -> List[str]:
+    def _get_study_group_recommendations(self, facts: RecommendationFacts) -> List[str]:
         """Gợi ý nhóm học tập"""
         recommendations = []
-        excellent_students = [s for s in student_summaries if s.grade_level == GradeLevel.EXCELLENT]
-        weak_students = [s for s in student_summaries if s.grade_level == GradeLevel.WEAK]
+        weak_students = facts.weak_students
 
-        if excellent_students and weak_students:
+        if facts.excellent_count and facts.weak_count:
             recommendations.append(
-                f"🤝 Đề xuất nhóm học tập: Ghép {len(excellent_students)} học sinh giỏi "
-                f"với {len(weak_students)} học sinh yếu để hỗ trợ lẫn nhau."
+                f"🤝 Đề xuất nhóm học tập: Ghép {facts.excellent_count} học sinh giỏi "
+                f"với {facts.weak_count} học sinh yếu để hỗ trợ lẫn nhau."
             )
             # Gợi ý cặp cụ thể
-            for i, excellent in enumerate(excellent_students[:2]):
+            for i, excellent in enumerate(facts.excellent_students[:2]):
                 if i < len(weak_students):
                     recommendations.append(
                         f"   • {excellent.student.name} (TB: {excellent.average_score}) "
@@ -384,7 +506,7 @@ class GradeAnalyzer:
                     )
         return recommendations
 
-    def _get_strong_subject_recommendations(self, class_stats: ClassStatistics) -> List[str]:
+    def _get_strong_subject_recommendations(self, class_stats: ClassStatisticsRecord) -> List[str]:
         """Gợi ý về môn học mạnh"""
         recommendations = []
         strong_subjects = [subject_stat.subject for subject_stat in class_stats.subject_statistics
@@ -397,18 +519,17 @@ class GradeAnalyzer:
             )
         return recommendations
 
-    def _get_critical_student_warnings(self, student_summaries: List[StudentSummary]) -> List[str]:
+    def _get_critical_student_warnings(self, facts: RecommendationFacts) -> List[str]:
         """Cảnh báo khẩn cấp cho học sinh có điểm quá thấp"""
         recommendations = []
-        critical_students = [s for s in student_summaries if s.average_score < 4.0]
-        if critical_students:
+        if facts.critical_count:
             recommendations.append(
-                f"🚨 CẢNH BÁO: {len(critical_students)} học sinh có điểm TB < 4.0, "
+                f"🚨 CẢNH BÁO: {facts.critical_count} học sinh có điểm TB < 4.0, "
                 f"cần can thiệp khẩn cấp để tránh bỏ học."
             )
         return recommendations
 
-    def _get_class_quality_assessment(self, class_stats: ClassStatistics) -> List[str]:
+    def _get_class_quality_assessment(self, class_stats: ClassStatisticsRecord) -> List[str]:
         """Đánh giá chất lượng tổng quan của lớp"""
         recommendations = []
         total_students = class_stats.total_students
@@ -422,53 +543,36 @@ class GradeAnalyzer:
             )
         return recommendations
 
-    def _get_excellent_potential_analysis(self, students: List[Student]) -> List[str]:
+    def _get_excellent_potential_analysis(self, facts: RecommendationFacts) -> List[str]:
         """Phân tích học sinh có tiềm năng đạt loại giỏi"""
         recommendations = []
-        near_excellent_students = []
-
-        for student in students:
-            conditions = self.check_excellent_student_conditions(student)
-            if not conditions['is_excellent'] and conditions['average_score'] >= 7.5:
-                near_excellent_students.append((student.name, conditions))
-
-        if near_excellent_students:
+        if facts.near_excellent_students:
             recommendations.append("🎯 **Học sinh có tiềm năng đạt loại giỏi:**")
-            for name, conditions in near_excellent_students[:3]:  # Top 3
-                recommendations.append(f"   • {name}: {conditions['details']}")
+            for profile in facts.near_excellent_students[:3]:  # Top 3
+                recommendations.append(f"   • {profile.student.name}: {self._excellent_details(profile)}")
         return recommendations
 
-    def _get_excellent_conditions_statistics(self, students: List[Student]) -> List[str]:
+    def _get_excellent_conditions_statistics(self, facts: RecommendationFacts) -> List[str]:
         """Thống kê về điều kiện học sinh giỏi"""
         recommendations = []
-        excellent_analysis = self._analyze_excellent_conditions(students)
-        if excellent_analysis['total_students'] > 0:
+        if facts.total_students > 0:
             recommendations.append(
                 f"📊 **Phân tích điều kiện học sinh giỏi:** "
-                f"{excellent_analysis['students_with_good_average']}/{excellent_analysis['total_students']} "
+                f"{facts.students_with_good_average}/{facts.total_students} "
                 f"có TB ≥ 8.0, "
-                f"{excellent_analysis['students_no_low_scores']}/{excellent_analysis['total_students']} "
+                f"{facts.students_no_low_scores}/{facts.total_students} "
                 f"không có môn < 6.5, "
-                f"{excellent_analysis['students_math_lit_good']}/{excellent_analysis['total_students']} "
+                f"{facts.students_math_lit_good}/{facts.total_students} "
                 f"có Toán hoặc Văn ≥ 8.0"
             )
         return recommendations
 
-    def _analyze_excellent_conditions(self, students: List[Student]) -> dict:
+    def _analyze_excellent_conditions(self, profiles: List[StudentProfile]) -> dict:
         """Phân tích chi tiết các điều kiện học sinh giỏi trong lớp"""
-        total_students = len(students)
-        students_with_good_average = 0
-        students_no_low_scores = 0
-        students_math_lit_good = 0
-
-        for student in students:
-            conditions = self.check_excellent_student_conditions(student)
-            if conditions['average_condition']:
-                students_with_good_average += 1
-            if conditions['min_score_condition']:
-                students_no_low_scores += 1
-            if conditions['math_literature_condition']:
-                students_math_lit_good += 1
+        total_students = len(profiles)
+        students_with_good_average = sum(1 for profile in profiles if profile.average_condition)
+        students_no_low_scores = sum(1 for profile in profiles if profile.min_score_condition)
+        students_math_lit_good = sum(1 for profile in profiles if profile.math_literature_condition)
 
         return {
             'total_students': total_students,
@@ -477,36 +581,149 @@ class GradeAnalyzer:
             'students_math_lit_good': students_math_lit_good
         }
     
-    def analyze_complete(self, file_id: str, students: List[Student]) -> AnalysisResult:
-        """Phân tích hoàn chỉnh"""
-        # Phân tích từng học sinh với thứ hạng
-        student_summaries = self.analyze_students_with_rank(students)
+    def analyze_complete(self, file_id: str, students: Union[ScoreMatrix, List[Student]],
+                         sections: Optional[AbstractSet[str]] = None) -> AnalysisResult:
+        """
+        Phân tích hoàn chỉnh (nhận ma trận điểm hoặc danh sách Student)
+
+        sections: chỉ tính các phần được yêu cầu ("student_summaries", "recommendations"),
+        None = tất cả. class_statistics luôn được tính; phần bị bỏ qua để trống.
+        """
+        return self.analyze_class(file_id, students, sections)[0]
+
+    def analyze_class(self, file_id: str, students: Union[ScoreMatrix, List[Student]],
+                      sections: Optional[AbstractSet[str]] = None) -> Tuple[AnalysisResult, ClassDigest]:
+        """
+        Như analyze_complete, trả thêm ClassDigest của lớp để tổng hợp toàn trường (summarize_school)
+        mà không phải tính lại điểm TB và xếp loại
+        """
+        if sections is None:
+            sections = {"student_summaries", "recommendations"}
+        include_recommendations = "recommendations" in sections
+        include_summaries = "student_summaries" in sections or include_recommendations
+
+        matrix = students if isinstance(students, ScoreMatrix) else ScoreMatrix.from_students(students)
+        # Các bước phân tích dùng object nội bộ, model Pydantic chỉ được dựng cho response
+        students = matrix.to_records()
+
+        # Điểm trung bình của mọi học sinh tính một lần trên ma trận
+        averages = matrix.average_scores()
+
+        # Mọi chỉ số còn lại của từng học sinh (xếp loại, điều kiện học sinh giỏi...) tính một lần
+        # cho cả lớp trên ma trận
+        classification = self.classify_matrix(matrix, averages)
+        profiles = classification.to_profiles(students)
+        subject_index = matrix.subject_index()
+
+        # Phân tích từng học sinh với thứ hạng (gợi ý cũng cần danh sách này)
+        student_summaries = (self.analyze_students_with_rank(students, averages, profiles)
+                             if include_summaries else [])
 
         # Phân tích thống kê lớp
-        class_statistics = self.analyze_class_statistics(students)
+        class_statistics = self.analyze_class_statistics(students, averages, profiles, subject_index)
+
+        # Tạo gợi ý (profile theo thứ hạng, cùng thứ tự student_summaries)
+        recommendations = []
+        if include_recommendations:
+            ranked_profiles = [profiles[index] for index in self._rank_order(averages)]
+            recommendations = self.generate_recommendations(class_statistics, student_summaries, ranked_profiles)
 
-        # Tạo gợi ý
-        recommendations = self.generate_recommendations(class_statistics, student_summaries)
+        digest = ClassDigest(matrix.names, matrix.class_names, classification.average_scores,
+                             classification.level_codes, subject_index)
+        return build_analysis_result(file_id, class_statistics, student_summaries, recommendations), digest
 
-        return AnalysisResult(
-            file_id=file_id,
-            class_statistics=class_statistics,
-            student_summaries=student_summaries,
-            recommendations=recommendations
+    def class_digest(self, matrix: ScoreMatrix) -> ClassDigest:
+        """ClassDigest của một lớp khi không cần kết quả phân tích lớp đó"""
+        classification = self.classify_matrix(matrix, matrix.average_scores())
+        return ClassDigest(matrix.names, matrix.class_names, classification.average_scores,
+                           classification.level_codes, matrix.subject_index())
+
+    def analyze_school_summary(self, class_matrices: List[ScoreMatrix]) -> SchoolSummary:
+        """Tổng hợp toàn trường từ ma trận điểm của từng lớp (mỗi ma trận một lớp, theo thứ tự kết quả)"""
+        return self.summarize_school([self.class_digest(matrix) for matrix in class_matrices])
+
+    def summarize_school(self, digests: List[ClassDigest]) -> SchoolSummary:
+        """
+        Tổng hợp toàn trường từ ClassDigest của từng lớp (theo thứ tự kết quả)
+
+        Điểm TB và xếp loại của mọi học sinh đã được tính khi phân tích từng lớp, ở đây chỉ ghép lại
+        để xếp hạng, đếm phân bố và thống kê môn một lần cho cả trường; điểm TB chung của mỗi lớp
+        giống hệt overall_average trong ClassStatistics của lớp đó.
+        """
+        averages = np.concatenate([digest.average_scores for digest in digests])
+        level_codes = np.concatenate([digest.level_codes for digest in digests])
+        names = np.concatenate([digest.names for digest in digests])
+        class_names = np.concatenate([digest.class_names for digest in digests])
+        total_students = len(averages)
+        if total_students == 0:
+            raise ValueError("Không có học sinh nào để tổng hợp")
+
+        level_counts = np.bincount(level_codes, minlength=len(GradeClassification.GRADE_LEVELS)).tolist()
+        grade_distribution = {level.value: count
+                              for level, count in zip(GradeClassification.GRADE_LEVELS, level_counts)}
+
+        top_students = [
+            SchoolTopStudent(name=names[index], class_name=class_names[index],
+                             score=float(averages[index]), rank=rank)
+            for rank, index in enumerate(top_k_indices(averages, SCHOOL_TOP_STUDENTS).tolist(), 1)
+        ]
+
+        # Xếp hạng lớp theo điểm TB chung của từng lớp
+        class_scores = [digest.overall_average for digest in digests]
+        class_ranking = [
+            ClassRanking(class_name=digests[index].class_name, total_students=len(digests[index]),
+                         average_score=class_scores[index], rank=rank)
+            for rank, index in enumerate(self._rank_order(class_scores), 1)
+        ]
+
+        # Chỉ mục môn toàn trường: ghép chỉ mục của từng lớp (chỉ số học sinh cộng thêm vị trí lớp)
+        subject_parts: Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]] = {}
+        offset = 0
+        for digest in digests:
+            for subject, (scores, owners) in digest.subject_index.items():
+                parts = subject_parts.setdefault(subject, ([], []))
+                parts[0].append(scores)
+                parts[1].append(owners + offset)
+            offset += len(digest)
+        subject_statistics = [
+            self._subject_statistics(names, subject, np.concatenate(subject_parts[subject][0]),
+                                     np.concatenate(subject_parts[subject][1])).to_model()
+            for subject in sorted(subject_parts)
+        ]
+
+        return SchoolSummary(
+            total_classes=len(digests),
+            total_students=total_students,
+            overall_average=round(float(np.cumsum(averages)[-1]) / total_students, 2),
+            highest_score=float(averages.max()),
+            lowest_score=float(averages.min()),
+            grade_distribution=grade_distribution,
+            top_students=top_students,
+            class_ranking=class_ranking,
+            subject_statistics=subject_statistics
         )
 
-    def analyze_students_with_rank(self, students: List[Student]) -> List[StudentSummary]:
-        """Phân tích danh sách học sinh với thứ hạng"""
-        # Tính điểm trung bình cho tất cả học sinh
-        student_scores = [(student, self.calculate_student_average(student)) for student in students]
+    def _rank_order(self, averages: Sequence[float]) -> List[int]:
+        """Chỉ số học sinh theo điểm TB giảm dần (cùng điểm giữ thứ tự ban đầu)"""
+        return np.argsort(-np.asarray(averages, dtype=float), kind='stable').tolist()
 
-        # Sắp xếp theo điểm giảm dần để tính rank
-        student_scores.sort(key=lambda x: x[1], reverse=True)
+    def analyze_students_with_rank(self, students: List[StudentRecord],
+                                   averages: Optional[Sequence[float]] = None,
+                                   profiles: Optional[List[StudentProfile]] = None) -> List[StudentSummaryRecord]:
+        """
+        Phân tích danh sách học sinh với thứ hạng (averages / profiles: điểm TB và profile của
+        từng học sinh theo thứ tự students, đã tính sẵn nếu có)
+        """
+        # Tính điểm trung bình cho tất cả học sinh
+        if averages is None:
+            averages = [self.calculate_student_average(student) for student in students]
+        if profiles is None:
+            profiles = self.build_profiles(students, averages)
 
-        # Tạo StudentSummary với rank
+        # Sắp xếp theo điểm giảm dần để tính rank, tạo StudentSummary với rank
         summaries = []
-        for rank, (student, _) in enumerate(student_scores, 1):  # Use _ for unused score
-            summary = self.analyze_student(student, rank)
+        for rank, index in enumerate(self._rank_order(averages), 1):
+            summary = self.analyze_student(students[index], rank, averages[index], profiles[index])
             summaries.append(summary)
 
         return summaries
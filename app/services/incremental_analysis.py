@@ -0,0 +1,782 @@
+"""
+Phân tích tăng dần: giữ trạng thái phân tích của một file để áp dụng các thay đổi điểm nhỏ
+(sửa / thêm / xóa điểm, thêm / xóa học sinh) mà không phân tích lại cả lớp
+
+Mỗi lớp giữ tổng và số điểm của từng môn, người giữ điểm cao / thấp nhất, số học sinh theo
+xếp loại và chỉ mục thứ hạng (RankIndex). Một thay đổi chỉ tính lại profile của học sinh bị
+sửa và cập nhật các tổng đó, nên chi phí tỉ lệ với số điểm thay đổi thay vì số học sinh.
+
+Điểm TB làm tròn lấy từ tổng chính xác; chỉ khi giá trị nằm sát ranh giới làm tròn (kết quả
+phụ thuộc sai số của phép cộng số thực) mới cộng lại lần lượt như phân tích đầy đủ, nhờ đó kết
+quả luôn giống hệt phân tích lại từ đầu.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import AbstractSet, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.domain import (
+    ClassStatisticsRecord, GradeRecord, RecommendationFacts, StudentProfile, StudentRecord, StudentSummaryRecord,
+    SubjectStatisticsRecord, TopStudentRecord, construct_model
+)
+from app.models.schemas import (
+    AnalysisResult, ClassRanking, ClassStatistics, GradeLevel, SchoolAnalysisResult, SchoolSummary,
+    SchoolTopStudent, ScoreDelta, Student, StudentSummary, SubjectStatistics, TopStudent
+)
+from app.models.score_matrix import ScoreMatrix
+from app.services.grade_analyzer import CLASS_TOP_STUDENTS, SCHOOL_TOP_STUDENTS, GradeAnalyzer
+from app.services.rank_index import RankIndex
+
+logger = logging.getLogger(__name__)
+
+# Tổng điểm môn giữ dạng số nguyên (điểm × 2^60): cộng / trừ chính xác, không tích lũy sai số
+# qua nhiều lần cập nhật
+FIXED_SCALE = 1 << 60
+
+# Mã một điểm trong môn: (key học sinh << POSITION_BITS) | vị trí điểm của học sinh, so sánh
+# theo thứ tự học sinh rồi thứ tự điểm giống chỉ mục môn của phân tích đầy đủ
+POSITION_BITS = 32
+
+
+def near_rounding_boundary(numerator: int, denominator: int) -> bool:
+    """
+    numerator / denominator (điểm TB × 100) cách x.5 chưa tới 1e-6: làm tròn 2 chữ số khi đó phụ
+    thuộc sai số của phép cộng số thực nên phải tính đúng như phân tích đầy đủ
+    """
+    quotient, remainder = divmod(2 * numerator, denominator)
+    distance = remainder if quotient % 2 else denominator - remainder
+    return distance * 10 ** 6 < denominator
+
+
+class SubjectAccumulator:
+    """Tổng, số điểm, số điểm từ mỗi ngưỡng xếp loại và các điểm cao / thấp nhất của một môn trong một lớp"""
+
+    __slots__ = ("thresholds", "count", "total", "passed", "at_least_excellent", "at_least_good",
+                 "at_least_average", "_values", "_entries", "_order", "_ordered_scores")
+
+    def __init__(self, thresholds: Tuple[float, float, float]):
+        self.thresholds = thresholds
+        self.count = 0
+        self.total = 0
+        self.passed = 0
+        self.at_least_excellent = 0
+        self.at_least_good = 0
+        self.at_least_average = 0
+        # Các giá trị điểm khác nhau (tăng dần) và mã các điểm có giá trị đó (tăng dần)
+        self._values: List[float] = []
+        self._entries: Dict[float, List[int]] = {}
+        # Mọi mã điểm (tăng dần) và điểm tương ứng, để cộng lần lượt khi cần
+        self._order: List[int] = []
+        self._ordered_scores: List[float] = []
+
+    @classmethod
+    def from_scores(cls, thresholds: Tuple[float, float, float], scores: np.ndarray,
+                    entries: np.ndarray) -> "SubjectAccumulator":
+        """Dựng từ mọi điểm của môn (entries tăng dần) trên mảng, thay vì thêm từng điểm"""
+        excellent, good, average = thresholds
+        accumulator = cls(thresholds)
+        accumulator.count = len(scores)
+        # Cùng phép tính với _count: int(điểm × 2^60) (điểm <= 10 nên vừa uint64)
+        accumulator.total = sum((scores * float(FIXED_SCALE)).astype(np.uint64).tolist())
+        accumulator.passed = int(np.count_nonzero(scores >= 5.0))
+        accumulator.at_least_excellent = int(np.count_nonzero(scores >= excellent))
+        accumulator.at_least_good = int(np.count_nonzero(scores >= good))
+        accumulator.at_least_average = int(np.count_nonzero(scores >= average))
+
+        accumulator._order = entries.tolist()
+        accumulator._ordered_scores = scores.tolist()
+        values, value_codes = np.unique(scores, return_inverse=True)
+        grouped = np.argsort(value_codes, kind='stable')
+        bounds = np.cumsum(np.bincount(value_codes, minlength=len(values)))[:-1]
+        accumulator._values = values.tolist()
+        accumulator._entries = {value: part.tolist()
+                                for value, part in zip(accumulator._values, np.split(entries[grouped], bounds))}
+        return accumulator
+
+    @property
+    def ordered_scores(self) -> List[float]:
+        """Điểm theo thứ tự học sinh rồi thứ tự điểm (như chỉ mục môn của phân tích đầy đủ)"""
+        return self._ordered_scores
+
+    def add(self, score: float, entry: int):
+        self._count(score, 1)
+        position = bisect_left(self._order, entry)
+        self._order.insert(position, entry)
+        self._ordered_scores.insert(position, score)
+        entries = self._entries.get(score)
+        if entries is None:
+            entries = self._entries[score] = []
+            insort(self._values, score)
+        insort(entries, entry)
+
+    def remove(self, score: float, entry: int):
+        self._count(score, -1)
+        position = bisect_left(self._order, entry)
+        del self._order[position]
+        del self._ordered_scores[position]
+        entries = self._entries[score]
+        del entries[bisect_left(entries, entry)]
+        if not entries:
+            del self._entries[score]
+            del self._values[bisect_left(self._values, score)]
+
+    def highest(self) -> Tuple[float, int]:
+        """Điểm cao nhất và mã điểm đầu tiên đạt điểm đó"""
+        score = self._values[-1]
+        return score, self._entries[score][0]
+
+    def lowest(self) -> Tuple[float, int]:
+        """Điểm thấp nhất và mã điểm đầu tiên có điểm đó"""
+        score = self._values[0]
+        return score, self._entries[score][0]
+
+    def _count(self, score: float, delta: int):
+        excellent, good, average = self.thresholds
+        self.count += delta
+        self.total += delta * int(score * FIXED_SCALE)
+        self.passed += delta * (score >= 5.0)
+        self.at_least_excellent += delta * (score >= excellent)
+        self.at_least_good += delta * (score >= good)
+        self.at_least_average += delta * (score >= average)
+
+
+class StudentState:
+    """Một học sinh: điểm (kèm vị trí cố định của từng điểm), profile và kết quả phân tích hiện tại"""
+
+    __slots__ = ("key", "record", "positions", "next_position", "profile", "summary",
+                 "_student_model", "_summary_model", "_summary_rank")
+
+    def __init__(self, key: int, record: StudentRecord):
+        self.key = key
+        self.record = record
+        self.positions = list(range(len(record.grades)))
+        self.next_position = len(record.grades)
+        self.profile: Optional[StudentProfile] = None
+        self.summary: Optional[StudentSummaryRecord] = None
+        self._student_model: Optional[Student] = None
+        self._summary_model: Optional[StudentSummary] = None
+        self._summary_rank = 0
+
+    def entry(self, index: int) -> int:
+        """Mã của điểm thứ index trong chỉ mục môn"""
+        return (self.key << POSITION_BITS) | self.positions[index]
+
+    def set_analysis(self, profile: StudentProfile, summary: StudentSummaryRecord):
+        self.profile = profile
+        self.summary = summary
+        self._student_model = None
+        self._summary_model = None
+
+    def summary_model(self, rank: int) -> StudentSummary:
+        """StudentSummary với thứ hạng rank, dùng lại model đã dựng nếu học sinh và thứ hạng không đổi"""
+        if self._summary_model is None or self._summary_rank != rank:
+            if self._student_model is None:
+                self._student_model = self.record.to_model()
+            summary = self.summary
+            self._summary_model = construct_model(StudentSummary, {
+                "student": self._student_model,
+                "average_score": summary.average_score,
+                "rank": rank,
+                "grade_level": summary.grade_level,
+                "weak_subjects": summary.weak_subjects,
+                "strong_subjects": summary.strong_subjects
+            })
+            self._summary_rank = rank
+        return self._summary_model
+
+
+class ClassAnalysisState:
+    """
+    Trạng thái phân tích tăng dần của một lớp
+
+    Học sinh được đánh key tăng dần theo thứ tự trong lớp (học sinh thêm mới ở cuối). Khi sửa,
+    học sinh bị tách khỏi các chỉ mục (detach) cho đến commit(), lúc đó profile được tính lại
+    và học sinh được gắn lại với điểm TB / xếp loại mới.
+    """
+
+    def __init__(self, class_name: str, analyzer: GradeAnalyzer):
+        self.class_name = class_name
+        self.analyzer = analyzer
+        self.students: Dict[int, StudentState] = {}
+        self.keys_by_name: Dict[str, int] = {}
+        self.next_key = 0
+        self.ranking = RankIndex()
+        self.level_rankings = {level: RankIndex() for level in GradeLevel}
+        self.total_cents = 0
+        self.condition_counts = [0, 0, 0]
+        self.subjects: Dict[str, SubjectAccumulator] = {}
+        self._thresholds = tuple(analyzer.grade_thresholds[level]
+                                 for level in (GradeLevel.EXCELLENT, GradeLevel.GOOD, GradeLevel.AVERAGE))
+        # Kết quả dựng sẵn (record và model), chỉ bỏ đi khi phần tương ứng thay đổi
+        self._subject_records: Dict[str, Tuple[SubjectStatisticsRecord, SubjectStatistics]] = {}
+        # Học sinh TB < 5.0 theo thứ hạng (record, model), sửa tại chỗ theo vị trí trong chỉ mục thứ hạng
+        self._weak_students: Optional[Tuple[List[TopStudentRecord], List[TopStudent]]] = None
+        self._pending: Dict[int, StudentState] = {}
+
+    @classmethod
+    def from_matrix(cls, matrix: ScoreMatrix, analyzer: GradeAnalyzer) -> "ClassAnalysisState":
+        """Dựng từ bảng điểm của một lớp (xếp loại cả lớp một lần như analyze_complete)"""
+        records = matrix.to_records()
+        averages = matrix.average_scores()
+        profiles = analyzer.classify_matrix(matrix, averages).to_profiles(records)
+
+        state = cls(records[0].class_name if records else "", analyzer)
+        for record, profile in zip(records, profiles):
+            student = state._insert(record, index_grades=False)
+            student.set_analysis(profile, analyzer.analyze_student(record, profile=profile))
+            state._attach(student)
+
+        # Chỉ mục môn dựng một lần trên mảng (key học sinh = thứ tự hàng trong ma trận)
+        scores = matrix.grade_scores()
+        entries = (matrix.grade_rows.astype(np.int64) << POSITION_BITS) | matrix.grade_positions()
+        for subject, indices in matrix.subject_grade_indices().items():
+            state.subjects[subject] = SubjectAccumulator.from_scores(state._thresholds, scores[indices],
+                                                                     entries[indices])
+        return state
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def find(self, name: str) -> Optional[StudentState]:
+        key = self.keys_by_name.get(name)
+        return self.students[key] if key is not None else None
+
+    def records(self) -> List[StudentRecord]:
+        """Học sinh theo thứ tự trong lớp (key tăng dần)"""
+        return [self.students[key].record for key in sorted(self.students)]
+
+    def student_name(self, entry: int) -> str:
+        """Tên học sinh của một mã điểm"""
+        return self.students[entry >> POSITION_BITS].record.name
+
+    def overall_average(self) -> float:
+        """Điểm TB chung (giống analyze_class_statistics: cộng lần lượt khi sát ranh giới làm tròn)"""
+        if near_rounding_boundary(self.total_cents, len(self.students)):
+            averages = [student.profile.average_score for student in self.students.values()]
+            return round(sum(averages) / len(averages), 2)
+        return round(self.total_cents / 100 / len(self.students), 2)
+
+    # Sửa điểm
+
+    def add_student(self, student_id: str, name: str) -> StudentState:
+        """Thêm học sinh chưa có điểm vào cuối lớp"""
+        student = self._insert(StudentRecord(student_id, name, self.class_name, []))
+        self._pending[student.key] = student
+        return student
+
+    def set_score(self, student: StudentState, subject: str, score: float):
+        """Sửa điểm môn subject (điểm đầu tiên của môn nếu nhập trùng) hoặc thêm điểm mới ở cuối"""
+        self._detach_pending(student)
+        grades = student.record.grades
+        for index, grade in enumerate(grades):
+            if grade.subject == subject:
+                entry = student.entry(index)
+                self._remove_entry(subject, grade.score, entry)
+                grade.score = score
+                self._add_entry(subject, score, entry)
+                return
+
+        grades.append(GradeRecord(subject, score))
+        student.positions.append(student.next_position)
+        student.next_position += 1
+        self._add_entry(subject, score, student.entry(len(grades) - 1))
+
+    def remove_score(self, student: StudentState, subject: str):
+        """Xóa mọi điểm môn subject của học sinh"""
+        self._detach_pending(student)
+        grades, positions = student.record.grades, student.positions
+        kept_grades, kept_positions = [], []
+        for index, grade in enumerate(grades):
+            if grade.subject == subject:
+                self._remove_entry(subject, grade.score, student.entry(index))
+            else:
+                kept_grades.append(grade)
+                kept_positions.append(positions[index])
+        grades[:] = kept_grades
+        student.positions = kept_positions
+
+    def remove_student(self, student: StudentState):
+        self._detach_pending(student)
+        for index, grade in enumerate(student.record.grades):
+            self._remove_entry(grade.subject, grade.score, student.entry(index))
+        del self._pending[student.key]
+        del self.students[student.key]
+        del self.keys_by_name[student.record.name]
+
+    def commit(self) -> int:
+        """Tính lại profile của các học sinh vừa sửa và gắn lại vào chỉ mục, trả về số học sinh"""
+        for student in self._pending.values():
+            profile = self.analyzer.build_profile(student.record)
+            student.set_analysis(profile, self.analyzer.analyze_student(student.record, profile=profile))
+            self._attach(student)
+
+        changed = len(self._pending)
+        self._pending.clear()
+        return changed
+
+    # Kết quả
+
+    def statistics(self) -> ClassStatisticsRecord:
+        """Thống kê lớp đọc từ chỉ mục (chỉ tính lại thống kê của các môn vừa thay đổi)"""
+        students = self.students
+        top_students = [TopStudentRecord(students[key].record.name, students[key].profile.average_score)
+                        for key in self.ranking.head(CLASS_TOP_STUDENTS)]
+
+        return ClassStatisticsRecord(
+            class_name=self.class_name,
+            total_students=len(students),
+            overall_average=self.overall_average(),
+            highest_score=students[self.ranking.select(1)].profile.average_score,
+            lowest_score=students[self.ranking.select(len(self.ranking))].profile.average_score,
+            grade_distribution={level.value: len(self.level_rankings[level]) for level in GradeLevel},
+            top_students=top_students,
+            weak_students=self._weak_student_records()[0],
+            subject_statistics=[self._subject_record(subject)[0] for subject in sorted(self.subjects)]
+        )
+
+    def recommendation_facts(self) -> RecommendationFacts:
+        """Số liệu cho gợi ý đọc từ chỉ mục thứ hạng (chỉ vài học sinh đầu của mỗi nhóm)"""
+        students = self.students
+        excellent = self.level_rankings[GradeLevel.EXCELLENT]
+        weak = self.level_rankings[GradeLevel.WEAK]
+
+        # Học sinh chưa giỏi có TB >= 7.5: vài học sinh đầu của mỗi xếp loại còn lại, ghép theo thứ hạng
+        candidates = [
+            students[key]
+            for level in (GradeLevel.GOOD, GradeLevel.AVERAGE, GradeLevel.WEAK)
+            for key in self.level_rankings[level].head(3)
+            if students[key].profile.average_score >= 7.5
+        ]
+        candidates.sort(key=lambda student: (RankIndex.bucket(student.profile.average_score), student.key))
+
+        return RecommendationFacts(
+            total_students=len(students),
+            excellent_count=len(excellent),
+            weak_count=len(weak),
+            critical_count=len(self.ranking) - self.ranking.count_at_least(4.0),
+            excellent_students=[students[key].summary for key in excellent.head(2)],
+            weak_students=[students[key].summary for key in weak.head(3)],
+            near_excellent_students=[student.profile for student in candidates[:3]],
+            students_with_good_average=self.condition_counts[0],
+            students_no_low_scores=self.condition_counts[1],
+            students_math_lit_good=self.condition_counts[2]
+        )
+
+    def to_result(self, file_id: str, include_summaries: bool = True,
+                  include_recommendations: bool = True) -> AnalysisResult:
+        """AnalysisResult hiện tại (StudentSummary của học sinh không đổi thứ hạng được dùng lại)"""
+        statistics = self.statistics()
+        summaries = []
+        if include_summaries:
+            students = self.students
+            summaries = [students[key].summary_model(rank) for rank, key in enumerate(self.ranking.keys(), 1)]
+        recommendations = []
+        if include_recommendations:
+            recommendations = self.analyzer.recommendations_from_facts(statistics, self.recommendation_facts())
+
+        # Model của danh sách học sinh yếu và thống kê môn được dùng lại nếu không đổi
+        class_statistics = construct_model(ClassStatistics, {
+            "class_name": statistics.class_name,
+            "total_students": statistics.total_students,
+            "overall_average": statistics.overall_average,
+            "highest_score": statistics.highest_score,
+            "lowest_score": statistics.lowest_score,
+            "grade_distribution": statistics.grade_distribution,
+            "top_students": [student.to_model() for student in statistics.top_students],
+            "weak_students": self._weak_student_records()[1],
+            "subject_statistics": [self._subject_record(subject)[1] for subject in sorted(self.subjects)]
+        })
+
+        return construct_model(AnalysisResult, {
+            "file_id": file_id,
+            "class_statistics": class_statistics,
+            "student_summaries": summaries,
+            "recommendations": recommendations
+        })
+
+    # Nội bộ
+
+    def _insert(self, record: StudentRecord, index_grades: bool = True) -> StudentState:
+        student = StudentState(self.next_key, record)
+        self.next_key += 1
+        self.students[student.key] = student
+        self.keys_by_name[record.name] = student.key
+        if index_grades:
+            for index, grade in enumerate(record.grades):
+                self._add_entry(grade.subject, grade.score, student.entry(index))
+        return student
+
+    def _attach(self, student: StudentState):
+        self._index(student, 1)
+
+    def _detach_pending(self, student: StudentState):
+        """Tách học sinh khỏi các chỉ mục trước lần sửa đầu tiên (một lần cho mỗi commit)"""
+        if student.key not in self._pending:
+            self._index(student, -1)
+            self._pending[student.key] = student
+
+    def _index(self, student: StudentState, delta: int):
+        profile = student.profile
+        weak = self._weak_students is not None and profile.average_score < 5.0
+        if delta > 0:
+            self.ranking.add(profile.average_score, student.key)
+            self.level_rankings[profile.grade_level].add(profile.average_score, student.key)
+            if weak:
+                record = TopStudentRecord(student.record.name, profile.average_score)
+                position = self._weak_position(student)
+                self._weak_students[0].insert(position, record)
+                self._weak_students[1].insert(position, record.to_model())
+        else:
+            if weak:
+                position = self._weak_position(student)
+                del self._weak_students[0][position]
+                del self._weak_students[1][position]
+            self.ranking.remove(profile.average_score, student.key)
+            self.level_rankings[profile.grade_level].remove(profile.average_score, student.key)
+        self.total_cents += delta * round(profile.average_score * 100)
+        self.condition_counts[0] += delta * profile.average_condition
+        self.condition_counts[1] += delta * profile.min_score_condition
+        self.condition_counts[2] += delta * profile.math_literature_condition
+
+    def _add_entry(self, subject: str, score: float, entry: int):
+        accumulator = self.subjects.get(subject)
+        if accumulator is None:
+            accumulator = self.subjects[subject] = SubjectAccumulator(self._thresholds)
+        accumulator.add(score, entry)
+        self._subject_records.pop(subject, None)
+
+    def _remove_entry(self, subject: str, score: float, entry: int):
+        accumulator = self.subjects[subject]
+        accumulator.remove(score, entry)
+        if accumulator.count == 0:
+            del self.subjects[subject]
+        self._subject_records.pop(subject, None)
+
+    def _subject_record(self, subject: str) -> Tuple[SubjectStatisticsRecord, SubjectStatistics]:
+        cached = self._subject_records.get(subject)
+        if cached is None:
+            record = subject_statistics(subject, [(self.subjects[subject], self)])
+            cached = self._subject_records[subject] = (record, record.to_model())
+        return cached
+
+    def _weak_student_records(self) -> Tuple[List[TopStudentRecord], List[TopStudent]]:
+        """Bản sao danh sách học sinh có TB < 5.0 theo thứ hạng (dựng một lần, sau đó sửa tại chỗ)"""
+        if self._weak_students is None:
+            students = self.students
+            records = [TopStudentRecord(students[key].record.name, students[key].profile.average_score)
+                       for key in self.ranking.keys_below(5.0)]
+            self._weak_students = (records, [record.to_model() for record in records])
+        records, models = self._weak_students
+        return list(records), list(models)
+
+    def _weak_position(self, student: StudentState) -> int:
+        """Vị trí của học sinh (đang có trong chỉ mục thứ hạng) trong danh sách học sinh yếu"""
+        return (self.ranking.rank(student.profile.average_score, student.key)
+                - self.ranking.count_at_least(5.0) - 1)
+
+
+def subject_statistics(subject: str,
+                       parts: List[Tuple[SubjectAccumulator, ClassAnalysisState]]) -> SubjectStatisticsRecord:
+    """Thống kê một môn gộp từ các lớp (theo thứ tự lớp), cùng quy tắc với GradeAnalyzer._subject_statistics"""
+    total = sum(accumulator.total for accumulator, _ in parts)
+    count = sum(accumulator.count for accumulator, _ in parts)
+    at_least_excellent = sum(accumulator.at_least_excellent for accumulator, _ in parts)
+    at_least_good = sum(accumulator.at_least_good for accumulator, _ in parts)
+    at_least_average = sum(accumulator.at_least_average for accumulator, _ in parts)
+
+    # Cao / thấp nhất: học sinh đầu tiên (lớp trước, rồi thứ tự trong lớp) đạt điểm đó
+    highest_score, lowest_score = None, None
+    highest_student, lowest_student = "", ""
+    for accumulator, state in parts:
+        score, entry = accumulator.highest()
+        if highest_score is None or score > highest_score:
+            highest_score, highest_student = score, state.student_name(entry)
+        score, entry = accumulator.lowest()
+        if lowest_score is None or score < lowest_score:
+            lowest_score, lowest_student = score, state.student_name(entry)
+
+    if near_rounding_boundary(total * 100, FIXED_SCALE * count):
+        # cumsum cộng lần lượt như GradeAnalyzer._subject_statistics
+        scores = np.concatenate([accumulator.ordered_scores for accumulator, _ in parts])
+        average_score = round(float(np.cumsum(scores)[-1]) / count, 2)
+    else:
+        average_score = round(total / FIXED_SCALE / count, 2)
+
+    return SubjectStatisticsRecord(
+        subject=subject,
+        average_score=average_score,
+        highest_score=highest_score,
+        lowest_score=lowest_score,
+        highest_score_student=highest_student,
+        lowest_score_student=lowest_student,
+        total_students=count,
+        pass_rate=round((sum(accumulator.passed for accumulator, _ in parts) / count) * 100, 1),
+        excellent_count=at_least_excellent,
+        good_count=at_least_good - at_least_excellent,
+        average_count=at_least_average - at_least_good,
+        weak_count=count - at_least_average
+    )
+
+
+class IncrementalAnalysis:
+    """
+    Kết quả phân tích của một file có thể cập nhật tăng dần (mỗi lớp một ClassAnalysisState)
+
+    Kết quả sau mỗi lần cập nhật giống hệt phân tích đầy đủ bảng điểm đã sửa (học sinh giữ thứ
+    tự cũ, học sinh mới ở cuối lớp, lớp mới ở cuối).
+    """
+
+    def __init__(self, analysis_id: str, client_id: str, file_id: str,
+                 classes: List[ClassAnalysisState], analyzer: GradeAnalyzer):
+        self.analysis_id = analysis_id
+        self.client_id = client_id
+        self.file_id = file_id
+        self.analyzer = analyzer
+        self.classes: Dict[str, ClassAnalysisState] = {state.class_name: state for state in classes}
+        self.version = 1
+        self.lock = asyncio.Lock()
+
+        # Mã học sinh mới tiếp nối mã lớn nhất hiện có (HS001, HS002...)
+        numbers = [int(student.record.id[2:]) for state in classes for student in state.students.values()
+                   if student.record.id[2:].isdigit()]
+        self._next_id = max(numbers, default=0) + 1
+
+    @classmethod
+    def build(cls, analysis_id: str, client_id: str, file_id: str, class_matrices: List[ScoreMatrix],
+              analyzer: Optional[GradeAnalyzer] = None) -> "IncrementalAnalysis":
+        """Dựng trạng thái từ bảng điểm của từng lớp (kết quả của WorkbookAnalyzer.parse_async)"""
+        analyzer = analyzer or GradeAnalyzer()
+        classes = [ClassAnalysisState.from_matrix(matrix, analyzer) for matrix in class_matrices]
+        return cls(analysis_id, client_id, file_id, classes, analyzer)
+
+    def apply(self, delta: ScoreDelta) -> int:
+        """
+        Áp dụng thay đổi điểm (removals trước, updates sau), trả về số học sinh bị sửa / thêm
+
+        Thay đổi được kiểm tra trước khi áp dụng: xóa học sinh / môn không có hoặc xóa hết học
+        sinh thì raise ValueError và trạng thái không đổi.
+        """
+        removals = [(self._class_name(item.class_name), item.student_name.strip().title(),
+                     item.subject.strip().title() if item.subject and item.subject.strip() else None)
+                    for item in delta.removals]
+        updates = [(self._class_name(item.class_name), item.student_name.strip().title(),
+                    item.subject.strip().title(), item.score)
+                   for item in delta.updates]
+        if not removals and not updates:
+            raise ValueError("Không có thay đổi điểm nào")
+        self._validate(removals, updates)
+
+        touched: Dict[str, ClassAnalysisState] = {}
+        for class_name, name, subject in removals:
+            state = touched[class_name] = self.classes[class_name]
+            student = state.find(name)
+            if subject is None:
+                state.remove_student(student)
+            else:
+                state.remove_score(student, subject)
+
+        for class_name, name, subject, score in updates:
+            state = self.classes.get(class_name)
+            if state is None:
+                state = self.classes[class_name] = ClassAnalysisState(class_name, self.analyzer)
+            touched[class_name] = state
+            student = state.find(name)
+            if student is None:
+                student = state.add_student(f"HS{self._next_id:03d}", name)
+                self._next_id += 1
+            state.set_score(student, subject, score)
+
+        changed = sum(state.commit() for state in touched.values())
+        self.version += 1
+        return changed
+
+    def to_result(self, sections: Optional[AbstractSet[str]] = None) -> SchoolAnalysisResult:
+        """
+        Kết quả hiện tại (lớp không còn học sinh bị bỏ qua)
+
+        sections: các phần cần dựng ("student_summaries", "recommendations"), None = tất cả.
+        Không cần danh sách học sinh thì chi phí chỉ phụ thuộc số môn và số học sinh yếu.
+        """
+        include_summaries = sections is None or "student_summaries" in sections
+        include_recommendations = sections is None or "recommendations" in sections
+
+        classes = [state for state in self.classes.values() if len(state)]
+        results = [state.to_result(self.file_id, include_summaries, include_recommendations) for state in classes]
+        summary = self._school_summary(classes) if len(classes) > 1 else None
+
+        return SchoolAnalysisResult(file_id=self.file_id, classes=results, school_summary=summary)
+
+    def _class_name(self, class_name: Optional[str]) -> str:
+        if class_name is not None and class_name.strip():
+            return class_name.strip().upper()
+        if len(self.classes) == 1:
+            return next(iter(self.classes))
+        raise ValueError("Cần class_name khi kết quả phân tích có nhiều lớp")
+
+    def _validate(self, removals: List[Tuple[str, str, Optional[str]]],
+                  updates: List[Tuple[str, str, str, float]]):
+        """Kiểm tra thay đổi trên trạng thái hiện tại, không sửa gì"""
+        removed_students: Set[Tuple[str, str]] = set()
+        removed_scores: Set[Tuple[str, str, str]] = set()
+        for class_name, name, subject in removals:
+            state = self.classes.get(class_name)
+            student = state.find(name) if state is not None else None
+            if student is None or (class_name, name) in removed_students:
+                raise ValueError(f"Không tìm thấy học sinh {name} lớp {class_name}")
+
+            if subject is None:
+                removed_students.add((class_name, name))
+            elif ((class_name, name, subject) in removed_scores
+                  or all(grade.subject != subject for grade in student.record.grades)):
+                raise ValueError(f"Học sinh {name} lớp {class_name} không có điểm môn {subject}")
+            else:
+                removed_scores.add((class_name, name, subject))
+
+        added_students = {
+            (class_name, name) for class_name, name, _, _ in updates
+            if (class_name, name) in removed_students or class_name not in self.classes
+            or self.classes[class_name].find(name) is None
+        }
+        remaining = sum(len(state) for state in self.classes.values()) - len(removed_students) + len(added_students)
+        if remaining == 0:
+            raise ValueError("Kết quả phân tích phải còn ít nhất một học sinh")
+
+    def _school_summary(self, classes: List[ClassAnalysisState]) -> SchoolSummary:
+        """Tổng hợp toàn trường từ trạng thái các lớp (cùng quy tắc với GradeAnalyzer.analyze_school_summary)"""
+        total_students = sum(len(state) for state in classes)
+
+        # Top toàn trường nằm trong top của từng lớp; cùng điểm: lớp trước, rồi thứ tự trong lớp
+        candidates = [
+            (RankIndex.bucket(state.students[key].profile.average_score), class_index, key)
+            for class_index, state in enumerate(classes)
+            for key in state.ranking.head(SCHOOL_TOP_STUDENTS)
+        ]
+        top_students = []
+        for rank, (_, class_index, key) in enumerate(sorted(candidates)[:SCHOOL_TOP_STUDENTS], 1):
+            student = classes[class_index].students[key]
+            top_students.append(SchoolTopStudent(name=student.record.name, class_name=student.record.class_name,
+                                                 score=student.profile.average_score, rank=rank))
+
+        class_scores = [state.overall_average() for state in classes]
+        class_ranking = [
+            ClassRanking(class_name=classes[index].class_name, total_students=len(classes[index]),
+                         average_score=class_scores[index], rank=rank)
+            for rank, index in enumerate(sorted(range(len(classes)), key=lambda index: -class_scores[index]), 1)
+        ]
+
+        total_cents = sum(state.total_cents for state in classes)
+        if near_rounding_boundary(total_cents, total_students):
+            averages = np.array([student.profile.average_score
+                                 for state in classes for student in state.students.values()])
+            overall_average = round(float(np.cumsum(averages)[-1]) / total_students, 2)
+        else:
+            overall_average = round(total_cents / 100 / total_students, 2)
+
+        subjects = sorted({subject for state in classes for subject in state.subjects})
+        subject_stats = [
+            subject_statistics(subject, [(state.subjects[subject], state)
+                                         for state in classes if subject in state.subjects]).to_model()
+            for subject in subjects
+        ]
+
+        return SchoolSummary(
+            total_classes=len(classes),
+            total_students=total_students,
+            overall_average=overall_average,
+            highest_score=max(state.students[state.ranking.select(1)].profile.average_score for state in classes),
+            lowest_score=min(state.students[state.ranking.select(len(state))].profile.average_score
+                             for state in classes),
+            grade_distribution={level.value: sum(len(state.level_rankings[level]) for state in classes)
+                                for level in GradeLevel},
+            top_students=top_students,
+            class_ranking=class_ranking,
+            subject_statistics=subject_stats
+        )
+
+
+class IncrementalAnalysisManager:
+    """
+    Giữ các IncrementalAnalysis trong bộ nhớ của process (LRU, tối đa max_entries kết quả,
+    hết hạn sau ttl_seconds không dùng)
+
+    Mỗi kết quả chỉ được sửa / đọc bởi một request tại một thời điểm (lock riêng), việc tính
+    chạy ngoài event loop.
+    """
+
+    def __init__(self, max_entries: int = settings.INCREMENTAL_MAX_ANALYSES,
+                 ttl_seconds: int = settings.INCREMENTAL_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[IncrementalAnalysis, float]]" = OrderedDict()
+        self.created = 0
+        self.updates = 0
+        self.evictions = 0
+
+    async def create(self, client_id: str, file_id: str, class_matrices: List[ScoreMatrix]) -> IncrementalAnalysis:
+        """Dựng trạng thái phân tích tăng dần từ bảng điểm các lớp và lưu lại"""
+        analysis = await asyncio.to_thread(IncrementalAnalysis.build, uuid.uuid4().hex, client_id, file_id,
+                                           class_matrices)
+        self._entries[analysis.analysis_id] = (analysis, time.monotonic() + self.ttl_seconds)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        self.created += 1
+        logger.info(f"Incremental analysis {analysis.analysis_id} created by client {client_id}")
+        return analysis
+
+    def get(self, analysis_id: str, client_id: str) -> Optional[IncrementalAnalysis]:
+        """Kết quả của client (client khác không thấy), gia hạn thời gian giữ"""
+        entry = self._entries.get(analysis_id)
+        if entry is None:
+            return None
+
+        analysis, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[analysis_id]
+            return None
+        if analysis.client_id != client_id:
+            return None
+
+        self._entries[analysis_id] = (analysis, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(analysis_id)
+        return analysis
+
+    async def render(self, analysis: IncrementalAnalysis,
+                     sections: Optional[AbstractSet[str]] = None) -> Tuple[int, SchoolAnalysisResult]:
+        """Phiên bản và kết quả hiện tại"""
+        async with analysis.lock:
+            result = await asyncio.to_thread(analysis.to_result, sections)
+            return analysis.version, result
+
+    async def apply(self, analysis: IncrementalAnalysis, delta: ScoreDelta,
+                    sections: Optional[AbstractSet[str]] = None) -> Tuple[int, SchoolAnalysisResult]:
+        """Áp dụng thay đổi điểm, trả về phiên bản và kết quả mới"""
+        def apply_and_render() -> SchoolAnalysisResult:
+            changed = analysis.apply(delta)
+            logger.info(f"Incremental analysis {analysis.analysis_id} updated: {changed} students changed")
+            return analysis.to_result(sections)
+
+        async with analysis.lock:
+            result = await asyncio.to_thread(apply_and_render)
+            self.updates += 1
+            return analysis.version, result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "created": self.created,
+            "updates": self.updates,
+            "evictions": self.evictions,
+        }
+
+
+# Singleton instance
+incremental_analyses = IncrementalAnalysisManager()
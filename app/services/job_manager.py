@@ -0,0 +1,154 @@
+"""
+Job phân tích bất đồng bộ: nhận file/link, trả về job id ngay và phân tích ở nền
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import pydantic_core
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.models.schemas import AnalysisJob, JobStage, JobStatus
+from app.services.job_store import JobStore, get_job_store
+from app.services.worker_pool import PoolSaturatedError
+from app.services.workbook_analyzer import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+# Hàm phân tích của một job: nhận callback báo tiến độ, trả về kết quả (model Pydantic)
+JobFunction = Callable[[ProgressCallback], Awaitable[BaseModel]]
+
+
+class AnalysisJobManager:
+    """
+    Chạy job phân tích ở nền (tối đa max_concurrency job cùng lúc) trên process pool dùng chung
+
+    Trạng thái và tiến độ (parsed → analyzed → serialized) được cập nhật vào store sau mỗi
+    bước; kết quả được serialize thành JSON một lần khi job xong. Job chờ (không bị từ chối)
+    khi hàng đợi phân tích đầy, tối đa saturated_retries lần rồi thất bại.
+    """
+
+    def __init__(self, store: JobStore, max_concurrency: int = settings.JOB_MAX_CONCURRENCY,
+                 ttl_seconds: int = settings.JOB_TTL_SECONDS,
+                 saturated_retries: int = settings.JOB_SATURATED_RETRIES):
+        self.store = store
+        self.saturated_retries = saturated_retries
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, client_id: str, source: str, analyze: JobFunction,
+                     cleanup: Optional[Callable[[], None]] = None) -> AnalysisJob:
+        """Tạo job và chạy analyze ở nền; cleanup (VD: đóng file tạm) được gọi khi job kết thúc"""
+        now = datetime.utcnow()
+        job = AnalysisJob(job_id=uuid.uuid4().hex, client_id=client_id, source=source,
+                          created_at=now, updated_at=now, expires_at=now + self.ttl)
+        try:
+            await self.store.create(job)
+        except BaseException:
+            if cleanup is not None:
+                cleanup()
+            raise
+
+        task = asyncio.create_task(self._run(job.job_id, analyze, cleanup))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        self.submitted += 1
+        logger.info(f"Analysis job {job.job_id} submitted by client {client_id}: {source}")
+        return job
+
+    async def get(self, job_id: str, client_id: str) -> Optional[AnalysisJob]:
+        """Job của client (client khác không thấy job)"""
+        job = await self.store.get(job_id)
+        if job is None or job.client_id != client_id:
+            return None
+        return job
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        """Data (JSON bytes) của job đã hoàn thành"""
+        return await self.store.get_result(job_id)
+
+    async def _update(self, job_id: str, **fields):
+        """Cập nhật trạng thái, gia hạn thời điểm hết hạn tính từ lần cập nhật cuối"""
+        now = datetime.utcnow()
+        fields.update(updated_at=now, expires_at=now + self.ttl)
+        await self.store.update(job_id, fields)
+
+    async def _run(self, job_id: str, analyze: JobFunction, cleanup: Optional[Callable[[], None]]):
+        reported = []
+
+        async def on_progress(stage: str):
+            reported.append(stage)
+            await self._update(job_id, stage=JobStage(stage))
+
+        try:
+            async with self._semaphore:
+                await self._update(job_id, status=JobStatus.RUNNING)
+
+                # Hàng đợi phân tích đầy: chờ rồi thử lại, quá số lần thử thì job thất bại
+                for attempt in range(self.saturated_retries + 1):
+                    try:
+                        data = await analyze(on_progress)
+                        break
+                    except PoolSaturatedError as e:
+                        if attempt == self.saturated_retries:
+                            raise
+                        await asyncio.sleep(e.retry_after)
+
+                # Kết quả lấy từ cache (hoặc từ request giống hệt đang chạy) không báo các bước đọc / phân tích
+                if JobStage.ANALYZED.value not in reported:
+                    await self._update(job_id, stage=JobStage.ANALYZED)
+
+                result = await asyncio.to_thread(pydantic_core.to_json, data)
+                await self.store.save_result(job_id, result, datetime.utcnow() + self.ttl)
+                await self._update(job_id, status=JobStatus.COMPLETED, stage=JobStage.SERIALIZED)
+
+            self.completed += 1
+            logger.info(f"Analysis job {job_id} completed")
+
+        except asyncio.CancelledError:
+            self.failed += 1
+            await self._mark_failed(job_id, "Job bị dừng do server tắt")
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Analysis job {job_id} failed: {str(e)}")
+            await self._mark_failed(job_id, f"Lỗi khi phân tích file: {str(e)}")
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    async def _mark_failed(self, job_id: str, message: str):
+        try:
+            await self._update(job_id, status=JobStatus.FAILED, message=message)
+        except Exception as e:
+            logger.error(f"Could not mark analysis job {job_id} as failed: {e}")
+
+    async def shutdown(self):
+        """Dừng các job đang chạy (được đánh dấu thất bại) và đóng store"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Số job đang chạy / chờ trong process này và tổng số job đã nhận, hoàn thành, thất bại"""
+        return {
+            "active_jobs": len(self._tasks),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+# Singleton instance
+job_manager = AnalysisJobManager(get_job_store())
@@ -0,0 +1,177 @@
+"""
+Lưu trạng thái và kết quả của job phân tích bất đồng bộ (bộ nhớ hoặc MongoDB)
+"""
+
+import asyncio
+import logging
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.database import MongoConnection, mongo_connection
+from app.models.schemas import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """
+    Interface chung cho nơi lưu job
+
+    Kết quả được lưu riêng với trạng thái job dưới dạng JSON đã serialize sẵn để
+    poll trạng thái không phải đọc kết quả lớn và trả kết quả không phải encode lại.
+    Job và kết quả bị xóa sau expires_at.
+    """
+
+    async def create(self, job: AnalysisJob):
+        raise NotImplementedError
+
+    async def update(self, job_id: str, fields: Dict[str, Any]):
+        """Cập nhật một số trường của job"""
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        raise NotImplementedError
+
+    async def save_result(self, job_id: str, result: bytes, expires_at: datetime):
+        """Lưu kết quả (JSON bytes) của job"""
+        raise NotImplementedError
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryJobStore(JobStore):
+    """Lưu trong bộ nhớ của process (dùng cho test / chạy một instance)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._results: Dict[str, tuple] = {}
+
+    def _purge_expired(self):
+        now = datetime.utcnow()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.expires_at <= now]:
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+
+    async def create(self, job: AnalysisJob):
+        self._purge_expired()
+        self._jobs[job.job_id] = job
+
+    async def update(self, job_id: str, fields: Dict[str, Any]):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            self._jobs[job_id] = job.model_copy(update=fields)
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.expires_at <= datetime.utcnow():
+            return None
+        return job
+
+    async def save_result(self, job_id: str, result: bytes, expires_at: datetime):
+        self._results[job_id] = (result, expires_at)
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        result, expires_at = self._results.get(job_id, (None, None))
+        if result is None or expires_at <= datetime.utcnow():
+            return None
+        return result
+
+
+class MongoJobStore(JobStore):
+    """
+    Lưu trong MongoDB (Motor) để job dùng được giữa nhiều instance / worker
+
+    Job hết hạn được MongoDB tự xóa bằng TTL index trên expires_at. Kết quả được nén
+    zlib để giảm dung lượng lưu trữ và không vượt giới hạn 16 MB của một document.
+    Dùng chung connection pool với AuthService (mongo_connection).
+    """
+
+    def __init__(self, connection: MongoConnection = mongo_connection):
+        self.connection = connection
+        self.jobs_collection = None
+        self.results_collection = None
+        self._initialized = False
+        self._initialize_lock = asyncio.Lock()
+
+    async def initialize(self):
+        """Khởi tạo collection và index (một lần, các request đến cùng lúc chờ lần khởi tạo đang chạy)"""
+        if self._initialized:
+            return
+
+        async with self._initialize_lock:
+            if not self._initialized:
+                await self._create_indexes()
+
+    async def _create_indexes(self):
+        try:
+            db = self.connection.db
+            self.jobs_collection = db["analysis_jobs"]
+            self.results_collection = db["analysis_job_results"]
+
+            # Tạo index cho hiệu suất và TTL index để MongoDB tự xóa job hết hạn
+            await self.jobs_collection.create_index("job_id", unique=True)
+            await self.jobs_collection.create_index("expires_at", expireAfterSeconds=0)
+            await self.results_collection.create_index("job_id", unique=True)
+            await self.results_collection.create_index("expires_at", expireAfterSeconds=0)
+
+            self._initialized = True
+            logger.info("MongoJobStore initialized successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to initialize MongoJobStore: {e}")
+            raise
+
+    def _to_document(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Enum được lưu bằng giá trị (chuỗi)"""
+        return {name: value.value if isinstance(value, Enum) else value for name, value in fields.items()}
+
+    async def create(self, job: AnalysisJob):
+        await self.initialize()
+        await self.jobs_collection.insert_one(self._to_document(job.model_dump()))
+
+    async def update(self, job_id: str, fields: Dict[str, Any]):
+        await self.initialize()
+        await self.jobs_collection.update_one({"job_id": job_id}, {"$set": self._to_document(fields)})
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        await self.initialize()
+        # TTL monitor của MongoDB chạy định kỳ nên vẫn lọc theo expires_at
+        document = await self.jobs_collection.find_one(
+            {"job_id": job_id, "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0}
+        )
+        return AnalysisJob(**document) if document is not None else None
+
+    async def save_result(self, job_id: str, result: bytes, expires_at: datetime):
+        await self.initialize()
+        compressed = await asyncio.to_thread(zlib.compress, result, 1)
+        await self.results_collection.replace_one(
+            {"job_id": job_id},
+            {"job_id": job_id, "data": compressed, "expires_at": expires_at},
+            upsert=True
+        )
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        await self.initialize()
+        document = await self.results_collection.find_one(
+            {"job_id": job_id, "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0, "data": 1}
+        )
+        if document is None:
+            return None
+        return await asyncio.to_thread(zlib.decompress, document["data"])
+
+
+def get_job_store(backend: str = settings.JOB_STORE_BACKEND) -> JobStore:
+    """Chọn nơi lưu job: memory hoặc mongodb"""
+    backend = backend.lower()
+    if backend == "memory":
+        return InMemoryJobStore()
+    if backend == "mongodb":
+        return MongoJobStore()
+    raise ValueError(f"JOB_STORE_BACKEND không hợp lệ: {backend} (chỉ chấp nhận: memory, mongodb)")
@@ -0,0 +1,105 @@
+"""
+Chỉ mục thứ hạng theo điểm trung bình, thêm / xóa / tra thứ hạng trong O(log n)
+"""
+
+from bisect import bisect_left, insort
+from typing import Iterator, List
+
+
+class RankIndex:
+    """
+    Tập học sinh (key nguyên) xếp theo điểm TB giảm dần, cùng điểm thì key nhỏ trước (giống
+    sắp xếp ổn định theo thứ tự danh sách khi key tăng theo thứ tự đó)
+
+    Điểm TB đã làm tròn 2 chữ số nên thuộc một trong 1001 mức 0.00 ... 10.00. Cây Fenwick đếm
+    số học sinh theo mức (mức điểm cao đứng trước), mỗi mức giữ danh sách key tăng dần. Thêm,
+    xóa, thứ hạng của một học sinh và học sinh ở thứ hạng k đều không phải duyệt cả lớp.
+    """
+
+    LEVELS = 1001
+
+    __slots__ = ("_tree", "_buckets", "_size")
+
+    def __init__(self):
+        self._tree = [0] * (self.LEVELS + 1)
+        self._buckets: List[List[int]] = [[] for _ in range(self.LEVELS)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def bucket(cls, score: float) -> int:
+        """Vị trí mức của điểm (0 = 10.00, điểm cao trước)"""
+        cents = min(max(round(score * 100), 0), cls.LEVELS - 1)
+        return cls.LEVELS - 1 - cents
+
+    def add(self, score: float, key: int):
+        bucket = self.bucket(score)
+        insort(self._buckets[bucket], key)
+        self._update(bucket, 1)
+
+    def remove(self, score: float, key: int):
+        bucket = self.bucket(score)
+        keys = self._buckets[bucket]
+        position = bisect_left(keys, key)
+        if position == len(keys) or keys[position] != key:
+            raise KeyError(key)
+        del keys[position]
+        self._update(bucket, -1)
+
+    def rank(self, score: float, key: int) -> int:
+        """Thứ hạng (từ 1) của học sinh đang có trong chỉ mục"""
+        bucket = self.bucket(score)
+        return self._prefix(bucket) + bisect_left(self._buckets[bucket], key) + 1
+
+    def select(self, rank: int) -> int:
+        """Key của học sinh ở thứ hạng rank (từ 1)"""
+        if not 1 <= rank <= self._size:
+            raise IndexError(rank)
+
+        # Tìm mức đầu tiên có số học sinh cộng dồn >= rank (đi xuống cây Fenwick)
+        position = 0
+        remaining = rank
+        step = 1 << (self.LEVELS.bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt <= self.LEVELS and self._tree[nxt] < remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return self._buckets[position][remaining - 1]
+
+    def head(self, count: int) -> List[int]:
+        """Key của tối đa count học sinh đầu tiên theo thứ hạng"""
+        return [self.select(rank) for rank in range(1, min(count, self._size) + 1)]
+
+    def count_at_least(self, score: float) -> int:
+        """Số học sinh có điểm TB >= score"""
+        return self._prefix(self.bucket(score) + 1)
+
+    def keys(self) -> Iterator[int]:
+        """Mọi key theo thứ hạng"""
+        for keys in self._buckets:
+            yield from keys
+
+    def keys_below(self, score: float) -> Iterator[int]:
+        """Key của các học sinh có điểm TB < score, theo thứ hạng"""
+        for keys in self._buckets[self.bucket(score) + 1:]:
+            yield from keys
+
+    def _update(self, bucket: int, delta: int):
+        self._size += delta
+        position = bucket + 1
+        while position <= self.LEVELS:
+            self._tree[position] += delta
+            position += position & -position
+
+    def _prefix(self, bucket: int) -> int:
+        """Số học sinh ở các mức trước bucket"""
+        total = 0
+        position = bucket
+        while position > 0:
+            total += self._tree[position]
+            position -= position & -position
+        return total
@@ -0,0 +1,62 @@
+"""
+Gộp các request giống nhau đang chạy đồng thời (single-flight)
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Mỗi khóa chỉ có một lần tính toán đang chạy: các lời gọi cùng khóa đến sau chờ và
+    nhận chung kết quả (hoặc chung exception) của lần đang chạy thay vì tính lại
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Chạy func() cho khóa, hoặc chờ kết quả nếu khóa đang được tính"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info(f"Coalesced request with in-flight computation: {key}")
+        else:
+            # Lần tính toán chạy trong task riêng: request nào bị hủy (kể cả request đầu tiên)
+            # cũng chỉ ngừng chờ, không làm hủy lần tính toán mà các request khác đang chờ
+            task = asyncio.create_task(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executions += 1
+
+        return await asyncio.shield(task)
+
+    def is_running(self, key: str) -> bool:
+        """Khóa đang có lần tính toán chạy (lời gọi run ngay sau đó chờ lần này, không gọi func)"""
+        return key in self._in_flight
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Đánh dấu exception đã được xử lý khi mọi request chờ đã bị hủy
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Số lần tính toán thực sự và số request được gộp vào lần tính toán đang chạy"""
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+
+# Singleton instance
+single_flight = SingleFlight()
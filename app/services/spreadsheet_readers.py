@@ -0,0 +1,350 @@
+"""
+Các backend đọc bảng tính (openpyxl, calamine, csv) với cùng một contract DataFrame
+"""
+
+import codecs
+import csv
+import io
+import os
+import unicodedata
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+import openpyxl
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from app.core.config import settings
+
+try:
+    # pyarrow là tùy chọn, dùng để parse CSV đa luồng
+    from pyarrow import csv as pyarrow_csv
+except ImportError:
+    pyarrow_csv = None
+
+try:
+    # Backend calamine (Rust) là tùy chọn, chỉ dùng khi đã cài python-calamine
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+
+# Nội dung file: bytes hoặc file nhị phân đọc được (upload đã spool ra đĩa, file tạm...)
+FileSource = Union[bytes, BinaryIO]
+
+# Kích thước mỗi lần đọc khi duyệt file theo khối
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def open_source(source: FileSource) -> BinaryIO:
+    """File-like đọc từ đầu nguồn dữ liệu (bytes được bọc BytesIO, không sao chép)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+
+    source.seek(0)
+    return source
+
+
+def source_size(source: FileSource) -> int:
+    """Kích thước nguồn dữ liệu (byte)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+
+    return source.seek(0, io.SEEK_END)
+
+
+def read_source(source: FileSource) -> bytes:
+    """Toàn bộ nội dung dưới dạng bytes (chỉ dùng khi backend cần dữ liệu liền khối)"""
+    if isinstance(source, bytes):
+        return source
+
+    return open_source(source).read()
+
+
+def iter_source_blocks(source: FileSource) -> Iterator[bytes]:
+    """Đọc nguồn dữ liệu theo từng khối READ_BLOCK_SIZE"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+        return
+
+    file = open_source(source)
+    while True:
+        block = file.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        yield block
+
+
+class SpreadsheetReader:
+    """
+    Interface chung cho các backend đọc bảng tính
+
+    read_sheet trả về DataFrame giống pd.read_excel(header=0): hàng đầu là tiêu đề,
+    ô trống là NaN, số nguyên giữ kiểu int. Đây là contract mà validate_and_clean_data cần.
+    Mọi method nhận bytes hoặc file nhị phân (FileSource).
+    """
+
+    name = "base"
+
+    # Backend có đọc được từng hàng mà không nạp toàn bộ sheet hay không
+    supports_streaming = False
+
+    def sheet_names(self, file_content: FileSource) -> List[Optional[str]]:
+        """Danh sách sheet của file"""
+        raise NotImplementedError
+
+    def read_sheet(self, file_content: FileSource, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        """Đọc một sheet thành DataFrame (sheet_name=None: sheet đầu tiên)"""
+        raise NotImplementedError
+
+    def iter_rows(self, file_content: FileSource, sheet_name: Optional[str] = None) -> Iterator[tuple]:
+        """Đọc lần lượt từng hàng (dùng cho chế độ xử lý theo luồng)"""
+        raise NotImplementedError
+
+
+class OpenpyxlReader(SpreadsheetReader):
+    """Backend mặc định của pandas: openpyxl cho .xlsx (xlrd cho .xls)"""
+
+    name = "openpyxl"
+    supports_streaming = True
+
+    def sheet_names(self, file_content: FileSource) -> List[Optional[str]]:
+        # Chế độ read-only chỉ đọc danh sách sheet, không đọc dữ liệu
+        workbook = openpyxl.load_workbook(open_source(file_content), read_only=True)
+        try:
+            return workbook.sheetnames
+        finally:
+            workbook.close()
+
+    def read_sheet(self, file_content: FileSource, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        return pd.read_excel(open_source(file_content), sheet_name=sheet_name or 0)
+
+    def iter_rows(self, file_content: FileSource, sheet_name: Optional[str] = None) -> Iterator[tuple]:
+        # Chế độ read-only không dựng toàn bộ workbook trong memory
+        workbook = openpyxl.load_workbook(open_source(file_content), read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+            yield from worksheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+class XlrdReader(SpreadsheetReader):
+    """File .xls cũ: pandas tự chọn engine, không hỗ trợ đọc theo luồng"""
+
+    name = "xlrd"
+
+    def sheet_names(self, file_content: FileSource) -> List[Optional[str]]:
+        with pd.ExcelFile(open_source(file_content)) as excel_file:
+            return excel_file.sheet_names
+
+    def read_sheet(self, file_content: FileSource, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        return pd.read_excel(open_source(file_content), sheet_name=sheet_name or 0)
+
+
+class CalamineReader(SpreadsheetReader):
+    """Backend calamine (Rust): đọc .xlsx/.xls/.ods nhanh hơn openpyxl nhiều lần"""
+
+    name = "calamine"
+    # iter_rows không dựng DataFrame nhưng calamine vẫn nạp toàn bộ workbook vào bộ nhớ
+    supports_streaming = False
+
+    def _open(self, file_content: FileSource):
+        return CalamineWorkbook.from_filelike(open_source(file_content))
+
+    def _get_sheet(self, workbook, sheet_name: Optional[str]):
+        if sheet_name is None:
+            return workbook.get_sheet_by_index(0)
+        return workbook.get_sheet_by_name(sheet_name)
+
+    def _convert_cell(self, value):
+        """Chuyển ô giống pandas: số nguyên dạng float thành int"""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def sheet_names(self, file_content: FileSource) -> List[Optional[str]]:
+        return self._open(file_content).sheet_names
+
+    def read_sheet(self, file_content: FileSource, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        sheet = self._get_sheet(self._open(file_content), sheet_name)
+
+        # Giữ vùng trống đầu sheet để hàng tiêu đề trùng với pd.read_excel
+        data = []
+        last_row_with_data = -1
+        for row_number, row in enumerate(sheet.to_python(skip_empty_area=False)):
+            converted_row = [self._convert_cell(value) for value in row]
+            while converted_row and converted_row[-1] == "":
+                converted_row.pop()
+            if converted_row:
+                last_row_with_data = row_number
+            data.append(converted_row)
+
+        data = data[:last_row_with_data + 1]
+        if not data:
+            return pd.DataFrame()
+
+        max_width = max(len(row) for row in data)
+        data = [row + [""] * (max_width - len(row)) for row in data]
+
+        # Cùng bộ parse mà pd.read_excel dùng (suy luận kiểu, "Unnamed: n", tên cột trùng)
+        return TextParser(data, header=0, skip_blank_lines=False).read()
+
+    def iter_rows(self, file_content: FileSource, sheet_name: Optional[str] = None) -> Iterator[tuple]:
+        sheet = self._get_sheet(self._open(file_content), sheet_name)
+        for row in sheet.iter_rows():
+            yield tuple(self._convert_cell(value) for value in row)
+
+
+class CsvReader(SpreadsheetReader):
+    """
+    File .csv: tự nhận diện encoding (UTF-8, UTF-16, Windows-1258...) và dấu phân cách,
+    parse đa luồng bằng pyarrow nếu đã cài (ngược lại dùng pd.read_csv)
+    """
+
+    name = "csv"
+
+    # Số byte đầu file dùng để nhận diện encoding và dấu phân cách
+    SNIFF_BYTES = 64 * 1024
+    SNIFF_LINES = 50
+    DELIMITERS = ',;\t|'
+
+    def sheet_names(self, file_content: FileSource) -> List[Optional[str]]:
+        return [None]
+
+    def read_sheet(self, file_content: FileSource, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        content = self.to_utf8(read_source(file_content))
+        return self.parse(content, self.detect_delimiter(content))
+
+    def detect_encoding(self, prefix: bytes) -> str:
+        """Nhận diện encoding từ phần đầu file"""
+        if prefix.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+
+        # UTF-16 không có BOM: byte 0 xen kẽ với ký tự ASCII
+        if prefix.count(b'\x00') > len(prefix) // 4:
+            return 'utf-16-le' if prefix[1::2].count(0) > prefix[0::2].count(0) else 'utf-16-be'
+
+        try:
+            # final=False: phần đầu có thể cắt ngang một ký tự nhiều byte
+            codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return settings.CSV_FALLBACK_ENCODING
+
+    def to_utf8(self, file_content: bytes) -> bytes:
+        """Chuyển nội dung file về UTF-8 (dạng NFC để "Toán" khớp với tên môn gõ bằng Unicode dựng sẵn)"""
+        encoding = self.detect_encoding(file_content[:self.SNIFF_BYTES])
+
+        if encoding == 'utf-8':
+            return file_content
+        if encoding == 'utf-8-sig':
+            return file_content[len(codecs.BOM_UTF8):]
+
+        # Windows-1258 dùng dấu tổ hợp nên cần chuẩn hóa NFC sau khi decode
+        text = file_content.decode(encoding, errors='replace')
+        return unicodedata.normalize('NFC', text).encode('utf-8')
+
+    def detect_delimiter(self, content: bytes) -> str:
+        """Nhận diện dấu phân cách (, ; tab |) từ các dòng đầu file UTF-8"""
+        lines = content[:self.SNIFF_BYTES].split(b'\n')[:self.SNIFF_LINES]
+        sample = b'\n'.join(lines).decode('utf-8', errors='ignore')
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=self.DELIMITERS).delimiter
+        except csv.Error:
+            return ','
+
+    def split_chunks(self, content: bytes, n_chunks: int) -> List[bytes]:
+        """Chia nội dung UTF-8 thành n_chunks phần theo ranh giới dòng, mỗi phần có lại dòng tiêu đề"""
+        header_end = content.find(b'\n') + 1
+        if header_end == 0 or n_chunks <= 1:
+            return [content]
+
+        header = content[:header_end]
+        chunk_size = max(1, (len(content) - header_end) // n_chunks)
+
+        chunks = []
+        start = header_end
+        while start < len(content):
+            end = content.find(b'\n', start + chunk_size)
+            end = len(content) if end == -1 else end + 1
+            chunks.append(header + content[start:end])
+            start = end
+
+        return chunks
+
+    def parse(self, content: bytes, delimiter: str = ',') -> pd.DataFrame:
+        """Parse nội dung CSV (UTF-8) thành DataFrame theo contract của pd.read_csv"""
+        if pyarrow_csv is None:
+            return pd.read_csv(io.BytesIO(content), sep=delimiter, encoding='utf-8')
+
+        header_end = content.find(b'\n')
+        header_line = content[:header_end if header_end != -1 else len(content)].decode('utf-8')
+        header = next(csv.reader([header_line.rstrip('\r')], delimiter=delimiter), [])
+
+        table = pyarrow_csv.read_csv(
+            io.BytesIO(content),
+            read_options=pyarrow_csv.ReadOptions(
+                column_names=self._column_names(header), skip_rows=1, use_threads=True
+            ),
+            parse_options=pyarrow_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pyarrow_csv.ConvertOptions(strings_can_be_null=True)
+        )
+        return table.to_pandas()
+
+    def _column_names(self, header: List[str]) -> List[str]:
+        """Tên cột giống pd.read_csv: cột trống thành "Unnamed: n", cột trùng thêm hậu tố .1, .2..."""
+        names = []
+        seen = {}
+        for i, name in enumerate(header):
+            name = name if name.strip() else f"Unnamed: {i}"
+            count = seen.get(name, 0)
+            seen[name] = count + 1
+            names.append(f"{name}.{count}" if count else name)
+
+        return names
+
+
+READERS = {
+    OpenpyxlReader.name: OpenpyxlReader(),
+    XlrdReader.name: XlrdReader(),
+    CalamineReader.name: CalamineReader(),
+    CsvReader.name: CsvReader(),
+}
+
+# Định dạng calamine đọc được
+CALAMINE_EXTENSIONS = ('.xlsx', '.xlsm', '.xlsb', '.xls', '.ods')
+
+
+def get_reader(filename: str, backend: Optional[str] = None, streaming: bool = False) -> SpreadsheetReader:
+    """
+    Chọn backend đọc file
+
+    backend (mặc định settings.EXCEL_READER_BACKEND):
+    - "auto": calamine cho file Excel nếu đã cài python-calamine, ngược lại openpyxl; với
+      streaming=True (file lớn) thì openpyxl read-only để giới hạn bộ nhớ
+    - "openpyxl" / "calamine": luôn dùng backend đó cho file Excel
+    File .csv luôn dùng CsvReader.
+    """
+    backend = (backend or settings.EXCEL_READER_BACKEND).lower()
+    extension = os.path.splitext(filename)[1].lower()
+
+    if extension == '.csv':
+        return READERS[CsvReader.name]
+
+    if backend not in ("auto", OpenpyxlReader.name, CalamineReader.name):
+        raise ValueError(f"Backend đọc file không hợp lệ: {backend}")
+
+    if backend == CalamineReader.name and CalamineWorkbook is None:
+        raise ValueError("Backend calamine yêu cầu cài đặt python-calamine")
+
+    use_calamine = (backend == CalamineReader.name or
+                    (backend == "auto" and not streaming and CalamineWorkbook is not None))
+    if use_calamine and extension in CALAMINE_EXTENSIONS:
+        return READERS[CalamineReader.name]
+
+    if extension == '.xls':
+        return READERS[XlrdReader.name]
+
+    return READERS[OpenpyxlReader.name]
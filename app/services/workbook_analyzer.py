@@ -0,0 +1,176 @@
+"""
+Phân tích workbook nhiều sheet / nhiều lớp (mỗi lớp một tác vụ) song song trên nhiều CPU
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+from typing import IO, AbstractSet, Awaitable, Callable, List, Optional, Tuple
+
+from app.models.domain import ClassDigest
+from app.models.schemas import AnalysisResult, SchoolAnalysisResult
+from app.models.score_matrix import ScoreMatrix
+from app.services.excel_processor import ExcelProcessor
+from app.services.grade_analyzer import GradeAnalyzer
+from app.services.spreadsheet_readers import FileSource, iter_source_blocks
+from app.services.worker_pool import AnalysisWorkerPool, worker_pool
+
+logger = logging.getLogger(__name__)
+
+# Mỗi process (kể cả process con của pool) có một bộ services riêng
+excel_processor = ExcelProcessor()
+grade_analyzer = GradeAnalyzer()
+
+
+# Callback báo tiến độ (VD: "parsed", "analyzed") cho job phân tích bất đồng bộ
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+
+def parse_sheet(file_content: FileSource, filename: str, sheet_name: Optional[str]) -> ScoreMatrix:
+    """Đọc và làm sạch một sheet"""
+    score_matrix = excel_processor.process_excel_to_matrix(file_content, filename, sheet_name)
+
+    if len(score_matrix) == 0:
+        raise ValueError(f"Sheet '{sheet_name or filename}' không có dữ liệu học sinh hợp lệ")
+
+    return score_matrix
+
+
+def parse_classes(file_content: FileSource, filename: str, sheet_name: Optional[str]) -> List[ScoreMatrix]:
+    """Đọc, làm sạch một sheet và tách thành bảng điểm của từng lớp (theo cột Lớp)"""
+    return parse_sheet(file_content, filename, sheet_name).split_by_class()
+
+
+def _parse_sheet_from_path(path: str, filename: str, sheet_name: Optional[str]) -> List[ScoreMatrix]:
+    """Chạy trong process con: đọc và tách lớp một sheet (bước đầu của phân tích)"""
+    with open(path, 'rb') as f:
+        return parse_classes(f, filename, sheet_name)
+
+
+def _analyze_matrix(score_matrix: ScoreMatrix, file_id: str, sections: Optional[AbstractSet[str]] = None,
+                    with_digest: bool = False) -> Tuple[AnalysisResult, Optional[ClassDigest]]:
+    """
+    Chạy trong process con: phân tích bảng điểm đã đọc của một lớp (kèm ClassDigest để tổng hợp
+    toàn trường khi with_digest)
+    """
+    result, digest = grade_analyzer.analyze_class(file_id, score_matrix, sections)
+    return result, digest if with_digest else None
+
+
+def _list_sheet_names_from_path(path: str, filename: str) -> List[Optional[str]]:
+    """Chạy trong process con: liệt kê các sheet của file trên đĩa"""
+    with open(path, 'rb') as f:
+        return excel_processor.list_sheet_names(f, filename)
+
+
+class WorkbookAnalyzer:
+    """
+    Phân tích workbook: mỗi sheet được đọc rồi tách theo cột Lớp, mỗi lớp được phân tích như một
+    tác vụ riêng song song bằng process pool dùng chung. Khi có nhiều lớp, kết quả có thêm phần
+    tổng hợp toàn trường (ghép từ kết quả của các lớp).
+    """
+
+    def __init__(self, pool: AnalysisWorkerPool = worker_pool):
+        self.pool = pool
+
+    async def analyze_async(self, file_content: FileSource, filename: str, file_id: str,
+                            on_progress: Optional[ProgressCallback] = None,
+                            sections: Optional[AbstractSet[str]] = None) -> SchoolAnalysisResult:
+        """
+        Phân tích workbook trong process pool mà không chặn event loop
+
+        Hai bước: đọc và tách lớp mọi sheet, rồi phân tích mọi lớp (và tổng hợp toàn trường).
+        on_progress: nếu có, được gọi với "parsed" khi mọi sheet đã đọc xong và "analyzed" khi
+        đã phân tích xong
+        sections: các phần kết quả cần tính (xem GradeAnalyzer.analyze_complete), None = tất cả
+        """
+        class_matrices = await self.parse_async(file_content, filename)
+        return await self.analyze_matrices_async(class_matrices, file_id, on_progress, sections)
+
+    async def analyze_matrices_async(self, class_matrices: List[ScoreMatrix], file_id: str,
+                                     on_progress: Optional[ProgressCallback] = None,
+                                     sections: Optional[AbstractSet[str]] = None) -> SchoolAnalysisResult:
+        """Bước thứ hai của analyze_async trên bảng điểm đã đọc và tách lớp (VD: lấy từ cache)"""
+        if on_progress is not None:
+            await on_progress("parsed")
+
+        # Mỗi lớp là một tác vụ riêng trong pool (không tạo pool lồng trong process con); khi có
+        # nhiều lớp, mỗi tác vụ trả thêm ClassDigest để tổng hợp toàn trường không phân tích lại
+        with_digest = len(class_matrices) > 1
+        outcomes = await asyncio.gather(*(
+            self.pool.run(_analyze_matrix, score_matrix, file_id, sections, with_digest)
+            for score_matrix in class_matrices
+        ))
+
+        results = [result for result, _ in outcomes]
+        summary = None
+        if with_digest:
+            summary = await asyncio.to_thread(grade_analyzer.summarize_school, [digest for _, digest in outcomes])
+        if on_progress is not None:
+            await on_progress("analyzed")
+
+        return SchoolAnalysisResult(file_id=file_id, classes=results, school_summary=summary)
+
+    async def parse_async(self, file_content: FileSource, filename: str) -> List[ScoreMatrix]:
+        """Đọc và tách lớp mọi sheet song song trong process pool, bảng điểm từng lớp theo thứ tự sheet"""
+        with await self.stage_async(file_content, filename) as staged:
+            return await self.parse_path_async(staged.name, filename)
+
+    async def parse_path_async(self, path: str, filename: str) -> List[ScoreMatrix]:
+        """Như parse_async, trên file đã chép ra đĩa (stage_async)"""
+        sheet_names = await self.pool.run(_list_sheet_names_from_path, path, filename)
+        parsed = await asyncio.gather(
+            *(self.pool.run(_parse_sheet_from_path, path, filename, sheet_name) for sheet_name in sheet_names),
+            return_exceptions=True
+        )
+        return self._collect_classes(filename, sheet_names, parsed)
+
+    async def stage_async(self, file_content: FileSource, filename: str) -> IO[bytes]:
+        """
+        Chép nội dung ra file tạm có tên để process con đọc theo đường dẫn (không pickle bytes)
+
+        File tạm thuộc về caller và bị xóa khi đóng (hoặc khi object bị thu hồi, VD: caller bị
+        hủy trong lúc chép), không còn phụ thuộc vào nguồn dữ liệu gốc.
+        """
+        return await asyncio.to_thread(self._stage_file, file_content, filename)
+
+    def _collect_classes(self, filename: str, sheet_names: List[Optional[str]],
+                         outcomes: list) -> List[ScoreMatrix]:
+        """Bảng điểm từng lớp của các sheet hợp lệ theo thứ tự sheet, lỗi nếu không sheet nào hợp lệ"""
+        # Workbook một sheet: lỗi được trả về nguyên vẹn như trước
+        if len(sheet_names) == 1 and isinstance(outcomes[0], BaseException):
+            raise outcomes[0]
+
+        class_matrices = []
+        errors = []
+        for sheet_name, outcome in zip(sheet_names, outcomes):
+            if isinstance(outcome, Exception):
+                # Sheet không hợp lệ (hướng dẫn, tổng hợp...) được bỏ qua
+                logger.warning(f"Skipping sheet '{sheet_name}' of {filename}: {outcome}")
+                errors.append(f"{sheet_name}: {outcome}")
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                class_matrices.extend(outcome)
+
+        if not class_matrices:
+            raise ValueError(f"Không có sheet nào chứa dữ liệu hợp lệ ({'; '.join(errors)})")
+
+        return class_matrices
+
+    def _stage_file(self, file_content: FileSource, filename: str) -> IO[bytes]:
+        suffix = os.path.splitext(filename)[1]
+        staged = tempfile.NamedTemporaryFile(suffix=suffix)
+        try:
+            for block in iter_source_blocks(file_content):
+                staged.write(block)
+            staged.flush()
+        except BaseException:
+            staged.close()
+            raise
+        return staged
+
+
+# Singleton instance
+workbook_analyzer = WorkbookAnalyzer()
@@ -0,0 +1,192 @@
+"""
+Process pool có hàng đợi giới hạn cho các tác vụ nặng (parse + phân tích) ngoài event loop
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Hàng đợi phân tích đã đầy"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Hệ thống đang xử lý quá nhiều file, vui lòng thử lại sau {retry_after} giây")
+        self.retry_after = retry_after
+
+
+def _warm_up():
+    """Initializer của process con: import sẵn pandas/openpyxl và các services phân tích"""
+    import numpy  # noqa: F401
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+    import app.services.workbook_analyzer  # noqa: F401
+
+
+def _ping() -> bool:
+    """Tác vụ rỗng dùng để khởi động sẵn các process con"""
+    return True
+
+
+def _timed_call(func, *args):
+    """Chạy trong process con: trả về thời điểm bắt đầu chạy kèm kết quả"""
+    started_at = time.time()
+    return started_at, func(*args)
+
+
+class AnalysisWorkerPool:
+    """
+    Process pool dùng chung cho parse + phân tích
+
+    Mỗi request được nhận (admit) nếu số request đang xử lý chưa vượt quá
+    max_workers + max_queue, ngược lại bị từ chối ngay với PoolSaturatedError.
+    """
+
+    # Số mẫu gần nhất dùng để tính thời gian chờ / thời gian chạy
+    SAMPLE_SIZE = 1000
+
+    def __init__(self, max_workers: int = settings.ANALYSIS_WORKERS,
+                 max_queue: int = settings.ANALYSIS_QUEUE_SIZE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=self.SAMPLE_SIZE)
+        self._run_times = deque(maxlen=self.SAMPLE_SIZE)
+        self.active_requests = 0
+        self.pending_tasks = 0
+        self.completed_tasks = 0
+        self.rejected_requests = 0
+
+    @property
+    def capacity(self) -> int:
+        """Số request tối đa được xử lý hoặc chờ cùng lúc"""
+        return self.max_workers + self.max_queue
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Khởi tạo process pool khi cần lần đầu"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_warm_up)
+            return self._executor
+
+    def start(self):
+        """Khởi động sẵn mọi process con để request đầu tiên không phải chờ import pandas"""
+        executor = self.executor
+        for _ in range(self.max_workers):
+            executor.submit(_ping)
+
+    def retry_after(self) -> int:
+        """Ước lượng số giây đến khi hàng đợi có chỗ trống (theo thời gian chạy trung bình)"""
+        with self._lock:
+            run_times = list(self._run_times)
+        average_run_time = sum(run_times) / len(run_times) if run_times else 1.0
+        waiting = max(1, self.active_requests - self.max_workers)
+        return max(1, math.ceil(average_run_time * waiting / self.max_workers))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Nhận một request vào hàng đợi, raise PoolSaturatedError nếu hàng đợi đã đầy"""
+        with self._lock:
+            saturated = self.active_requests >= self.capacity
+            if saturated:
+                self.rejected_requests += 1
+            else:
+                self.active_requests += 1
+
+        if saturated:
+            raise PoolSaturatedError(self.retry_after())
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active_requests -= 1
+
+    async def run(self, func, *args):
+        """Chạy func(*args) trong process con và chờ kết quả mà không chặn event loop"""
+        submitted_at = time.time()
+        with self._lock:
+            self.pending_tasks += 1
+
+        executor = self.executor
+        try:
+            started_at, result = await asyncio.wrap_future(executor.submit(_timed_call, func, *args))
+        except BrokenProcessPool:
+            # Process con bị kill (VD: hết bộ nhớ): tạo pool mới cho các request sau
+            logger.error("Analysis worker pool is broken, recreating it")
+            self._reset(executor)
+            raise ValueError("Tiến trình phân tích bị dừng đột ngột (file quá lớn?)")
+        finally:
+            with self._lock:
+                self.pending_tasks -= 1
+
+        finished_at = time.time()
+        with self._lock:
+            self.completed_tasks += 1
+            self._wait_times.append(max(0.0, started_at - submitted_at))
+            self._run_times.append(finished_at - started_at)
+
+        return result
+
+    def _reset(self, broken: Optional[ProcessPoolExecutor] = None):
+        """
+        Bỏ pool hiện tại; broken: pool đã hỏng, chỉ bỏ nếu đó vẫn là pool hiện tại (các tác vụ
+        khác lỗi trên cùng pool hỏng không làm dừng pool mới đã được tạo lại)
+        """
+        with self._lock:
+            if broken is not None and self._executor is not broken:
+                return
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        """Thống kê hàng đợi: độ sâu, thời gian chờ và thời gian chạy (ms)"""
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            run_times = list(self._run_times)
+
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active_requests": self.active_requests,
+                "pending_tasks": self.pending_tasks,
+                "queue_depth": max(0, self.pending_tasks - self.max_workers),
+                "completed_tasks": self.completed_tasks,
+                "rejected_requests": self.rejected_requests,
+                "wait_ms_avg": self._average_ms(wait_times),
+                "wait_ms_p95": self._percentile_ms(wait_times, 0.95),
+                "wait_ms_max": self._percentile_ms(wait_times, 1.0),
+                "run_ms_avg": self._average_ms(run_times),
+            }
+
+    @staticmethod
+    def _average_ms(values: list) -> float:
+        return round(sum(values) / len(values) * 1000, 1) if values else 0.0
+
+    @staticmethod
+    def _percentile_ms(sorted_values: list, fraction: float) -> float:
+        if not sorted_values:
+            return 0.0
+        return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] * 1000, 1)
+
+    def shutdown(self):
+        """Dừng process pool"""
+        self._reset()
+
+
+# Singleton instance
+worker_pool = AnalysisWorkerPool()
@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script
+Đo hiệu năng các bước xử lý chính (không cần chạy server)
+"""
+
+import io
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.responses import analysis_json, envelope_bytes
+from app.models.domain import StudentSummaryRecord
+from app.models.schemas import (
+    Student, Grade, GradeLevel, SchoolAnalysisResult, ScoreDelta, ScoreUpdate, StoredAnalysis, StudentSummary
+)
+from app.models.score_matrix import ScoreMatrix
+from app.services.excel_processor import ExcelProcessor
+from app.services.grade_analyzer import GradeAnalyzer, top_k_indices
+from app.services.incremental_analysis import IncrementalAnalysis
+from app.services.analysis_store import IndexedAnalysis, StudentQuery
+from app.services.spreadsheet_readers import READERS, CalamineWorkbook
+
+EXCEL_FILE = "bang_diem_format_ngang.xlsx"
+
+
+def load_sample_frame(n_students: int) -> pd.DataFrame:
+    """Nhân bản file mẫu định dạng ngang lên n_students học sinh"""
+    sample = pd.read_excel(EXCEL_FILE)
+    rng = np.random.default_rng(42)
+
+    repeats = -(-n_students // len(sample))
+    df = pd.concat([sample] * repeats, ignore_index=True).head(n_students)
+
+    # Tên duy nhất và điểm ngẫu nhiên để dữ liệu không bị lặp lại hoàn toàn
+    df[df.columns[0]] = [f"{name} {i}" for i, name in enumerate(df[df.columns[0]])]
+    for col in df.columns[1:]:
+        df[col] = np.round(rng.uniform(0, 10, len(df)), 1)
+    return df
+
+
+def time_call(func, *args, repeat: int = 3) -> float:
+    """Trả về thời gian chạy tốt nhất (giây) sau repeat lần"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def retained_memory(func, *args) -> float:
+    """Trả về bộ nhớ (MB) mà kết quả của func còn giữ sau khi chạy xong"""
+    tracemalloc.start()
+    result = func(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024 / 1024
+
+
+def peak_memory(func, *args) -> float:
+    """Trả về bộ nhớ đỉnh (MB) do func cấp phát"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def legacy_convert_horizontal_to_vertical(df: pd.DataFrame) -> pd.DataFrame:
+    """Phiên bản iterrows cũ của convert_horizontal_to_vertical (dùng để so sánh)"""
+    df = df.dropna(how='all').dropna(axis=1, how='all')
+
+    name_column = None
+    for col in df.columns:
+        if 'tên' in str(col).lower() or col == df.columns[0]:
+            name_column = col
+            break
+
+    if name_column is None:
+        name_column = df.columns[0]
+
+    subject_columns = []
+    for col in df.columns:
+        col_str = str(col).strip()
+        if (col != name_column and
+            'tb' not in col_str.lower() and
+            'điểm tb' not in col_str.lower() and
+            col_str != ''):
+            subject_columns.append(col)
+
+    vertical_data = []
+
+    for _, row in df.iterrows():
+        student_name = row[name_column]
+
+        if (pd.isna(student_name) or
+            str(student_name).strip() == '' or
+            str(student_name).isdigit()):
+            continue
+
+        for subject_col in subject_columns:
+            score = row[subject_col]
+            if pd.notna(score):
+                try:
+                    score_float = float(score)
+                    if 0 <= score_float <= 10:
+                        vertical_data.append({
+                            'Tên học sinh': str(student_name).strip(),
+                            'Lớp': '7A',
+                            'Môn học': str(subject_col).strip(),
+                            'Điểm': score_float
+                        })
+                except (ValueError, TypeError):
+                    continue
+
+    return pd.DataFrame(vertical_data)
+
+
+def legacy_convert_to_students(df: pd.DataFrame):
+    """Phiên bản iterrows cũ của convert_to_students (dùng để so sánh)"""
+    students_dict = {}
+    student_counter = 1
+
+    for _, row in df.iterrows():
+        student_key = (row['student_name'], row['class_name'])
+
+        if student_key not in students_dict:
+            student_id = f"HS{student_counter:03d}"
+            students_dict[student_key] = Student(
+                id=student_id,
+                name=row['student_name'],
+                class_name=row['class_name'],
+                grades=[]
+            )
+            student_counter += 1
+
+        grade = Grade(
+            subject=row['subject'],
+            score=row['score']
+        )
+
+        students_dict[student_key].grades.append(grade)
+
+    return list(students_dict.values())
+
+
+def bench_convert():
+    """So sánh convert_horizontal_to_vertical: iterrows cũ và bản vector hóa"""
+    print("🚀 Benchmark chuyển đổi định dạng ngang → dọc")
+    processor = ExcelProcessor()
+
+    for n_students in (1_000, 10_000, 50_000):
+        df = load_sample_frame(n_students)
+
+        # Kết quả phải giống hệt phiên bản cũ
+        pd.testing.assert_frame_equal(
+            processor.convert_horizontal_to_vertical(df),
+            legacy_convert_horizontal_to_vertical(df)
+        )
+
+        legacy = time_call(legacy_convert_horizontal_to_vertical, df, repeat=1)
+        vectorized = time_call(processor.convert_horizontal_to_vertical, df)
+        print(f"   {n_students:>6} học sinh | iterrows: {legacy * 1000:8.1f} ms | "
+              f"vector hóa: {vectorized * 1000:7.1f} ms | x{legacy / vectorized:.0f}")
+
+
+def bench_students():
+    """So sánh convert_to_students: iterrows cũ và bản group-by"""
+    print("🚀 Benchmark dựng Student objects")
+    processor = ExcelProcessor()
+
+    for n_rows in (10_000, 100_000):
+        df_clean = processor.validate_and_clean_data(load_sample_frame(n_rows // 13))
+        # Xáo trộn thứ tự hàng để các học sinh xen kẽ nhau như file định dạng dọc
+        df_clean = df_clean.sample(frac=1, random_state=42).reset_index(drop=True)
+
+        legacy_result = [s.model_dump() for s in legacy_convert_to_students(df_clean)]
+        assert [s.model_dump() for s in processor.convert_to_students(df_clean)] == legacy_result
+
+        legacy = time_call(legacy_convert_to_students, df_clean, repeat=1)
+        grouped = time_call(processor.convert_to_students, df_clean)
+        legacy_mem = peak_memory(legacy_convert_to_students, df_clean)
+        grouped_mem = peak_memory(processor.convert_to_students, df_clean)
+        print(f"   {len(df_clean):>6} hàng | iterrows: {legacy * 1000:8.1f} ms, {legacy_mem:6.1f} MB | "
+              f"group-by: {grouped * 1000:7.1f} ms, {grouped_mem:6.1f} MB | x{legacy / grouped:.0f}")
+
+
+def bench_matrix():
+    """So sánh List[Student] và ScoreMatrix: bộ nhớ giữ lại và thời gian phân tích"""
+    print("🚀 Benchmark ma trận điểm")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (1_000, 10_000, 50_000):
+        df_clean = processor.validate_and_clean_data(load_sample_frame(n_students))
+        students = processor.convert_to_students(df_clean)
+        score_matrix = processor.convert_to_score_matrix(df_clean)
+
+        # Hai đường phải cho cùng kết quả phân tích
+        assert (analyzer.analyze_complete("bench", score_matrix).model_dump() ==
+                analyzer.analyze_complete("bench", students).model_dump())
+
+        students_mem = retained_memory(processor.convert_to_students, df_clean)
+        matrix_mem = retained_memory(processor.convert_to_score_matrix, df_clean)
+        averages = time_call(lambda: [analyzer.calculate_student_average(s) for s in students])
+        matrix_averages = time_call(score_matrix.average_scores)
+        print(f"   {n_students:>6} học sinh | List[Student]: {students_mem:6.1f} MB | "
+              f"ScoreMatrix: {matrix_mem:5.1f} MB | điểm TB: {averages * 1000:6.1f} ms → "
+              f"{matrix_averages * 1000:5.1f} ms")
+
+
+def bench_readers():
+    """So sánh các backend đọc file trên file mẫu được nhân bản"""
+    print("🚀 Benchmark backend đọc file Excel")
+    backends = ["openpyxl"] + (["calamine"] if CalamineWorkbook is not None else [])
+    if len(backends) == 1:
+        print("   ⚠️ Chưa cài python-calamine, chỉ đo openpyxl")
+
+    for n_students in (1_000, 10_000, 50_000):
+        buffer = io.BytesIO()
+        load_sample_frame(n_students).to_excel(buffer, index=False)
+        file_content = buffer.getvalue()
+
+        frames = {backend: READERS[backend].read_sheet(file_content) for backend in backends}
+        for backend in backends[1:]:
+            # Mọi backend phải trả về cùng một DataFrame
+            pd.testing.assert_frame_equal(frames[backend], frames["openpyxl"])
+
+        timings = {backend: time_call(READERS[backend].read_sheet, file_content, repeat=1)
+                   for backend in backends}
+        line = " | ".join(f"{backend}: {seconds * 1000:8.1f} ms" for backend, seconds in timings.items())
+        speedup = f" | x{timings['openpyxl'] / timings['calamine']:.1f}" if "calamine" in timings else ""
+        print(f"   {n_students:>6} học sinh ({len(file_content) / 1024 / 1024:5.1f} MB) | {line}{speedup}")
+
+
+def bench_csv():
+    """So sánh parse CSV: pd.read_csv cũ và CsvReader (pyarrow đa luồng)"""
+    print("🚀 Benchmark parse CSV")
+    reader = READERS["csv"]
+
+    for n_students in (10_000, 100_000, 300_000):
+        file_content = load_sample_frame(n_students).to_csv(index=False).encode("utf-8")
+
+        legacy = time_call(lambda: pd.read_csv(io.BytesIO(file_content), encoding="utf-8"))
+        current = time_call(reader.read_sheet, file_content)
+        print(f"   {n_students:>6} học sinh ({len(file_content) / 1024 / 1024:5.1f} MB) | "
+              f"pd.read_csv: {legacy * 1000:7.1f} ms | CsvReader: {current * 1000:7.1f} ms | "
+              f"x{legacy / current:.1f}")
+
+
+def legacy_serialize_response(result) -> bytes:
+    """Đường cũ: model_dump() → jsonable_encoder → json.dumps (JSONResponse) trên dict lồng nhau"""
+    content = {"success": True, "data": result.model_dump(), "message": "Phân tích file Excel thành công"}
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+def bench_serialize():
+    """So sánh serialize response: model_dump + jsonable_encoder và JSON bytes trực tiếp"""
+    print("🚀 Benchmark serialize response AnalysisResult")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    def serialize(result) -> bytes:
+        analysis = SchoolAnalysisResult(file_id=result.file_id, classes=[result])
+        return envelope_bytes(analysis_json(analysis), "Phân tích file Excel thành công")
+
+    for n_students in (1_000, 10_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        result = analyzer.analyze_complete("bench", score_matrix)
+
+        # Hai đường phải cho cùng một JSON
+        assert json.loads(serialize(result)) == json.loads(legacy_serialize_response(result))
+
+        legacy = time_call(legacy_serialize_response, result)
+        direct = time_call(serialize, result)
+        legacy_mem = peak_memory(legacy_serialize_response, result)
+        direct_mem = peak_memory(serialize, result)
+        print(f"   {n_students:>6} học sinh | model_dump + jsonable_encoder: {legacy * 1000:7.1f} ms, "
+              f"{legacy_mem:6.1f} MB | JSON bytes: {direct * 1000:6.1f} ms, {direct_mem:5.1f} MB | "
+              f"x{legacy / direct:.0f}")
+
+
+def validated_summaries(score_matrix):
+    """Dựng StudentSummary / Student / Grade có validate của Pydantic cho mọi học sinh (cách cũ)"""
+    return [
+        StudentSummary(
+            student=Student(id=record.id, name=record.name, class_name=record.class_name,
+                            grades=[Grade(subject=grade.subject, score=grade.score) for grade in record.grades]),
+            average_score=0.0, rank=rank, grade_level=GradeLevel.WEAK, weak_subjects=[], strong_subjects=[]
+        )
+        for rank, record in enumerate(score_matrix.to_records(), 1)
+    ]
+
+
+def record_summaries(score_matrix):
+    """Dựng StudentSummaryRecord / StudentRecord / GradeRecord (object nội bộ) cho mọi học sinh"""
+    return [
+        StudentSummaryRecord(record, 0.0, rank, GradeLevel.WEAK, [], [])
+        for rank, record in enumerate(score_matrix.to_records(), 1)
+    ]
+
+
+def bench_domain():
+    """So sánh dựng object từng học sinh: model Pydantic có validate và object nội bộ dùng __slots__"""
+    print("🚀 Benchmark object nội bộ")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+
+        validated = time_call(validated_summaries, score_matrix)
+        records = time_call(record_summaries, score_matrix)
+        to_models = time_call(lambda: [summary.to_model() for summary in record_summaries(score_matrix)])
+        validated_mem = retained_memory(validated_summaries, score_matrix)
+        records_mem = retained_memory(record_summaries, score_matrix)
+        analyze = time_call(analyzer.analyze_complete, "bench", score_matrix, repeat=1)
+        print(f"   {n_students:>6} học sinh | Pydantic: {validated * 1000:7.1f} ms, {validated_mem:6.1f} MB | "
+              f"__slots__: {records * 1000:6.1f} ms, {records_mem:6.1f} MB | "
+              f"+ chuyển sang model: {to_models * 1000:6.1f} ms | analyze_complete: {analyze * 1000:6.0f} ms")
+
+
+def legacy_student_passes(analyzer: GradeAnalyzer, students) -> None:
+    """Các lần tính lại chỉ số cho từng học sinh trong analyze_complete trước khi có profile"""
+    for student in students:
+        analyzer.calculate_student_average(student)  # analyze_students_with_rank
+        analyzer.calculate_student_average(student)  # analyze_class_statistics
+        analyzer.determine_grade_level(student)  # analyze_student
+        analyzer.determine_grade_level(student)  # phân bố xếp loại
+        analyzer.check_excellent_student_conditions(student)  # học sinh tiềm năng
+        analyzer.check_excellent_student_conditions(student)  # thống kê điều kiện học sinh giỏi
+
+
+def bench_analyzer():
+    """So sánh tính chỉ số từng học sinh nhiều lần (cách cũ) và một profile cho mỗi học sinh"""
+    print("🚀 Benchmark GradeAnalyzer")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (1_000, 10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        students = score_matrix.to_records()
+        averages = score_matrix.average_scores()
+
+        legacy = time_call(legacy_student_passes, analyzer, students)
+        profiles = time_call(analyzer.build_profiles, students, averages)
+        analyze = time_call(analyzer.analyze_complete, "bench", score_matrix, repeat=1)
+        print(f"   {n_students:>6} học sinh | chỉ số từng học sinh: {legacy * 1000:7.1f} ms → "
+              f"{profiles * 1000:6.1f} ms (x{legacy / profiles:.1f}) | analyze_complete: {analyze * 1000:6.0f} ms")
+
+
+def legacy_subject_statistics(analyzer: GradeAnalyzer, students) -> list:
+    """Thống kê môn kiểu cũ: duyệt lại toàn bộ điểm của mọi học sinh cho từng môn"""
+    subjects = sorted({grade.subject for student in students for grade in student.grades})
+    statistics = []
+    for subject in subjects:
+        subject_data = [(student.name, grade.score)
+                        for student in students for grade in student.grades if grade.subject == subject]
+        scores = [score for _, score in subject_data]
+        levels = [analyzer._determine_grade_level_by_score(score) for score in scores]
+        highest_score, lowest_score = max(scores), min(scores)
+        statistics.append((
+            subject,
+            round(sum(scores) / len(scores), 2),
+            next(name for name, score in subject_data if score == highest_score),
+            next(name for name, score in subject_data if score == lowest_score),
+            round(sum(1 for score in scores if score >= 5.0) / len(scores) * 100, 1),
+            [levels.count(level) for level in GradeLevel]
+        ))
+    return statistics
+
+
+def bench_subjects():
+    """So sánh thống kê môn: duyệt lại cho từng môn và chỉ mục môn dựng một lần"""
+    print("🚀 Benchmark thống kê theo môn")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    def indexed_subject_statistics(students) -> list:
+        subject_index = analyzer.build_subject_index(students)
+        names = [student.name for student in students]
+        return [analyzer._subject_statistics(names, subject, *subject_index[subject])
+                for subject in sorted(subject_index)]
+
+    for n_students in (1_000, 10_000, 50_000):
+        students = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        ).to_records()
+
+        # Hai cách phải cho cùng kết quả
+        assert legacy_subject_statistics(analyzer, students) == [
+            (stats.subject, stats.average_score, stats.highest_score_student, stats.lowest_score_student,
+             stats.pass_rate, [stats.excellent_count, stats.good_count, stats.average_count, stats.weak_count])
+            for stats in indexed_subject_statistics(students)
+        ]
+
+        legacy = time_call(legacy_subject_statistics, analyzer, students, repeat=1)
+        indexed = time_call(indexed_subject_statistics, students)
+        print(f"   {n_students:>6} học sinh | duyệt lại từng môn: {legacy * 1000:7.1f} ms | "
+              f"chỉ mục môn: {indexed * 1000:6.1f} ms | x{legacy / indexed:.0f}")
+
+
+def bench_classify():
+    """Xếp loại cả lớp bằng NumPy so với từng học sinh (tính đúng đắn: tests/test_grade_classification.py)"""
+    print("🚀 Benchmark xếp loại theo ma trận")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (1_000, 10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        students = score_matrix.to_records()
+        averages = score_matrix.average_scores()
+
+        scalar = time_call(analyzer.build_profiles, students, averages)
+        vectorized = time_call(analyzer.classify_matrix, score_matrix, averages)
+        profiles = time_call(lambda: analyzer.classify_matrix(score_matrix, averages).to_profiles(students))
+        print(f"   {n_students:>6} học sinh | từng học sinh: {scalar * 1000:7.1f} ms | "
+              f"ma trận: {vectorized * 1000:5.1f} ms (x{scalar / vectorized:.0f}) | "
+              f"+ StudentProfile: {profiles * 1000:6.1f} ms")
+
+
+def bench_school():
+    """Phân tích toàn trường (30 lớp): tách lớp, phân tích từng lớp, tổng hợp toàn trường từ ClassDigest và top-k"""
+    print("🚀 Benchmark phân tích toàn trường")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        score_matrix.class_names = np.array([f"10A{index % 30 + 1}" for index in range(n_students)], dtype=object)
+
+        split = time_call(score_matrix.split_by_class)
+        class_matrices = score_matrix.split_by_class()
+        classes = time_call(lambda: [analyzer.analyze_class("bench", matrix) for matrix in class_matrices],
+                            repeat=1)
+        digests = [analyzer.analyze_class("bench", matrix)[1] for matrix in class_matrices]
+        summary = time_call(analyzer.summarize_school, digests)
+
+        averages = np.asarray(score_matrix.average_scores())
+        assert (top_k_indices(averages, 10) == np.argsort(-averages, kind='stable')[:10]).all()
+        full_sort = time_call(lambda: np.argsort(-averages, kind='stable')[:10])
+        partial = time_call(top_k_indices, averages, 10)
+        print(f"   {n_students:>6} học sinh | tách lớp: {split * 1000:5.1f} ms | 30 lớp: {classes * 1000:6.0f} ms | "
+              f"tổng hợp trường: {summary * 1000:6.1f} ms | top 10: sắp xếp {full_sort * 1000:5.2f} ms → "
+              f"argpartition {partial * 1000:5.2f} ms")
+
+
+def random_delta(rng: np.random.Generator, analysis: IncrementalAnalysis, n_changes: int) -> ScoreDelta:
+    """n_changes điểm ngẫu nhiên được sửa (học sinh và môn có sẵn trong lớp đầu tiên)"""
+    state = next(iter(analysis.classes.values()))
+    records = [state.students[key].record for key in rng.choice(list(state.students), n_changes)]
+    return ScoreDelta(updates=[
+        ScoreUpdate(student_name=record.name, class_name=record.class_name,
+                    subject=record.grades[int(rng.integers(len(record.grades)))].subject,
+                    score=float(np.round(rng.uniform(0, 10), 1)))
+        for record in records
+    ])
+
+
+def bench_incremental():
+    """Sửa 10 điểm: cập nhật tăng dần so với phân tích lại cả lớp (tính đúng đắn: tests/test_incremental_analysis.py)"""
+    print("🚀 Benchmark cập nhật tăng dần (10 điểm thay đổi)")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+    rng = np.random.default_rng(7)
+
+    for n_students in (10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        start = time.perf_counter()
+        analysis = IncrementalAnalysis.build("bench", "bench", "bench", [score_matrix], analyzer)
+        build = time.perf_counter() - start
+
+        deltas = iter([random_delta(rng, analysis, 10) for _ in range(6)])
+        statistics_only = time_call(lambda: analysis.apply(next(deltas)) and analysis.to_result(
+            {"class_statistics", "recommendations"}))
+        with_summaries = time_call(lambda: analysis.apply(next(deltas)) and analysis.to_result())
+
+        state = next(iter(analysis.classes.values()))
+        corrected = ScoreMatrix.from_students([record.to_model() for record in state.records()])
+        full = time_call(analyzer.analyze_complete, "bench", corrected, repeat=1)
+        print(f"   {n_students:>6} học sinh | dựng trạng thái: {build * 1000:6.0f} ms | phân tích lại: "
+              f"{full * 1000:6.0f} ms | tăng dần: thống kê + gợi ý {statistics_only * 1000:5.2f} ms, "
+              f"cả danh sách {with_summaries * 1000:5.1f} ms")
+
+
+def scan_students(summaries, query: StudentQuery):
+    """Lọc và sắp xếp cả danh sách học sinh (không dùng chỉ mục) cho cùng truy vấn"""
+    selected = [
+        summary for summary in summaries
+        if (query.class_name is None or summary.student.class_name == query.class_name)
+        and (query.grade_level is None or summary.grade_level == query.grade_level)
+        and (query.weak_subject is None or query.weak_subject in [subject.lower() for subject in summary.weak_subjects])
+        and (query.min_average is None or summary.average_score >= query.min_average)
+        and (query.max_average is None or summary.average_score <= query.max_average)
+    ]
+    keys = {
+        "rank": lambda summary: summary.rank,
+        "name": lambda summary: summary.student.name.casefold(),
+        "average_score": lambda summary: summary.average_score,
+    }
+    selected = sorted(selected, key=keys[query.sort_by], reverse=query.descending)
+    end = query.skip + query.limit if query.limit is not None else None
+    return len(selected), selected[query.skip:end]
+
+
+def bench_store():
+    """Truy vấn kết quả đã lưu (30 lớp): chỉ mục so với duyệt cả danh sách (tính đúng đắn: tests/test_analysis_store.py)"""
+    print("🚀 Benchmark truy vấn kết quả đã lưu")
+    processor = ExcelProcessor()
+    analyzer = GradeAnalyzer()
+
+    for n_students in (10_000, 50_000):
+        score_matrix = processor.convert_to_score_matrix(
+            processor.validate_and_clean_data(load_sample_frame(n_students))
+        )
+        score_matrix.class_names = np.array([f"10A{index % 30 + 1}" for index in range(n_students)], dtype=object)
+        class_matrices = score_matrix.split_by_class()
+        analysis = SchoolAnalysisResult(
+            file_id="bench",
+            classes=[analyzer.analyze_complete("bench", matrix) for matrix in class_matrices],
+            school_summary=analyzer.analyze_school_summary(class_matrices)
+        )
+        info = StoredAnalysis(analysis_id="bench", client_id="bench", source="bench", file_id="bench",
+                              class_names=[], total_students=n_students, created_at=datetime.utcnow())
+
+        build = time_call(IndexedAnalysis, info, analysis, repeat=1)
+        indexed = IndexedAnalysis(info, analysis)
+        summaries = [summary for result in analysis.classes for summary in result.student_summaries]
+
+        queries = {
+            "yếu môn Toán": StudentQuery(weak_subject="Toán", limit=50),
+            "top 10": StudentQuery(sort_by="average_score", descending=True, limit=10),
+            "giỏi lớp 10A1": StudentQuery(class_name="10A1", grade_level=GradeLevel.EXCELLENT, limit=50),
+        }
+        timings = []
+        for label, query in queries.items():
+            scan = time_call(scan_students, summaries, query)
+            lookup = time_call(indexed.select, query)
+            timings.append(f"{label}: {scan * 1000:6.1f} → {lookup * 1000:6.3f} ms")
+        print(f"   {n_students:>6} học sinh | dựng chỉ mục: {build * 1000:5.0f} ms | " + " | ".join(timings))
+
+
+def main():
+    """Chọn benchmark theo tham số dòng lệnh"""
+    benchmarks = {
+        "convert": bench_convert,
+        "students": bench_students,
+        "matrix": bench_matrix,
+        "readers": bench_readers,
+        "csv": bench_csv,
+        "serialize": bench_serialize,
+        "domain": bench_domain,
+        "analyzer": bench_analyzer,
+        "subjects": bench_subjects,
+        "classify": bench_classify,
+        "school": bench_school,
+        "incremental": bench_incremental,
+        "store": bench_store,
+    }
+
+    modes = sys.argv[1:] or list(benchmarks)
+    for mode in modes:
+        if mode not in benchmarks:
+            print(f"❌ Benchmark không hợp lệ: {mode}. Sử dụng: {', '.join(benchmarks)}")
+            continue
+        benchmarks[mode]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Cache theo nội dung file: lần phân tích thứ hai cùng nội dung với phần kết quả khác (sections)
+dùng lại bảng điểm đã parse thay vì đọc lại file
+"""
+
+import asyncio
+from unittest import mock
+
+from app.api.endpoints import _analyze_with_cache
+from app.services.analysis_cache import AnalysisCache, analysis_cache
+from app.services.worker_pool import worker_pool
+from app.services.workbook_analyzer import workbook_analyzer
+
+EXCEL_FILE = "bang_diem_format_ngang.xlsx"
+
+
+def test_parsed_gradebook_is_reused_for_other_sections():
+    with open(EXCEL_FILE, "rb") as f:
+        content = f.read()
+
+    async def analyze_twice():
+        statistics_only = await _analyze_with_cache(content, EXCEL_FILE, "file", sections=frozenset())
+        full = await _analyze_with_cache(content, EXCEL_FILE, "file")
+        return statistics_only, full
+
+    analysis_cache.clear()
+    try:
+        with mock.patch.object(workbook_analyzer, "parse_path_async",
+                               side_effect=workbook_analyzer.parse_path_async) as parse:
+            statistics_only, full = asyncio.run(analyze_twice())
+        expected = asyncio.run(workbook_analyzer.analyze_async(content, EXCEL_FILE, "file"))
+    finally:
+        worker_pool.shutdown()
+        analysis_cache.clear()
+
+    assert parse.call_count == 1
+    assert full == expected
+    assert [result.class_statistics for result in statistics_only.classes] == \
+        [result.class_statistics for result in expected.classes]
+    assert all(not result.student_summaries for result in statistics_only.classes)
+
+
+def test_parsed_entries_share_the_byte_budget():
+    cache = AnalysisCache(max_bytes=1, ttl_seconds=60)
+    content_key = AnalysisCache.key_from_digest("0" * 64, EXCEL_FILE)
+    with open(EXCEL_FILE, "rb") as f:
+        content = f.read()
+    try:
+        matrices = asyncio.run(workbook_analyzer.parse_async(content, EXCEL_FILE))
+    finally:
+        worker_pool.shutdown()
+
+    cache.put_parsed(content_key, matrices)
+    assert cache.get_parsed(content_key) is None
+
+    cache.max_bytes = 1024 * 1024
+    cache.put_parsed(content_key, matrices)
+    assert cache.get_parsed(content_key) is matrices
+    assert cache.get(content_key) is None
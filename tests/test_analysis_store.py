@@ -0,0 +1,62 @@
+"""
+Truy vấn danh sách học sinh đã lưu qua chỉ mục (IndexedAnalysis.select) phải giống hệt lọc và sắp
+xếp cả danh sách, trên truy vấn ngẫu nhiên
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.models.schemas import GradeLevel, SchoolAnalysisResult, StoredAnalysis
+from app.models.score_matrix import ScoreMatrix
+from app.services.analysis_store import IndexedAnalysis, StudentQuery
+from app.services.grade_analyzer import GradeAnalyzer
+from benchmark import scan_students
+
+SUBJECTS = ["Toán", "Ngữ văn", "Tiếng Anh", "Vật lý", "Hóa học", "Sinh học"]
+N_CLASSES = 6
+
+
+@pytest.fixture(scope="module")
+def analysis() -> SchoolAnalysisResult:
+    """Kết quả phân tích của N_CLASSES lớp ngẫu nhiên (điểm làm tròn để có nhiều học sinh cùng điểm TB)"""
+    rng = np.random.default_rng(25)
+    names, classes, subjects, scores = [], [], [], []
+    for index in range(600):
+        name = f"{rng.choice(['An', 'bình', 'Chi', 'dũng'])} {index}"
+        for subject in rng.choice(SUBJECTS, int(rng.integers(1, len(SUBJECTS) + 1)), replace=False):
+            names.append(name)
+            classes.append(f"10A{index % N_CLASSES + 1}")
+            subjects.append(str(subject))
+            scores.append(float(rng.integers(0, 21)) / 2)
+
+    analyzer = GradeAnalyzer()
+    class_matrices = ScoreMatrix.from_records(names, classes, subjects, scores).split_by_class()
+    return SchoolAnalysisResult(
+        file_id="file",
+        classes=[analyzer.analyze_complete("file", matrix) for matrix in class_matrices],
+        school_summary=analyzer.analyze_school_summary(class_matrices)
+    )
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_indexed_select_matches_full_scan(analysis, seed):
+    info = StoredAnalysis(analysis_id="analysis", client_id="client", source="file", file_id="file",
+                          class_names=[], total_students=600, created_at=datetime.utcnow())
+    indexed = IndexedAnalysis(info, analysis)
+    summaries = [summary for result in analysis.classes for summary in result.student_summaries]
+    rng = np.random.default_rng(seed)
+
+    for _ in range(100):
+        low = float(np.round(rng.uniform(0, 10), 2)) if rng.random() < 0.3 else None
+        query = StudentQuery(
+            class_name=f"10a{int(rng.integers(1, N_CLASSES + 2))}" if rng.random() < 0.4 else None,
+            grade_level=rng.choice(list(GradeLevel)) if rng.random() < 0.4 else None,
+            weak_subject=str(rng.choice(SUBJECTS)).upper() if rng.random() < 0.4 else None,
+            min_average=low,
+            max_average=float(np.round(rng.uniform(low or 0, 10), 2)) if rng.random() < 0.3 else None,
+            sort_by=str(rng.choice(["rank", "name", "average_score"])), descending=bool(rng.random() < 0.5),
+            skip=int(rng.integers(0, 50)), limit=int(rng.integers(1, 100)) if rng.random() < 0.8 else None
+        )
+        assert indexed.select(query) == scan_students(summaries, query)
@@ -0,0 +1,25 @@
+"""Tham số phân trang của AnalysisView"""
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.analysis_view import AnalysisView, SortField, SortOrder
+
+
+def view(**params) -> AnalysisView:
+    values = dict(sections=None, page=1, page_size=None, sort_by=SortField.RANK, order=SortOrder.ASC,
+                  grade_level=None, weak_subject=None)
+    values.update(params)
+    return AnalysisView(**values)
+
+
+def test_page_without_page_size_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        view(page=2)
+    assert error.value.status_code == 400
+
+
+def test_is_default_accounts_for_page():
+    assert view().is_default
+    assert not view(page=2, page_size=10).is_default
+    assert not view(page_size=10).is_default
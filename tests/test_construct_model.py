@@ -0,0 +1,63 @@
+"""
+construct_model: đường dựng nhanh (ghi thẳng thuộc tính nội bộ, chỉ với Pydantic 2.5) phải cho
+model giống hệt model_construct() và model đã validate, kể cả các model lồng nhau
+"""
+
+from unittest import mock
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+from app.models import domain
+from app.models.schemas import AnalysisResult, Grade, Student
+from app.models.score_matrix import ScoreMatrix
+from app.services.grade_analyzer import GradeAnalyzer
+
+
+def nested_models(model):
+    """Model và mọi model lồng bên trong (theo thứ tự duyệt)"""
+    yield model
+    for value in model.__dict__.values():
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, BaseModel):
+                yield from nested_models(item)
+
+
+def analysis_result(fast: bool) -> AnalysisResult:
+    rng = np.random.default_rng(19)
+    subjects = ["Toán", "Ngữ văn", "Tiếng Anh", "Vật lý"]
+    students = [
+        Student(id=f"HS{index:03d}", name=f"Học sinh {index}", class_name="10A1",
+                grades=[Grade(subject=subject, score=round(float(rng.uniform(0, 10)), 1)) for subject in subjects])
+        for index in range(30)
+    ]
+    with mock.patch.object(domain, "_FAST_CONSTRUCT", fast):
+        return GradeAnalyzer().analyze_complete("file", ScoreMatrix.from_students(students))
+
+
+@pytest.mark.skipif(not domain._FAST_CONSTRUCT, reason="Đường dựng nhanh chỉ dùng với Pydantic 2.5")
+def test_fast_path_matches_model_construct():
+    fast = analysis_result(fast=True)
+    fallback = analysis_result(fast=False)
+    validated = AnalysisResult.model_validate(fallback.model_dump())
+
+    assert fast == fallback == validated
+    assert fast.model_dump() == fallback.model_dump()
+    assert fast.model_dump_json() == fallback.model_dump_json() == validated.model_dump_json()
+
+    fast_models, fallback_models = list(nested_models(fast)), list(nested_models(fallback))
+    assert len(fast_models) > 100
+    assert [type(model) for model in fast_models] == [type(model) for model in fallback_models]
+    for fast_model, fallback_model in zip(fast_models, fallback_models):
+        assert fast_model.model_fields_set == fallback_model.model_fields_set
+        assert fast_model.__pydantic_extra__ == fallback_model.__pydantic_extra__
+        assert fast_model.__pydantic_private__ == fallback_model.__pydantic_private__
+
+
+def test_each_model_has_its_own_fields_set():
+    first, second = (domain.construct_model(Grade, {"subject": "Toán", "score": 9.0}) for _ in range(2))
+    first.model_fields_set.add("extra_marker")
+
+    assert "extra_marker" not in second.model_fields_set
+    assert second.model_fields_set == set(Grade.model_fields)
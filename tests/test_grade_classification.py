@@ -0,0 +1,47 @@
+"""
+Xếp loại cả lớp bằng NumPy (GradeAnalyzer.classify_matrix) phải khớp với xếp loại từng học sinh
+(determine_grade_level / check_excellent_student_conditions) trên dữ liệu ngẫu nhiên
+"""
+
+import numpy as np
+import pytest
+
+from app.models.schemas import Grade, Student
+from app.models.score_matrix import ScoreMatrix
+from app.services.grade_analyzer import GradeAnalyzer
+
+
+def random_students(rng: np.random.Generator, n_students: int):
+    """Học sinh ngẫu nhiên cho kiểm tra tính chất: tên môn Toán / Văn đủ kiểu, môn trùng, không có điểm"""
+    subjects = ["Toán", "toán", "TOAN", "Math", "Ngữ văn", "Văn", "văn", "Literature", "Tiếng Việt",
+                "Vật lý", "Hóa học", "Tiếng Anh"]
+    students = []
+    for index in range(n_students):
+        n_grades = int(rng.integers(0, 8))
+        low = float(rng.choice([0.0, 3.5, 5.0, 6.5, 7.5]))
+        grades = [Grade(subject=str(rng.choice(subjects)), score=round(float(rng.uniform(low, 10)), 1))
+                  for _ in range(n_grades)]
+        students.append(Student(id=f"HS{index:03d}", name=f"Học sinh {index}", class_name="10A1", grades=grades))
+    return students
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_classify_matrix_matches_per_student_classification(seed):
+    analyzer = GradeAnalyzer()
+    rng = np.random.default_rng(seed)
+
+    for _ in range(50):
+        score_matrix = ScoreMatrix.from_students(random_students(rng, int(rng.integers(1, 60))))
+        students = score_matrix.to_records()
+        classification = analyzer.classify_matrix(score_matrix)
+
+        for index, student in enumerate(students):
+            conditions = analyzer.check_excellent_student_conditions(student)
+            assert classification.grade_levels[index] == analyzer.determine_grade_level(student)
+            assert classification.is_excellent[index] == conditions['is_excellent']
+            assert classification.average_condition[index] == conditions['average_condition']
+            assert classification.min_score_condition[index] == conditions['min_score_condition']
+            assert classification.math_literature_condition[index] == conditions['math_literature_condition']
+            if student.grades:
+                assert classification.math_scores[index] == conditions['math_score']
+                assert classification.literature_scores[index] == conditions['literature_score']
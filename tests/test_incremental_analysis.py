@@ -0,0 +1,121 @@
+"""
+Cập nhật tăng dần (IncrementalAnalysis) phải cho kết quả giống hệt phân tích lại toàn bộ bảng điểm
+đã sửa, trên bảng điểm và thay đổi điểm ngẫu nhiên
+"""
+
+import random
+
+import pytest
+
+from app.models.schemas import ScoreDelta, ScoreRemoval, ScoreUpdate
+from app.models.score_matrix import ScoreMatrix
+from app.services.grade_analyzer import GradeAnalyzer
+from app.services.incremental_analysis import IncrementalAnalysis
+
+SUBJECTS = ["Toán", "Ngữ Văn", "Tiếng Anh", "Vật Lý", "Hóa Học", "Sinh Học", "Lịch Sử"]
+NAMES = [f"Hoc Sinh {index}" for index in range(400)]
+
+analyzer = GradeAnalyzer()
+
+
+def random_score(rng: random.Random) -> float:
+    return round(rng.choice([rng.uniform(0, 10), rng.uniform(6, 10), rng.uniform(7.5, 10)]), rng.choice([1, 2]))
+
+
+def random_classes(rng: random.Random, class_names):
+    """Bảng điểm ngẫu nhiên của từng lớp (có môn nhập trùng)"""
+    names, classes, subjects, scores = [], [], [], []
+    for class_name in class_names:
+        for index in rng.sample(range(len(NAMES)), rng.randint(1, 40)):
+            student_subjects = rng.sample(SUBJECTS, rng.randint(1, 6))
+            if rng.random() < 0.05:
+                student_subjects.append(rng.choice(SUBJECTS))
+            for subject in student_subjects:
+                names.append(NAMES[index])
+                classes.append(class_name)
+                subjects.append(subject)
+                scores.append(random_score(rng))
+    return ScoreMatrix.from_records(names, classes, subjects, scores).split_by_class()
+
+
+def random_delta(rng: random.Random, analysis: IncrementalAnalysis) -> ScoreDelta:
+    """Sửa / thêm điểm, thêm học sinh, xóa môn hoặc xóa học sinh ngẫu nhiên"""
+    updates, removals = [], []
+    class_names = list(analysis.classes)
+    for _ in range(rng.randint(0, 4)):
+        class_name = rng.choice(class_names)
+        state = analysis.classes[class_name]
+        if rng.random() < 0.3 or not len(state):
+            name = rng.choice(NAMES)
+        else:
+            name = rng.choice([student.record.name for student in state.students.values()])
+        updates.append(ScoreUpdate(student_name=name.lower() if rng.random() < 0.2 else name,
+                                   class_name=class_name.lower(), subject=rng.choice(SUBJECTS),
+                                   score=random_score(rng)))
+
+    for _ in range(rng.randint(0, 2)):
+        class_name = rng.choice(class_names)
+        state = analysis.classes[class_name]
+        if len(state) < 2:
+            continue
+        record = rng.choice(list(state.students.values())).record
+        if any(removal.student_name == record.name and removal.class_name == class_name for removal in removals):
+            continue
+        if rng.random() < 0.4:
+            removals.append(ScoreRemoval(student_name=record.name, class_name=class_name))
+        elif record.grades:
+            removals.append(ScoreRemoval(student_name=record.name, class_name=class_name,
+                                         subject=rng.choice(record.grades).subject))
+
+    if rng.random() < 0.03:
+        updates.append(ScoreUpdate(student_name="Hoc Sinh Moi", class_name="9Z", subject="Toán", score=9.5))
+    return ScoreDelta(updates=updates, removals=removals)
+
+
+def assert_matches_full_analysis(analysis: IncrementalAnalysis):
+    """Kết quả tăng dần == phân tích lại các lớp còn học sinh (và tổng hợp toàn trường)"""
+    class_matrices = [
+        ScoreMatrix.from_students([record.to_model() for record in state.records()])
+        for state in analysis.classes.values() if len(state)
+    ]
+    result = analysis.to_result()
+
+    assert [actual.model_dump(mode="json") for actual in result.classes] == [
+        analyzer.analyze_complete(analysis.file_id, matrix).model_dump(mode="json") for matrix in class_matrices
+    ]
+    if len(class_matrices) > 1:
+        expected_summary = analyzer.analyze_school_summary(class_matrices)
+        assert result.school_summary.model_dump(mode="json") == expected_summary.model_dump(mode="json")
+    else:
+        assert result.school_summary is None
+
+    statistics_only = analysis.to_result({"class_statistics"})
+    assert all(not actual.student_summaries and not actual.recommendations for actual in statistics_only.classes)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_updates_match_full_reanalysis(seed):
+    rng = random.Random(seed)
+
+    for _ in range(5):
+        class_names = [f"{6 + index}A" for index in range(rng.choice([1, 1, 2, 3]))]
+        analysis = IncrementalAnalysis.build("analysis", "client", "file", random_classes(rng, class_names))
+        assert_matches_full_analysis(analysis)
+
+        for _ in range(15):
+            try:
+                analysis.apply(random_delta(rng, analysis))
+            except ValueError:
+                # Thay đổi không hợp lệ (VD: xóa hết học sinh của lớp) bị từ chối, trạng thái giữ nguyên
+                pass
+            assert_matches_full_analysis(analysis)
+
+
+def test_invalid_delta_leaves_analysis_unchanged():
+    rng = random.Random(0)
+    analysis = IncrementalAnalysis.build("analysis", "client", "file", random_classes(rng, ["6A"]))
+    before = analysis.to_result().model_dump(mode="json")
+
+    with pytest.raises(ValueError):
+        analysis.apply(ScoreDelta(removals=[ScoreRemoval(student_name="Khong Co", class_name="6A")]))
+    assert analysis.to_result().model_dump(mode="json") == before
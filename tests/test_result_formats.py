@@ -0,0 +1,19 @@
+"""Bảng Arrow của kết quả phân tích (table=students)"""
+
+from app.api.result_formats import students_table
+from app.models.score_matrix import ScoreMatrix
+from app.services.grade_analyzer import GradeAnalyzer
+from tests.test_analysis_view import view
+
+
+def test_subject_columns_do_not_overwrite_fixed_columns():
+    matrix = ScoreMatrix.from_records(["An", "An", "Bình"], ["9A", "9A", "9A"],
+                                      ["Toán", "name", "Toán"], [8.0, 7.0, 6.5])
+    result = GradeAnalyzer().analyze_complete("file", matrix)
+
+    table = students_table([result], view()).to_pydict()
+
+    assert sorted(table["name"]) == ["An", "Bình"]
+    scores = dict(zip(table["name"], table["score:name"]))
+    assert scores == {"An": 7.0, "Bình": None}
+    assert "score:Toán" in table
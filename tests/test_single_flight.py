@@ -0,0 +1,53 @@
+"""
+Request đến sau chờ chung lần phân tích của request đầu tiên (single-flight): lần phân tích phải
+hoàn thành kể cả khi request đầu tiên bị hủy và file upload của nó bị đóng
+"""
+
+import asyncio
+import io
+import tempfile
+
+from app.api.endpoints import _analyze_with_cache
+from app.services.analysis_cache import analysis_cache
+from app.services.single_flight import single_flight
+from app.services.worker_pool import worker_pool
+
+EXCEL_FILE = "bang_diem_format_ngang.xlsx"
+
+
+async def cancel_leader_while_follower_waits(content: bytes):
+    flight_key = f"content:{analysis_cache.compute_key(content, EXCEL_FILE)}"
+    coalesced = single_flight.coalesced
+
+    # File upload của request đầu tiên (FastAPI đóng file khi request kết thúc hoặc bị hủy)
+    upload = tempfile.SpooledTemporaryFile()
+    upload.write(content)
+    leader = asyncio.create_task(_analyze_with_cache(upload, EXCEL_FILE, "analysis_leader"))
+
+    # Hủy request đầu tiên và đóng file upload ngay khi lần phân tích được tạo, trước khi task
+    # của lần phân tích kịp chạy bước đầu tiên
+    while not single_flight.is_running(flight_key):
+        await asyncio.sleep(0)
+    leader.cancel()
+    upload.close()
+
+    follower = await _analyze_with_cache(io.BytesIO(content), EXCEL_FILE, "analysis_follower")
+    assert leader.cancelled()
+    assert single_flight.coalesced == coalesced + 1
+    return follower
+
+
+def test_follower_completes_when_leader_is_cancelled():
+    with open(EXCEL_FILE, "rb") as f:
+        # Nội dung riêng cho test để không trúng analysis cache
+        content = f.read() + b"\0" * 16
+
+    analysis_cache.clear()
+    try:
+        analysis = asyncio.run(cancel_leader_while_follower_waits(content))
+    finally:
+        worker_pool.shutdown()
+        analysis_cache.clear()
+
+    assert analysis.file_id == "analysis_follower"
+    assert analysis.classes and all(result.file_id == "analysis_follower" for result in analysis.classes)
@@ -0,0 +1,34 @@
+"""
+File .xlsx vượt EXCEL_STREAMING_THRESHOLD_BYTES luôn được đọc theo luồng (openpyxl read-only),
+kể cả khi backend "auto" chọn calamine cho file nhỏ
+"""
+
+from unittest import mock
+
+from app.core.config import settings
+from app.services.excel_processor import ExcelProcessor
+from app.services.spreadsheet_readers import OpenpyxlReader, get_reader
+
+EXCEL_FILE = "bang_diem_format_ngang.xlsx"
+
+
+def test_auto_backend_streams_with_openpyxl():
+    assert get_reader(EXCEL_FILE, "auto", streaming=True).name == OpenpyxlReader.name
+    assert get_reader(EXCEL_FILE, "auto", streaming=True).supports_streaming
+
+
+def test_large_workbook_is_read_row_by_row():
+    processor = ExcelProcessor()
+    with open(EXCEL_FILE, "rb") as f:
+        content = f.read()
+    expected = processor.process_excel_to_matrix(content, EXCEL_FILE)
+
+    with mock.patch.object(settings, "EXCEL_STREAMING_THRESHOLD_BYTES", 0), \
+            mock.patch.object(settings, "EXCEL_READER_BACKEND", "auto"), \
+            mock.patch.object(OpenpyxlReader, "iter_rows", autospec=True,
+                              side_effect=OpenpyxlReader.iter_rows) as iter_rows:
+        streamed = processor.process_excel_to_matrix(content, EXCEL_FILE)
+
+    assert iter_rows.called
+    assert [record.name for record in streamed.to_records()] == [record.name for record in expected.to_records()]
+    assert streamed.average_scores() == expected.average_scores()